@@ -0,0 +1,144 @@
+# Artifact index
+# From the jira id of the migrated issues to the artifact they were created as in spira.
+# The index is built once from the artifacts fetched from spira, and kept current from the create
+# responses of the inserts, so the artifacts don't have to be fetched again to resolve links.
+import threading
+import time
+from spira import Spira
+from migration_journal import ISSUE_ARTIFACT_TYPES, MigrationJournal
+
+# Spira artifact type ids and the id key of their artifacts
+ARTIFACT_TYPE_IDS = {"requirement": 1, "incident": 3, "task": 6}
+ARTIFACT_ID_KEYS = {1: "RequirementId", 3: "IncidentId", 6: "TaskId"}
+
+
+class ArtifactIndex:
+    def __init__(self):
+        self.artifacts = {}
+        self.lock = threading.Lock()
+
+    # Returns {"artifact_type_id", "artifact_id"} of the artifact created for the jira id.
+    def get(self, jira_id) -> dict | None:
+        with self.lock:
+            return self.artifacts.get(jira_id)
+
+    # Returns the id of the artifact created for the jira id, if it's of the given artifact type.
+    def get_artifact_id(self, jira_id, artifact_type):
+        id_data = self.get(jira_id)
+
+        if id_data and id_data["artifact_type_id"] == ARTIFACT_TYPE_IDS[artifact_type]:
+            return id_data["artifact_id"]
+
+        return None
+
+    # Add an artifact from spira, or from a create response, the first artifact of a jira id wins.
+    # Artifacts without the id of their artifact type are left out, returns if the artifact was added.
+    def add_artifact(self, jira_id, artifact, artifact_type=None) -> bool:
+        if artifact_type is not None:
+            artifact_type_id = ARTIFACT_TYPE_IDS[artifact_type]
+        else:
+            artifact_type_id = artifact.get("ArtifactTypeId")
+
+        id_key = ARTIFACT_ID_KEYS.get(artifact_type_id)
+        if id_key is None or artifact.get(id_key) is None:
+            print(
+                "The spira artifact of jira id "
+                + str(jira_id)
+                + " has no "
+                + str(id_key or "known artifact type")
+                + ", it's left out of the artifact index"
+            )
+            return False
+
+        self.add_artifact_id(jira_id, artifact_type_id, artifact[id_key])
+        return True
+
+    def add_artifact_id(self, jira_id, artifact_type_id, artifact_id):
+        with self.lock:
+            self.artifacts.setdefault(
+                jira_id,
+                {"artifact_type_id": artifact_type_id, "artifact_id": artifact_id},
+            )
+
+    # Add the issues recorded in the migration journal.
+    def add_journal_entries(self, journal: MigrationJournal):
+        for jira_id, artifact_type, artifact_id in journal.get_entries(
+            ISSUE_ARTIFACT_TYPES
+        ):
+            self.add_artifact_id(jira_id, ARTIFACT_TYPE_IDS[artifact_type], artifact_id)
+
+
+# Index of the migrated issues of a product, from the migration journal merged over the artifacts in spira.
+# Spira is fetched until a fetch finds no artifacts with a jira id outside the journal, e.g. from migrations
+# made before the journal or created by hand, from then on the journal alone resolves them.
+# With fetch_from_spira spira is always fetched, to also find the artifacts created since the last check.
+def load_artifact_index(
+    spira: Spira,
+    spira_product_id,
+    journal: MigrationJournal,
+    artifact_types,
+    fetch_from_spira=False,
+) -> ArtifactIndex:
+    artifact_index = ArtifactIndex()
+    artifact_index.add_journal_entries(journal)
+
+    get_all_artifacts = {
+        "requirement": spira.get_all_requirements,
+        "task": spira.get_all_tasks,
+        "incident": spira.get_all_incidents,
+    }
+    for artifact_type in artifact_types:
+        spira_check = journal.get_spira_check(artifact_type)
+        if spira_check is not None and spira_check[0] == 0 and not fetch_from_spira:
+            print(
+                "Resolving the migrated "
+                + artifact_type
+                + "s from the migration journal, spira was not consulted. "
+                + "Artifacts created in spira outside the migration since "
+                + time.strftime("%Y-%m-%d %H:%M", time.localtime(spira_check[1]))
+                + " are not found."
+            )
+            continue
+
+        print("Getting all current " + artifact_type + "s from spira")
+        outside_journal = 0
+        for artifact in get_all_artifacts[artifact_type](spira_product_id):
+            jira_id = get_artifact_jira_id(artifact)
+            if jira_id is None:
+                continue
+
+            # The journal wins, the artifacts it doesn't know are added from spira
+            if artifact_index.get(jira_id) is None and artifact_index.add_artifact(
+                jira_id, artifact, artifact_type
+            ):
+                outside_journal += 1
+
+        if outside_journal:
+            print(
+                str(outside_journal)
+                + " "
+                + artifact_type
+                + "s with a jira id found in spira without being in the migration journal"
+            )
+        journal.record_spira_check(artifact_type, outside_journal)
+
+    return artifact_index
+
+
+def get_artifact_jira_id(artifact):
+    for property in artifact.get("CustomProperties") or []:
+        if property["Definition"]["Name"] == "Jira Id" and property["StringValue"]:
+            return property["StringValue"]
+
+    return None
+
+
+# From the jira id to the id of the capabilities in spira, the first capability found wins.
+def get_capability_ids_by_jira_id(all_capabilies_in_spira) -> dict:
+    capability_ids = {}
+    for capability in all_capabilies_in_spira:
+        jira_id = get_artifact_jira_id(capability)
+        if jira_id is not None and jira_id not in capability_ids:
+            capability_ids[jira_id] = capability["CapabilityId"]
+
+    return capability_ids
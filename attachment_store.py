@@ -0,0 +1,270 @@
+# Attachment store
+# Content addressable store of the jira attachments on disk, shared between runs and commands, so a rehearsal
+# of the document migration doesn't download the attachments from jira again.
+# The files are named by the sha256 hash of their contents, and an index maps the jira attachment ids to the
+# hashes, so the same contents attached to many issues are stored once.
+# When the store grows over its size limit the least recently used contents are evicted.
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from attachment_transfer import (
+    ATTACHMENT_CHUNK_SIZE,
+    MEGABYTE,
+    spool_jira_attachment,
+)
+from parallel_insert import run_concurrently
+
+# Default location and size limit of the attachment store
+DEFAULT_ATTACHMENT_STORE_PATH = "temp/attachment_store"
+DEFAULT_ATTACHMENT_STORE_SIZE_MB = 4096
+
+# Evict down to this part of the size limit, so eviction doesn't run on every download
+ATTACHMENT_STORE_EVICTION_TARGET = 0.9
+
+
+class AttachmentStore:
+    def __init__(self, path, max_size_mb=DEFAULT_ATTACHMENT_STORE_SIZE_MB):
+        self.path = path
+        self.max_size = max_size_mb * MEGABYTE
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.join(path, "contents"), exist_ok=True)
+
+        # The downloads run on several threads, and several processes can share the store
+        self.connection = sqlite3.connect(
+            os.path.join(path, "index.sqlite"), timeout=60, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS attachments ("
+            "attachment_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS contents ("
+            "content_hash TEXT PRIMARY KEY, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS contents_last_used ON contents (last_used)"
+        )
+        self.connection.commit()
+
+        self.size = self.get_stored_size()
+        self.statistics = {"stored": 0, "downloaded": 0}
+
+    # Returns the file of the attachment at its start and the sha256 hash of its contents.
+    # The attachment is read from the store, or else downloaded from jira and added to it.
+    # size is the expected size of the attachment, if known. Attachments larger than the store are downloaded
+    # to a temporary file instead.
+    def fetch(self, jira, attachment_id, size=None):
+        stored_attachment = self.open(attachment_id)
+        if stored_attachment is not None:
+            self.count("stored")
+            return stored_attachment
+
+        self.count("downloaded")
+        if size is not None and size > self.max_size:
+            content_hash = hashlib.sha256()
+            attachment_file = spool_jira_attachment(jira, attachment_id, content_hash)
+            return attachment_file, content_hash.hexdigest()
+
+        return self.download(jira, attachment_id)
+
+    # Returns the stored file of the attachment and the hash of its contents, or None if it's not stored.
+    def open(self, attachment_id):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT content_hash FROM attachments JOIN contents USING (content_hash) "
+                "WHERE attachment_id = ?",
+                (str(attachment_id),),
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            content_hash = row[0]
+            try:
+                attachment_file = open(self.get_content_path(content_hash), "rb")
+            except FileNotFoundError:
+                # Removed from the disk outside the store, it's downloaded again
+                self.connection.execute(
+                    "DELETE FROM contents WHERE content_hash = ?", (content_hash,)
+                )
+                self.connection.commit()
+                return None
+
+            self.connection.execute(
+                "UPDATE contents SET last_used = ? WHERE content_hash = ?",
+                (time.time(), content_hash),
+            )
+            self.connection.commit()
+
+        return attachment_file, content_hash
+
+    # Download the attachment to a partial file in the store, and name it by its hash once it's complete.
+    def download(self, jira, attachment_id):
+        content_hash = hashlib.sha256()
+        partial_file = tempfile.NamedTemporaryFile(
+            dir=self.path, suffix=".part", delete=False
+        )
+
+        try:
+            with partial_file:
+                for chunk in jira.attachment(attachment_id).iter_content(
+                    ATTACHMENT_CHUNK_SIZE
+                ):
+                    partial_file.write(chunk)
+                    content_hash.update(chunk)
+        except Exception:
+            os.remove(partial_file.name)
+            raise
+
+        return self.add(attachment_id, partial_file.name, content_hash.hexdigest())
+
+    def add(self, attachment_id, partial_path, content_hash):
+        content_path = self.get_content_path(content_hash)
+        size = os.path.getsize(partial_path)
+
+        with self.lock:
+            if os.path.exists(content_path):
+                # The same contents are already stored for another attachment
+                os.remove(partial_path)
+            else:
+                os.makedirs(os.path.dirname(content_path), exist_ok=True)
+                os.replace(partial_path, content_path)
+
+            previous = self.connection.execute(
+                "SELECT size FROM contents WHERE content_hash = ?", (content_hash,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO contents (content_hash, size, last_used) VALUES (?, ?, ?)",
+                (content_hash, size, time.time()),
+            )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO attachments (attachment_id, content_hash) VALUES (?, ?)",
+                (str(attachment_id), content_hash),
+            )
+            self.size += size - (previous[0] if previous else 0)
+
+            attachment_file = open(content_path, "rb")
+            if self.size > self.max_size:
+                self.evict(content_hash)
+
+            self.connection.commit()
+
+        return attachment_file, content_hash
+
+    # Remove the least recently used contents until the store is under the eviction target.
+    # The contents just added are kept, they are being read.
+    def evict(self, kept_content_hash):
+        target_size = self.max_size * ATTACHMENT_STORE_EVICTION_TARGET
+
+        # Other processes might have added contents, start from the real size
+        self.size = self.get_stored_size()
+
+        evicted_hashes = []
+        for content_hash, size in self.connection.execute(
+            "SELECT content_hash, size FROM contents ORDER BY last_used"
+        ).fetchall():
+            if self.size <= target_size:
+                break
+            if content_hash == kept_content_hash:
+                continue
+
+            try:
+                os.remove(self.get_content_path(content_hash))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                # Still open elsewhere, e.g. on windows, it's evicted next time
+                continue
+
+            evicted_hashes.append((content_hash,))
+            self.size -= size
+
+        self.connection.executemany(
+            "DELETE FROM contents WHERE content_hash = ?", evicted_hashes
+        )
+        self.connection.executemany(
+            "DELETE FROM attachments WHERE content_hash = ?", evicted_hashes
+        )
+
+    def get_stored_size(self) -> int:
+        return self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM contents"
+        ).fetchone()[0]
+
+    # The contents are spread over subdirectories by the start of the hash, to keep the directories small.
+    def get_content_path(self, content_hash) -> str:
+        return os.path.join(self.path, "contents", content_hash[:2], content_hash)
+
+    def count(self, source):
+        with self.lock:
+            self.statistics[source] += 1
+
+    def print_statistics(self):
+        print(
+            "Attachments read from the attachment store: "
+            + str(self.statistics["stored"])
+            + ", downloaded from jira: "
+            + str(self.statistics["downloaded"])
+            + ", store size: "
+            + str(round(self.size / MEGABYTE, 1))
+            + " MB"
+        )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+# Fill the attachment store with the attachments of the jira issues ahead of the document migration,
+# at the same time with the given number of workers. Returns the number of attachments in the store.
+def prefetch_attachments(
+    jira, issues, attachment_store: AttachmentStore, workers=1
+) -> int:
+    attachments = [
+        attachment
+        for issue in issues
+        for attachment in issue["fields"].get("attachment") or []
+    ]
+    print("Attachments found and to be prefetched: " + str(len(attachments)))
+
+    attachments_size = sum(attachment.get("size") or 0 for attachment in attachments)
+    if attachments_size > attachment_store.max_size:
+        print(
+            "The attachments are "
+            + str(round(attachments_size / MEGABYTE, 1))
+            + " MB, more than the size limit of the attachment store,"
+            + " the least recently used are evicted while prefetching."
+        )
+
+    prefetched = run_concurrently(
+        attachments,
+        lambda attachment: prefetch_attachment(jira, attachment, attachment_store),
+        workers,
+    )
+
+    attachment_store.print_statistics()
+    return prefetched.count(True)
+
+
+def prefetch_attachment(jira, attachment, attachment_store: AttachmentStore) -> bool:
+    try:
+        attachment_file, _ = attachment_store.fetch(
+            jira, attachment["id"], attachment.get("size")
+        )
+        attachment_file.close()
+    except Exception as e:
+        print(
+            "An error occured when trying to fetch the attachment "
+            + str(attachment.get("filename"))
+            + " from jira: "
+            + str(e)[:200]
+        )
+        return False
+
+    return True
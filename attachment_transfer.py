@@ -0,0 +1,340 @@
+# Attachment transfer
+# Moves the jira attachments to spira without holding them in memory. An attachment is downloaded in chunks
+# to a temporary file, and sent to spira as a json body that base64 encodes the file while it's being sent.
+# The memory used per transfer is a few chunks, whatever the size of the attachment.
+# The downloads and uploads run in separate pools, limited by the bytes in flight between them.
+import base64
+import json
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Read and encoded at a time, a multiple of 3 so the base64 of the chunks can be joined without padding
+ATTACHMENT_CHUNK_SIZE = 3 * 256 * 1024
+
+# Attachments up to this size are kept in memory instead of a temporary file
+ATTACHMENT_SPOOL_SIZE = 1024 * 1024
+
+MEGABYTE = 1024 * 1024
+
+# Bytes of attachments downloaded and not uploaded yet, by default
+DEFAULT_TRANSFER_BUDGET = 256 * MEGABYTE
+
+# Seconds between the progress reports of a transfer
+TRANSFER_REPORT_INTERVAL = 10
+
+
+# Download a jira attachment in chunks to a temporary file, returns the file at its start.
+# The file is removed when it's closed. The chunks are added to content_hash, if given, while downloading.
+def spool_jira_attachment(jira, attachment_id, content_hash=None):
+    attachment_file = tempfile.SpooledTemporaryFile(max_size=ATTACHMENT_SPOOL_SIZE)
+
+    try:
+        for chunk in jira.attachment(attachment_id).iter_content(ATTACHMENT_CHUNK_SIZE):
+            attachment_file.write(chunk)
+            if content_hash is not None:
+                content_hash.update(chunk)
+    except Exception:
+        attachment_file.close()
+        raise
+
+    attachment_file.seek(0)
+    return attachment_file
+
+
+def get_file_size(file) -> int:
+    position = file.tell()
+    file.seek(0, 2)
+    size = file.tell()
+    file.seek(position)
+    return size
+
+
+# A json body with the contents of a file as a base64 string field, read like a file by requests.
+# The length is known up front, so the body is sent with a content length instead of chunked.
+class Base64JsonBody:
+    def __init__(self, body, field_name, file):
+        self.file = file
+        self.file_size = get_file_size(file) - file.tell()
+
+        # The body without the field, ending with the opening quote of the field value.
+        # A placeholder of the field in the body is left out, so the field is sent once.
+        body = {key: value for key, value in body.items() if key != field_name}
+        opening = json.dumps(body)[:-1]
+        if body:
+            opening += ", "
+        opening += json.dumps(field_name) + ': "'
+
+        self.parts = [opening.encode("utf-8"), None, b'"}']
+        self.part_index = 0
+
+        # The part being read, the file part is read and encoded one chunk at a time
+        self.buffer = b""
+        self.offset = 0
+
+    def __len__(self) -> int:
+        encoded_size = 4 * ((self.file_size + 2) // 3)
+        return len(self.parts[0]) + encoded_size + len(self.parts[2])
+
+    # Returns at most size bytes, less at the end of a part, and nothing at the end of the body.
+    def read(self, size=-1) -> bytes:
+        while self.offset >= len(self.buffer):
+            if self.part_index >= len(self.parts):
+                return b""
+            self.buffer = self.read_part()
+            self.offset = 0
+
+        if size is None or size < 0:
+            size = len(self.buffer) - self.offset
+
+        data = self.buffer[self.offset : self.offset + size]
+        self.offset += len(data)
+        return data
+
+    def read_part(self) -> bytes:
+        part = self.parts[self.part_index]
+        if part is not None:
+            self.part_index += 1
+            return part
+
+        chunk = self.file.read(ATTACHMENT_CHUNK_SIZE)
+        if not chunk:
+            self.part_index += 1
+            return b""
+
+        return base64.b64encode(chunk)
+
+
+# Bytes of attachments downloaded but not yet uploaded, the downloads wait while the budget is used up.
+# An attachment larger than the whole budget is still transferred, when nothing else is in flight.
+class ByteBudget:
+    def __init__(self, budget):
+        self.budget = budget
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, size):
+        with self.condition:
+            while self.in_flight > 0 and self.in_flight + size > self.budget:
+                self.condition.wait()
+            self.in_flight += size
+
+    # Correct a reservation once the actual size is known, without waiting. The download is already done,
+    # and the downloads holding reservations could otherwise wait on each other.
+    def adjust(self, reserved_size, size):
+        with self.condition:
+            self.in_flight += size - reserved_size
+            self.condition.notify_all()
+
+    def release(self, size):
+        with self.condition:
+            self.in_flight -= size
+            self.condition.notify_all()
+
+
+# Transfer the items with a pool of download workers and a pool of upload workers, connected by a queue.
+# download(item) returns a file, or None when it failed. upload(item, file) returns if it was uploaded,
+# the file is closed after.
+# get_size(item) is the expected size of the download, the budget is reserved before the download starts.
+# Downloads of an unknown size, None or 0, reserve the whole budget, so they only run alone.
+# Returns the results in the order of the items, False for the items that failed to download.
+class AttachmentPipeline:
+    def __init__(
+        self,
+        download,
+        upload,
+        get_size,
+        download_workers=1,
+        upload_workers=1,
+        byte_budget=DEFAULT_TRANSFER_BUDGET,
+    ):
+        self.download = download
+        self.upload = upload
+        self.get_size = get_size
+        self.download_workers = max(download_workers, 1)
+        self.upload_workers = max(upload_workers, 1)
+        self.byte_budget = ByteBudget(byte_budget)
+
+        self.download_slots = threading.Semaphore(self.download_workers)
+        self.upload_queue = queue.Queue()
+        self.results = []
+
+        self.statistics_lock = threading.Lock()
+        self.statistics = {
+            "downloaded": 0,
+            "downloaded_bytes": 0,
+            "uploaded": 0,
+            "uploaded_bytes": 0,
+        }
+        self.started_at = time.monotonic()
+        self.reported_at = self.started_at
+
+    def run(self, items) -> list:
+        items = list(items)
+        self.results = [False] * len(items)
+        self.total = len(items)
+        self.started_at = time.monotonic()
+
+        uploaders = [
+            threading.Thread(target=self.upload_from_queue, daemon=True)
+            for _ in range(self.upload_workers)
+        ]
+        for uploader in uploaders:
+            uploader.start()
+
+        with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+            for index, item in enumerate(items):
+                size = self.get_size(item) or self.byte_budget.budget
+
+                # Only start a download when a worker is free, so the budget isn't held by waiting downloads
+                self.download_slots.acquire()
+                self.byte_budget.acquire(size)
+                executor.submit(self.download_item, index, item, size)
+
+        for _ in uploaders:
+            self.upload_queue.put(None)
+        for uploader in uploaders:
+            uploader.join()
+
+        self.report(force=True)
+        return self.results
+
+    def download_item(self, index, item, reserved_size):
+        try:
+            file = self.download(item)
+        except Exception as e:
+            print(e)
+            file = None
+        finally:
+            self.download_slots.release()
+
+        if file is None:
+            self.byte_budget.release(reserved_size)
+            return
+
+        size = get_file_size(file)
+        self.byte_budget.adjust(reserved_size, size)
+        self.count("downloaded", size)
+        self.upload_queue.put((index, item, file, size))
+
+    def upload_from_queue(self):
+        while True:
+            upload = self.upload_queue.get()
+            if upload is None:
+                return
+
+            index, item, file, size = upload
+            try:
+                with file:
+                    self.results[index] = self.upload(item, file)
+            except Exception as e:
+                print(e)
+            finally:
+                self.byte_budget.release(size)
+
+            self.count("uploaded", size)
+            self.report()
+
+    def count(self, transfer, size):
+        with self.statistics_lock:
+            self.statistics[transfer] += 1
+            self.statistics[transfer + "_bytes"] += size
+
+    # Prints the progress and the throughput of both sides every TRANSFER_REPORT_INTERVAL seconds.
+    def report(self, force=False):
+        with self.statistics_lock:
+            now = time.monotonic()
+            if not force and now - self.reported_at < TRANSFER_REPORT_INTERVAL:
+                return
+            self.reported_at = now
+
+            elapsed = max(now - self.started_at, 0.001)
+            print(
+                "Attachments downloaded: "
+                + str(self.statistics["downloaded"])
+                + ", uploaded: "
+                + str(self.statistics["uploaded"])
+                + " of "
+                + str(self.total)
+                + ", download "
+                + format_megabytes_per_second(
+                    self.statistics["downloaded_bytes"], elapsed
+                )
+                + ", upload "
+                + format_megabytes_per_second(
+                    self.statistics["uploaded_bytes"], elapsed
+                )
+                + ", waiting for upload: "
+                + str(self.upload_queue.qsize())
+                + ", in flight: "
+                + str(round(self.byte_budget.in_flight / MEGABYTE, 1))
+                + " MB"
+            )
+
+
+def format_megabytes_per_second(size, seconds) -> str:
+    return str(round(size / MEGABYTE / seconds, 2)) + " MB/s"
+
+
+# The spira documents by the sha256 hash of their contents, so an attachment on many issues is uploaded once.
+# The first upload of a hash claims it, the later copies wait for the id of its document.
+# The hashes are recorded in the migration journal, so the documents of earlier runs are found too.
+class DocumentHashIndex:
+    def __init__(self, journal=None):
+        self.journal = journal
+        self.documents = {}
+        self.lock = threading.Lock()
+
+        self.statistics = {"duplicates": 0, "duplicate_bytes": 0}
+
+    # Returns the id of the document with the hash, waiting while its upload is running.
+    # Returns None when the hash is claimed for the caller, who uploads it and then calls set_document_id.
+    def get_or_claim(self, content_hash):
+        while True:
+            with self.lock:
+                document = self.documents.get(content_hash)
+                if document is None:
+                    document = {"document_id": None, "uploaded": threading.Event()}
+                    self.documents[content_hash] = document
+
+                    if self.journal is not None:
+                        document["document_id"] = self.journal.get_spira_id(
+                            content_hash, "document_hash"
+                        )
+                    if document["document_id"] is None:
+                        return None
+                    document["uploaded"].set()
+
+            document["uploaded"].wait()
+            if document["document_id"] is not None:
+                return document["document_id"]
+
+            # The upload that claimed it failed, the next copy claims it again
+
+    # The result of a claimed upload, None when it failed.
+    def set_document_id(self, content_hash, document_id):
+        with self.lock:
+            document = self.documents[content_hash]
+            document["document_id"] = document_id
+            if document_id is None:
+                del self.documents[content_hash]
+            elif self.journal is not None:
+                self.journal.record(content_hash, "document_hash", document_id)
+
+        document["uploaded"].set()
+
+    def count_duplicate(self, size):
+        with self.lock:
+            self.statistics["duplicates"] += 1
+            self.statistics["duplicate_bytes"] += size
+
+    def print_statistics(self):
+        print(
+            "Duplicate attachments associated with an existing document: "
+            + str(self.statistics["duplicates"])
+            + ", upload saved: "
+            + str(round(self.statistics["duplicate_bytes"] / MEGABYTE, 1))
+            + " MB"
+        )
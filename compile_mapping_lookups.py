@@ -0,0 +1,240 @@
+from utility import combine_jira_types
+
+
+# Compile the mapping file and the spira product metadata to flat lookup tables, used by the issue conversion.
+# Every table goes from a jira value straight to the spira id, so the conversion never has to scan the metadata lists.
+def compile_product_mapping_lookups(mapping_dict, spira_metadata, issues=None) -> dict:
+    lookups = {
+        "statuses": {},
+        "priorities": {},
+        "types": {},
+        "type_names": {},
+        "artifact_types": compile_artifact_types(
+            mapping_dict["types"], ["requirements", "incidents", "tasks"]
+        ),
+    }
+
+    # Mapping artifact type, spira metadata artifact type, priority list in spira metadata and its id key
+    product_artifacts = [
+        ("requirements", "requirement", "importances", "ImportanceId"),
+        ("incidents", "incident", "incident_priorities", "PriorityId"),
+        ("tasks", "task", "task_priorities", "PriorityId"),
+    ]
+
+    for artifact_type, spira_type, priority_key, priority_id_key in product_artifacts:
+        lookups["statuses"][artifact_type] = compile_name_mapping(
+            mapping_dict["statuses"][artifact_type],
+            spira_metadata["statuses"][spira_type],
+            get_status_id,
+            artifact_type + " status",
+        )
+        lookups["priorities"][artifact_type] = compile_name_mapping(
+            mapping_dict["priorities"][artifact_type],
+            spira_metadata[priority_key],
+            lambda x: x[priority_id_key],
+            artifact_type + " priority",
+        )
+        lookups["type_names"][artifact_type] = compile_type_names(
+            mapping_dict["types"][artifact_type]
+        )
+        lookups["types"][artifact_type] = compile_name_mapping(
+            lookups["type_names"][artifact_type],
+            spira_metadata["types"][spira_type],
+            lambda x, spira_type=spira_type: get_type_id(x, spira_type),
+            artifact_type + " type",
+        )
+
+    lookups["releases"] = compile_name_index(spira_metadata["releases"], "ReleaseId")
+    lookups["components"] = compile_name_index(
+        spira_metadata["components"], "ComponentId"
+    )
+
+    # The capabilities are migrated by the program flow, their types are not unmapped here
+    report_unmapped_issue_values(
+        lookups,
+        issues or [],
+        combine_jira_types(mapping_dict["types"].get("capabilities") or {}),
+    )
+
+    return lookups
+
+
+# Compile the mapping file and the spira program metadata to flat lookup tables, used by the capability conversion.
+def compile_program_mapping_lookups(mapping_dict, spira_metadata, issues=None) -> dict:
+    lookups = {
+        "statuses": {
+            "capabilities": compile_name_mapping(
+                mapping_dict["statuses"]["capabilities"],
+                spira_metadata["statuses"]["capability"],
+                get_status_id,
+                "capabilities status",
+            )
+        },
+        "priorities": {
+            "capabilities": compile_name_mapping(
+                mapping_dict["priorities"]["capabilities"],
+                spira_metadata["priorities"]["capability"],
+                lambda x: x["CapabilityPriorityId"],
+                "capabilities priority",
+            )
+        },
+        "types": {},
+        "type_names": {
+            "capabilities": compile_type_names(mapping_dict["types"]["capabilities"])
+        },
+        "artifact_types": compile_artifact_types(
+            mapping_dict["types"], ["capabilities"]
+        ),
+    }
+
+    lookups["types"]["capabilities"] = compile_name_mapping(
+        lookups["type_names"]["capabilities"],
+        spira_metadata["types"]["capability"],
+        lambda x: x["CapabilityTypeId"],
+        "capabilities type",
+    )
+
+    lookups["milestones"] = compile_name_index(
+        spira_metadata["milestones"], "MilestoneId"
+    )
+
+    # The issues of the product artifact types are migrated by the product flow
+    report_unmapped_issue_values(
+        lookups,
+        issues or [],
+        [
+            jira_type
+            for artifact_type in ["requirements", "incidents", "tasks"]
+            for jira_type in combine_jira_types(
+                mapping_dict["types"].get(artifact_type) or {}
+            )
+        ],
+    )
+
+    return lookups
+
+
+# Map every jira value in a mapping to the id of the spira object with the mapped name, the first spira object found wins.
+# Jira values mapped to a name that does not exist in spira are left out and reported.
+def compile_name_mapping(mapping, spira_objects, get_id, description) -> dict:
+    spira_ids_by_name = {}
+    for spira_object in spira_objects:
+        spira_id = get_id(spira_object)
+        if spira_object["Name"] not in spira_ids_by_name and spira_id is not None:
+            spira_ids_by_name[spira_object["Name"]] = int(spira_id)
+
+    compiled = {}
+    for jira_value, spira_name in (mapping or {}).items():
+        if spira_name in spira_ids_by_name:
+            compiled[jira_value] = spira_ids_by_name[spira_name]
+        else:
+            print(
+                "Spira "
+                + description
+                + " '"
+                + str(spira_name)
+                + "' mapped from jira value '"
+                + str(jira_value)
+                + "' does not exist in spira"
+            )
+
+    return compiled
+
+
+# Flatten the type tree in the mapping file, from jira issue type to the spira type name.
+def compile_type_names(type_mapping) -> dict:
+    type_names = {}
+    for spira_type, jira_types in (type_mapping or {}).items():
+        for jira_type in jira_types if isinstance(jira_types, list) else [jira_types]:
+            if jira_type not in type_names:
+                type_names[jira_type] = spira_type
+    return type_names
+
+
+# From jira issue type to the artifact type it's migrated as, the first artifact type in the list wins.
+def compile_artifact_types(type_mapping, artifact_types) -> dict:
+    compiled = {}
+    for artifact_type in artifact_types:
+        for jira_type in combine_jira_types(type_mapping[artifact_type]):
+            if jira_type not in compiled:
+                compiled[jira_type] = artifact_type
+    return compiled
+
+
+# From name to the id of the spira object, the first spira object found wins.
+def compile_name_index(spira_objects, id_key) -> dict:
+    index = {}
+    for spira_object in spira_objects:
+        if spira_object["Name"] not in index and id_key in spira_object:
+            index[spira_object["Name"]] = spira_object[id_key]
+    return index
+
+
+def get_status_id(status_object):
+    for status_id_key in [
+        "StatusId",
+        "RequirementStatusId",
+        "IncidentStatusId",
+        "TaskStatusId",
+        "CapabilityStatusId",
+    ]:
+        if status_id_key in status_object:
+            return status_object[status_id_key]
+    return None
+
+
+def get_type_id(type_object, spira_type):
+    type_id_keys = {
+        "requirement": "RequirementTypeId",
+        "incident": "IncidentTypeId",
+        "task": "TaskTypeId",
+    }
+    return type_object[type_id_keys[spira_type]]
+
+
+# Report all the statuses, priorities, types, versions and components in the extracted issues that have no match, before any conversion starts.
+# Issues of the ignored issue types are migrated by another flow, they are left out.
+def report_unmapped_issue_values(lookups, issues, ignored_issue_types=()):
+    unmapped = set()
+    ignored_issue_types = set(ignored_issue_types)
+
+    for issue in issues:
+        issue_type = issue["fields"]["issuetype"]["name"]
+        artifact_type = lookups["artifact_types"].get(issue_type)
+
+        if artifact_type is None:
+            if issue_type not in ignored_issue_types:
+                unmapped.add(("issue type", "any artifact", issue_type))
+            continue
+
+        if issue_type not in lookups["types"][artifact_type]:
+            unmapped.add(("type", artifact_type, issue_type))
+
+        status = issue["fields"]["status"]["name"]
+        if status not in lookups["statuses"][artifact_type]:
+            unmapped.add(("status", artifact_type, status))
+
+        priority = issue["fields"].get("priority")
+        if priority and priority["name"] not in lookups["priorities"][artifact_type]:
+            unmapped.add(("priority", artifact_type, priority["name"]))
+
+        fix_versions = issue["fields"].get("fixVersions", [])
+        if "releases" in lookups:
+            for version in fix_versions + issue["fields"].get("versions", []):
+                if version["name"] not in lookups["releases"]:
+                    unmapped.add(("version", "releases", version["name"]))
+        if "milestones" in lookups:
+            for version in fix_versions:
+                if version["name"] not in lookups["milestones"]:
+                    unmapped.add(("version", "milestones", version["name"]))
+
+        if "components" in lookups:
+            for component in issue["fields"].get("components", []):
+                if component["name"] not in lookups["components"]:
+                    unmapped.add(("component", "components", component["name"]))
+
+    if unmapped:
+        print("The following jira values found in the issues have no match in spira:")
+        for kind, target, value in sorted(unmapped):
+            print("  Jira " + kind + " '" + value + "' for " + target)
+        print("Artifacts with these values will get a default or empty value in spira")
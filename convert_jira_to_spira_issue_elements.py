@@ -1,9 +1,15 @@
 from spira import Spira
-from utility import convert_jira_markup_to_html
+from jira_markup_renderer import (
+    render_issue_markup,
+    resolve_rendered_markup,
+    get_comment_rendered_key,
+)
 from convert_jira_to_spira_issues import (
     jira_string_field_to_spira_custom_prop,
     jira_datetime_field_to_spira_custom_prop,
+    normalize_email,
 )
+from artifact_index import ArtifactIndex
 import json
 
 
@@ -12,7 +18,7 @@ def convert_jira_to_spira_issue_elements(
     skip_ssl,
     jira_output_dict,
     mapping_dict,
-    all_artifacts_in_spira,
+    artifact_index: ArtifactIndex,
     action,
     spira: Spira,
     spira_metadata={},
@@ -38,10 +44,10 @@ def convert_jira_to_spira_issue_elements(
                     artifact = {"project_id": mapping_dict["spira_product_id"]}
                     if "outwardIssue" in link.keys():
                         source_id_data = get_artifact_id_data_from_jira_id(
-                            issue["key"], all_artifacts_in_spira
+                            issue["key"], artifact_index
                         )
                         dest_id_data = get_artifact_id_data_from_jira_id(
-                            link["outwardIssue"]["key"], all_artifacts_in_spira
+                            link["outwardIssue"]["key"], artifact_index
                         )
                         issues_with_outward_links.append(issue["key"])
                         all_outward_links.append(link["outwardIssue"]["key"])
@@ -69,6 +75,7 @@ def convert_jira_to_spira_issue_elements(
                             }
 
                             validation_dict["update_action"] = "association"
+                            artifact["jira_key"] = link["id"]
                             artifact["payload"] = payload
                             validation_dict["artifacts"].append(artifact)
 
@@ -89,10 +96,11 @@ def convert_jira_to_spira_issue_elements(
                 for comment in issue["fields"]["comment"]["comments"]:
                     artifact = {"project_id": mapping_dict["spira_product_id"]}
                     source_id_data = get_artifact_id_data_from_jira_id(
-                        issue["key"], all_artifacts_in_spira
+                        issue["key"], artifact_index
                     )
                     userinfo = get_user_info_from_email(
-                        comment["author"]["emailAddress"], spira_metadata["users"]
+                        comment["author"]["emailAddress"],
+                        spira_metadata["users_by_email"],
                     )
                     if source_id_data:
                         payload = {
@@ -102,8 +110,12 @@ def convert_jira_to_spira_issue_elements(
                             "UserId": userinfo["spira_id"],
                             # "UserGuid":None,
                             "UserName": userinfo["name"],
-                            "Text": convert_jira_markup_to_html(
-                                jira_connection_dict, skip_ssl, comment["body"]
+                            "Text": render_issue_markup(
+                                jira_connection_dict,
+                                skip_ssl,
+                                issue,
+                                get_comment_rendered_key(comment),
+                                comment["body"],
                             ),
                             # "CreationDate":None,
                             # "IsDeleted":False,
@@ -111,6 +123,7 @@ def convert_jira_to_spira_issue_elements(
                         }
 
                         validation_dict["update_action"] = "comment"
+                        artifact["jira_key"] = comment["id"]
                         artifact["artifacttype"] = source_id_data["artifact_type_id"]
                         artifact["payload"] = payload
                         validation_dict["artifacts"].append(artifact)
@@ -136,10 +149,11 @@ def convert_jira_to_spira_issue_elements(
                 for document in issue["fields"]["attachment"]:
                     artifact = {"project_id": mapping_dict["spira_product_id"]}
                     source_id_data = get_artifact_id_data_from_jira_id(
-                        issue["key"], all_artifacts_in_spira
+                        issue["key"], artifact_index
                     )
                     userinfo = get_user_info_from_email(
-                        document["author"]["emailAddress"], spira_metadata["users"]
+                        document["author"]["emailAddress"],
+                        spira_metadata["users_by_email"],
                     )
                     payload = {
                         "BinaryData": None,
@@ -189,43 +203,32 @@ def convert_jira_to_spira_issue_elements(
                     if source_id_data:
                         artifact["artifacttype"] = source_id_data["artifact_type_id"]
 
+                    artifact["jira_key"] = document["id"]
                     artifact["jira_attachment_url"] = document["content"]
                     artifact["document_id"] = document["id"]
+                    artifact["document_size"] = document.get("size")
                     artifact["payload"] = payload
                     validation_dict["artifacts"].append(artifact)
 
+    # The markup of all the comments was submitted while building, collect the html
+    resolve_rendered_markup(validation_dict)
+
     json.dump(validation_dict, to_validate, indent=4)
     to_validate.close()
 
 
-def get_artifact_id_data_from_jira_id(jira_id, all_artifacts_in_spira):
-    for artifact in all_artifacts_in_spira:
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == jira_id
-                ),
-                artifact["CustomProperties"],
-            ),
-            None,
-        )
-        if property is not None:
-            artifact_type_id = artifact["ArtifactTypeId"]
-            artifact_id = next(iter(artifact.values()))
+def get_artifact_id_data_from_jira_id(jira_id, artifact_index: ArtifactIndex):
+    return artifact_index.get(jira_id)
 
-            return {"artifact_type_id": artifact_type_id, "artifact_id": artifact_id}
 
-    return None
+def get_user_info_from_email(email, users_by_email):
+    user = users_by_email.get(normalize_email(email))
 
-
-def get_user_info_from_email(email, all_users_in_spira):
-    for user in all_users_in_spira:
-        if email == user["EmailAddress"]:
-            return {
-                "spira_id": user["UserId"],
-                "name": user["FirstName"] + " " + user["LastName"],
-            }
+    if user:
+        return {
+            "spira_id": user["UserId"],
+            "name": user["FirstName"] + " " + user["LastName"],
+        }
 
     return {"spira_id": "", "name": ""}
 
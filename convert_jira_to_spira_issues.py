@@ -1,408 +1,631 @@
 from jira import JIRA
 from spira import Spira
-from datetime import datetime
-from utility import convert_jira_markup_to_html, try_json_dump_string
+from utility import parse_jira_datetime, try_json_dump_string
+from jira_markup_renderer import (
+    render_issue_markup,
+    resolve_rendered_markup,
+    take_render_statistics,
+    add_render_statistics,
+    close_jira_markup_renderers,
+)
+from failure_log import log_failure
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import multiprocessing.util
+from collections import deque
 import json
 
 
-# Convert a single type of issues to the correctly mapped one in Spira.
-def convert_jira_to_spira_issues(
+# Convert the issues of all the jira types in order, the converted artifacts are yielded as soon as they are ready.
+def iterate_converted_issue_types(
     jira_connection_dict,
     skip_ssl,
-    jira_output_dict,
+    issue_partitions,
+    mapping_dict,
+    spira_metadata,
+    jira_metadata,
+    conversion_pool=None,
+):
+    for jira_type in mapping_dict["artifact_type_order"]:
+        print("------------------------------------------------------------")
+        print("Processing issues of jira type: " + jira_type)
+        print("------------------------------------------------------------")
+
+        # Check which artifact type the jira type is mapped to
+        artifact_type = spira_metadata["lookups"]["artifact_types"].get(jira_type)
+        issues_of_type = issue_partitions.get(artifact_type, {}).get(jira_type, [])
+
+        if not issues_of_type:
+            print("No issues of jira type " + jira_type + " to migrate, skipping.")
+            continue
+
+        print("Starting conversion of Spira artifact type: " + str(artifact_type))
+        print("With Jira issue type: " + str(jira_type))
+
+        yield from iterate_converted_issues(
+            jira_connection_dict,
+            skip_ssl,
+            issues_of_type,
+            mapping_dict,
+            spira_metadata,
+            jira_metadata,
+            artifact_type,
+            conversion_pool,
+        )
+
+        print("Conversion of type " + jira_type + " finished.")
+
+
+# Convert the issues of a single type, in the original order, the converted artifacts are yielded with their html.
+# With a conversion pool the issues are converted in chunks on the worker processes, a few chunks ahead.
+# Without it the markup of the next issues is rendered while waiting for the html of the first ones.
+# Issues that fail to convert are written to the failure log and left out, the rest are converted.
+def iterate_converted_issues(
+    jira_connection_dict,
+    skip_ssl,
+    issues,
     mapping_dict,
     spira_metadata,
     jira_metadata,
-    all_requirements_in_spira,
     current_artifact_type,
-    current_issue_type,
+    conversion_pool=None,
 ):
-    print("Starting conversion of Spira artifact type: " + str(current_artifact_type))
-    print("With Jira issue type: " + str(current_issue_type))
+    if conversion_pool is not None:
+        converting_chunks = deque()
 
-    to_validate = open("temp/to_spira.json", "w")
+        for chunk in chunk_issues(issues, ISSUE_CONVERSION_CHUNK_SIZE):
+            converting_chunks.append(
+                (
+                    conversion_pool.submit(
+                        convert_jira_issue_chunk, chunk, current_artifact_type
+                    ),
+                    [issue["key"] for issue in chunk],
+                )
+            )
 
-    validation_dict = {
-        "product": [],
-    }
+            if len(converting_chunks) >= ISSUE_CONVERSION_CHUNKS_AHEAD:
+                yield from take_converted_chunk(
+                    converting_chunks.popleft(), current_artifact_type
+                )
 
-    issues = jira_output_dict["issues"]
+        while converting_chunks:
+            yield from take_converted_chunk(
+                converting_chunks.popleft(), current_artifact_type
+            )
+    else:
+        rendering_artifacts = deque()
 
-    # What kind of spira artifact type we are converting to from the jira issue and issue type.
-    if current_artifact_type == "requirements":
-        # Find the top level issues, aka initiatives
         for issue in issues:
-            # Check if issue is not already in capabilities, and filter out the currently processed jira issue type.
-            #
-            # issue should not be in capabilities AND
-            # spira mapped name should exist AND
-            # the issue type of the issue should match what we're currently processing.
-            if (
-                not_in_capabilities((issue["key"]), spira_metadata["capabilites"])
-                and get_mapped_spira_type_name(
-                    mapping_dict["types"][current_artifact_type],
-                    issue["fields"]["issuetype"]["name"],
-                )
-                is not None
-                and issue["fields"]["issuetype"]["name"] == current_issue_type
-            ):
-                requirement = {"project_id": spira_metadata["project"]["ProjectId"]}
-
-                payload = {
-                    # Requirement_id - READ ONLY - set when spira creates the artifact inside its system
-                    # Indentlevel - Initiative level does not need to be set, as its the highest level which gets assigned automatically.
-                    "StatusId": jira_status_to_spira_status_id(
-                        mapping_dict["statuses"]["requirements"],
-                        spira_metadata["statuses"]["requirement"],
-                        issue["fields"]["status"]["name"],
-                    ),
-                    "RequirementTypeId": jira_issue_type_to_spira_requirement_type_id(
-                        spira_metadata["types"]["requirement"],
-                        issue["fields"]["issuetype"]["name"],
-                        mapping_dict,
-                    ),
-                    "AuthorId": find_spira_user_id_by_email(
-                        spira_metadata["users"], "reporter", issue
-                    ),
-                    "OwnerId": find_spira_user_id_by_email(
-                        spira_metadata["users"], "assignee", issue
-                    ),
-                    "ImportanceId": jira_priority_to_requirement_importance_id(
-                        spira_metadata["importances"],
-                        issue["fields"]["priority"],
-                        mapping_dict,
-                    ),  # REQUIRED - differs between jira and spira, mapped in the mapping file
-                    "ReleaseId": jira_version_to_spira_release_id(
-                        spira_metadata["releases"], issue
-                    ),  # REQUIRED - the id of the release to connect to, we need to have prepared the releases in Spira
-                    "ComponentId": jira_component_to_spira_component_id(
-                        spira_metadata["components"], issue, isComponentArray=False
-                    ),
-                    "Name": issue["fields"]["summary"],
-                    "Description": convert_jira_markup_to_html(
+            try:
+                rendering_artifacts.append(
+                    convert_jira_issue(
                         jira_connection_dict,
                         skip_ssl,
-                        issue["fields"]["description"],
-                    ),
-                    # CreationDate # READ ONLY - is read only, special solution needed with custom properties below.
-                    # LastUpdateDate" # READ ONLY - is read only, special solution needed with custom properties below.
-                    # Summary - READ ONLY
-                    "EstimatePoints": calculate_estimate_points(
-                        issue["fields"]["aggregatetimeoriginalestimate"]
-                    ),
-                    # EstimatedEffort - ?
-                    # TaskEstimatedEffort - ?
-                    # TaskActualEffort - ?
-                    # TaskCount - READ ONLY
-                    # ReleaseVerionNumber - READ ONLY
-                    # Steps - READ ONLY
-                    "StartDate": get_jira_data_from_custom_field(
-                        issue, jira_metadata["customfields"], "Target start"
-                    ),
-                    "EndDate": get_jira_data_from_custom_field(
-                        issue, jira_metadata["customfields"], "Target end"
-                    ),
-                    "PercentComplete": None,
-                    "GoalId": None,
-                    "IsSuspect": False,  # False is the default value
-                    # ProjectId - Suspected that it is derived from the projectid in the input, as it's populated when a GET of the artifact is made
-                    # ConcurrencyDate - READ ONLY
-                    "Tags": ",".join(map(str, issue["fields"]["labels"])),
-                }
-
-                # releaseid and componentid
-                requirement["artifact_type"] = "requirement"
-
-                # Add all the custom properties
-                payload["CustomProperties"] = add_custom_properties(
-                    issue,
-                    spira_metadata,
-                    jira_metadata,
-                    mapping_dict["custom_props"]["requirements"],
-                    "requirement",
-                    jira_connection_dict,
-                    skip_ssl,
+                        issue,
+                        mapping_dict,
+                        spira_metadata,
+                        jira_metadata,
+                        current_artifact_type,
+                    )
                 )
+            except Exception as e:
+                log_conversion_failure(e, issue.get("key"), current_artifact_type)
 
-                requirement["payload"] = payload
-                requirement["parentlink"] = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], "Parent Link"
-                )
-                requirement["epiclink"] = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], "Epic Link"
+            # The markup was submitted while building, collect the html of the oldest artifact
+            if len(rendering_artifacts) >= ISSUE_RENDERS_AHEAD:
+                yield from take_rendered_artifact(
+                    rendering_artifacts.popleft(), current_artifact_type
                 )
-                validation_dict["product"].append(requirement)
 
-    # Else if it's currently processing jira issue of type Sub-task to spira artifact type Task
+        while rendering_artifacts:
+            yield from take_rendered_artifact(
+                rendering_artifacts.popleft(), current_artifact_type
+            )
+
+
+def take_rendered_artifact(artifact, current_artifact_type) -> list:
+    try:
+        return [resolve_rendered_markup(artifact)]
+    except Exception as e:
+        log_conversion_failure(e, artifact.get("jira_key"), current_artifact_type)
+        return []
+
+
+# The issues that failed on the worker are logged here, a chunk that failed as a whole logs all its issues.
+def take_converted_chunk(converting_chunk, current_artifact_type) -> list:
+    chunk_future, jira_keys = converting_chunk
+    try:
+        converted_chunk, failures, chunk_render_statistics = chunk_future.result()
+    except Exception as e:
+        for jira_key in jira_keys:
+            log_conversion_failure(e, jira_key, current_artifact_type)
+        return []
+
+    add_render_statistics(chunk_render_statistics)
+    for jira_key, error in failures:
+        log_conversion_failure(error, jira_key, current_artifact_type)
+
+    return converted_chunk
+
+
+# The conversion failures are logged without a request, they can't be sent to spira again by retry_failed.
+def log_conversion_failure(error, jira_key, current_artifact_type):
+    log_failure(error, current_artifact_type[:-1], jira_key, None, stage="conversion")
+
+
+# Write the converted artifacts to a file in the format of temp/to_spira.json, while passing them on.
+def tap_artifacts_to_file(artifacts, output_file_handle):
+    output_file_handle.write('{\n    "product": [')
+
+    separator = "\n"
+    for artifact in artifacts:
+        output_file_handle.write(separator + json.dumps(artifact, indent=4))
+        separator = ",\n"
+        yield artifact
+
+    output_file_handle.write("\n    ]\n}\n")
+    output_file_handle.flush()
+
+
+# Convert a single issue to the artifact of the spira artifact type it's mapped to.
+def convert_jira_issue(
+    jira_connection_dict,
+    skip_ssl,
+    issue,
+    mapping_dict,
+    spira_metadata,
+    jira_metadata,
+    current_artifact_type,
+) -> dict:
+    # What kind of spira artifact type we are converting to from the jira issue and issue type.
+    if current_artifact_type == "requirements":
+        convert_function = convert_jira_issue_to_spira_requirement
     elif current_artifact_type == "tasks":
-        # Find all the sub-tasks
-        for issue in issues:
-            # Check if issue is not already in capabilities, and filter out the currently processed jira issue type.
-            #
-            # issue should not be in capabilities AND
-            # spira mapped name should exist AND
-            # the issue type of the issue should match what is currently processing.
-            if (
-                not_in_capabilities((issue["key"]), spira_metadata["capabilites"])
-                and get_mapped_spira_type_name(
-                    mapping_dict["types"][current_artifact_type],
-                    issue["fields"]["issuetype"]["name"],
-                )
-                is not None
-                and issue["fields"]["issuetype"]["name"] == current_issue_type
-            ):
-                task = {"project_id": spira_metadata["project"]["ProjectId"]}
-
-                payload = {
-                    # Task_id - READ ONLY - set when spira creates the artifact inside its system
-                    "TaskStatusId": jira_status_to_spira_status_id(
-                        mapping_dict["statuses"]["tasks"],
-                        spira_metadata["statuses"]["task"],
-                        issue["fields"]["status"]["name"],
-                    ),
-                    "TaskTypeId": jira_issue_type_to_spira_task_type_id(
-                        spira_metadata["types"]["task"],
-                        issue["fields"]["issuetype"]["name"],
-                        mapping_dict,
-                    ),
-                    # TaskFolderId: None,  # Not in plan to be developed right now
-                    "RequirementId": find_task_requirement_id(
-                        issue, all_requirements_in_spira, jira_metadata["customfields"]
-                    ),
-                    "ReleaseId": jira_version_to_spira_release_id(
-                        spira_metadata["releases"], issue
-                    ),  # REQUIRED - the id of the release to connect to, releases in Spira must be prepared beforehand
-                    # ComponentId - READ ONLY - cant be set, only retrieved as it inherits the component from the parent.
-                    "CreatorId": find_spira_user_id_by_email(
-                        spira_metadata["users"], "reporter", issue
-                    ),
-                    "OwnerId": find_spira_user_id_by_email(
-                        spira_metadata["users"], "assignee", issue
-                    ),
-                    "TaskPriorityId": jira_priority_to_task_priority_id(
-                        spira_metadata["task_priorities"],
-                        issue["fields"]["priority"],
-                        mapping_dict,
-                    ),  # REQUIRED - differs between jira and spira, mapped in the mapping file
-                    "Name": issue["fields"]["summary"],
-                    "Description": convert_jira_markup_to_html(
-                        jira_connection_dict, skip_ssl, issue["fields"]["description"]
-                    ),
-                    # CreationDate # READ ONLY - is read only, special solution needed with custom properties below.
-                    # LastUpdateDate" # READ ONLY - is read only, special solution needed with custom properties below.
-                    "StartDate": get_jira_data_from_custom_field(
-                        issue, jira_metadata["customfields"], "Target start"
-                    ),
-                    "EndDate": get_jira_data_from_custom_field(
-                        issue, jira_metadata["customfields"], "Target end"
-                    ),
-                    "CompletionPercent": 0,
-                    # For Incidents & Tasks, EstEffort, ActualEffort and RemaningEffort has to be transformed from seconds to minutes
-                    "EstimatedEffort": calculate_estimate_minutes(
-                        issue["fields"]["aggregatetimeoriginalestimate"]
-                    ),
-                    "RemainingEffort": calculate_estimate_minutes(
-                        issue["fields"]["timeestimate"]
-                    ),
-                    "ActualEffort": calculate_estimate_minutes(
-                        issue["fields"]["timespent"]
-                    ),
-                    "ProjectedEffort": None,
-                    "TaskStatusName": None,
-                    "TaskTypeName": None,
-                    "OwnerName": None,
-                    "TaskPriorityName": None,
-                    "ProjectName": None,
-                    "ReleaseVersionNumber": None,
-                    "RequirementName": None,
-                    "RiskId": None,
-                    # "ProjectId":0,
-                    # "ProjectGuid":None,
-                    # "ArtifactTypeId":0,
-                    # "ConcurrencyDate":READ ONLY "0001-01-01T00:00:00",
-                    # "IsAttachments":False,
-                    # "Tags":? None,
-                    # "Guid":None
-                    "Tags": ",".join(map(str, issue["fields"]["labels"])),
-                }
-
-                task["artifact_type"] = "task"
-
-                # Add all the custom properties
-                payload["CustomProperties"] = add_custom_properties(
-                    issue,
-                    spira_metadata,
-                    jira_metadata,
-                    mapping_dict["custom_props"]["tasks"],
-                    "task",
-                    jira_connection_dict,
-                    skip_ssl,
-                )
+        convert_function = convert_jira_issue_to_spira_task
+    else:
+        convert_function = convert_jira_issue_to_spira_incident
+
+    return convert_function(
+        jira_connection_dict,
+        skip_ssl,
+        issue,
+        mapping_dict,
+        spira_metadata,
+        jira_metadata,
+    )
 
-                task["payload"] = payload
-                validation_dict["product"].append(task)
 
-    # Else if it's processing artifacts of type incidents
-    elif current_artifact_type == "incidents":
-        # Find all incidents
-        for issue in issues:
-            # Check if issue is not already in capabilities, and filter out the currently processed jira issue type.
-            #
-            # issue should not be in capabilities AND
-            # spira mapped name should exist AND
-            # the issue type of the issue should match what we're currently processing.
-            if (
-                not_in_capabilities((issue["key"]), spira_metadata["capabilites"])
-                and get_mapped_spira_type_name(
-                    mapping_dict["types"][current_artifact_type],
-                    issue["fields"]["issuetype"]["name"],
-                )
-                is not None
-                and issue["fields"]["issuetype"]["name"] == current_issue_type
-            ):
-                incident = {"project_id": spira_metadata["project"]["ProjectId"]}
-                incident_releases = jira_version_to_spira_release_id_incident_type(
-                    spira_metadata["releases"], issue
-                )
+# Convert the top level issues, aka initiatives, and the other requirement issue types to spira requirements.
+def convert_jira_issue_to_spira_requirement(
+    jira_connection_dict,
+    skip_ssl,
+    issue,
+    mapping_dict,
+    spira_metadata,
+    jira_metadata,
+) -> dict:
+    requirement = {
+        "project_id": spira_metadata["project"]["ProjectId"],
+        "jira_key": issue["key"],
+    }
 
-                payload = {
-                    # IncidentId - READ ONLY - set when spira creates the artifact inside its system
-                    "IncidentStatusId": jira_status_to_spira_status_id(
-                        mapping_dict["statuses"]["incidents"],
-                        spira_metadata["statuses"]["incident"],
-                        issue["fields"]["status"]["name"],
-                    ),
-                    "IncidentTypeId": jira_issue_type_to_spira_incident_type_id(
-                        spira_metadata["types"]["incident"],
-                        issue["fields"]["issuetype"]["name"],
-                        mapping_dict,
-                    ),
-                    # ArtifactTypeId - READ ONLY
-                    "PriorityId": jira_priority_to_incident_priority_id(
-                        spira_metadata["incident_priorities"],
-                        issue["fields"]["priority"],
-                        mapping_dict,
-                    ),  # REQUIRED - differs between jira and spira, mapped in the mapping file
-                    # TODO "SeverityId"
-                    "OpenerId": find_spira_user_id_by_email(
-                        spira_metadata["users"], "reporter", issue
-                    ),
-                    "OwnerId": find_spira_user_id_by_email(
-                        spira_metadata["users"], "assignee", issue
-                    ),
-                    "DetectedReleaseId": incident_releases["detected_release"],
-                    "ResolvedReleaseId": incident_releases["planned_release"],
-                    "VerifiedReleaseId": incident_releases["verified_release"],
-                    "Name": issue["fields"]["summary"],
-                    "Description": convert_jira_markup_to_html(
-                        jira_connection_dict, skip_ssl, issue["fields"]["description"]
-                    ),
-                    # CreationDate - READ ONLY
-                    "StartDate": get_jira_data_from_custom_field(
-                        issue, jira_metadata["customfields"], "Target start"
-                    ),
-                    "EndDate": get_jira_data_from_custom_field(
-                        issue, jira_metadata["customfields"], "Target end"
-                    ),
-                    # TODO "ClosedDate"
-                    # For Incidents & Tasks, EstEffort, ActualEffort and RemaningEffort has to be transformed from seconds to minutes
-                    "EstimatedEffort": calculate_estimate_minutes(
-                        issue["fields"]["aggregatetimeoriginalestimate"]
-                    ),
-                    "ActualEffort": calculate_estimate_minutes(
-                        issue["fields"]["timespent"]
-                    ),
-                    "RemainingEffort": calculate_estimate_minutes(
-                        issue["fields"]["timeestimate"]
-                    ),
-                    # FixedBuildId - ?
-                    # DetectedBuildId - ?
-                    # ProjectId - Suspected that it is derived from the projectid in the input, as it's populated later when a GET of the artifact is made
-                    # LastUpdateDate # READ ONLY - is read only, special solution needed with custom properties below.
-                    # CreationDate # READ ONLY - is read only, special solution needed with custom properties below.
-                    # ConcurrencyDate - READ ONLY
-                    "Tags": ",".join(map(str, issue["fields"]["labels"])),
-                    "ComponentIds": jira_component_to_spira_component_id(
-                        spira_metadata["components"], issue, isComponentArray=True
-                    ),  # - Array of component Ids
-                }
-
-                # releaseid and componentid
-                incident["artifact_type"] = "incident"
-
-                # Add all the custom properties
-                payload["CustomProperties"] = add_custom_properties(
+    payload = {
+        # Requirement_id - READ ONLY - set when spira creates the artifact inside its system
+        # Indentlevel - Initiative level does not need to be set, as its the highest level which gets assigned automatically.
+        "StatusId": jira_status_to_spira_status_id(
+            spira_metadata["lookups"]["statuses"]["requirements"],
+            issue["fields"]["status"]["name"],
+        ),
+        "RequirementTypeId": jira_issue_type_to_spira_type_id(
+            spira_metadata["lookups"]["types"]["requirements"],
+            issue["fields"]["issuetype"]["name"],
+        ),
+        "AuthorId": find_spira_user_id_by_email(
+            spira_metadata["users_by_email"], "reporter", issue
+        ),
+        "OwnerId": find_spira_user_id_by_email(
+            spira_metadata["users_by_email"], "assignee", issue
+        ),
+        "ImportanceId": jira_priority_to_spira_priority_id(
+            spira_metadata["lookups"]["priorities"]["requirements"],
+            issue["fields"]["priority"],
+        ),  # REQUIRED - differs between jira and spira, mapped in the mapping file
+        "ReleaseId": jira_version_to_spira_release_id(
+            spira_metadata["lookups"]["releases"], issue
+        ),  # REQUIRED - the id of the release to connect to, we need to have prepared the releases in Spira
+        "ComponentId": jira_component_to_spira_component_id(
+            spira_metadata["lookups"]["components"],
+            issue,
+            isComponentArray=False,
+        ),
+        "Name": issue["fields"]["summary"],
+        "Description": render_issue_markup(
+            jira_connection_dict,
+            skip_ssl,
+            issue,
+            "description",
+            issue["fields"]["description"],
+        ),
+        # CreationDate # READ ONLY - is read only, special solution needed with custom properties below.
+        # LastUpdateDate" # READ ONLY - is read only, special solution needed with custom properties below.
+        # Summary - READ ONLY
+        "EstimatePoints": calculate_estimate_points(
+            issue["fields"]["aggregatetimeoriginalestimate"]
+        ),
+        # EstimatedEffort - ?
+        # TaskEstimatedEffort - ?
+        # TaskActualEffort - ?
+        # TaskCount - READ ONLY
+        # ReleaseVerionNumber - READ ONLY
+        # Steps - READ ONLY
+        "StartDate": get_jira_data_from_custom_field(
+            issue, jira_metadata["customfield_ids"], "Target start"
+        ),
+        "EndDate": get_jira_data_from_custom_field(
+            issue, jira_metadata["customfield_ids"], "Target end"
+        ),
+        "PercentComplete": None,
+        "GoalId": None,
+        "IsSuspect": False,  # False is the default value
+        # ProjectId - Suspected that it is derived from the projectid in the input, as it's populated when a GET of the artifact is made
+        # ConcurrencyDate - READ ONLY
+        "Tags": ",".join(map(str, issue["fields"]["labels"])),
+    }
+
+    # releaseid and componentid
+    requirement["artifact_type"] = "requirement"
+
+    # Add all the custom properties
+    payload["CustomProperties"] = add_custom_properties(
+        issue,
+        spira_metadata,
+        jira_metadata,
+        mapping_dict["custom_props"]["requirements"],
+        "requirement",
+        jira_connection_dict,
+        skip_ssl,
+    )
+
+    requirement["payload"] = payload
+    requirement["parentlink"] = get_jira_data_from_custom_field(
+        issue, jira_metadata["customfield_ids"], "Parent Link"
+    )
+    requirement["epiclink"] = get_jira_data_from_custom_field(
+        issue, jira_metadata["customfield_ids"], "Epic Link"
+    )
+    return requirement
+
+
+# Convert the sub-tasks and the other task issue types to spira tasks.
+def convert_jira_issue_to_spira_task(
+    jira_connection_dict,
+    skip_ssl,
+    issue,
+    mapping_dict,
+    spira_metadata,
+    jira_metadata,
+) -> dict:
+    task = {
+        "project_id": spira_metadata["project"]["ProjectId"],
+        "jira_key": issue["key"],
+    }
+
+    payload = {
+        # Task_id - READ ONLY - set when spira creates the artifact inside its system
+        "TaskStatusId": jira_status_to_spira_status_id(
+            spira_metadata["lookups"]["statuses"]["tasks"],
+            issue["fields"]["status"]["name"],
+        ),
+        "TaskTypeId": jira_issue_type_to_spira_type_id(
+            spira_metadata["lookups"]["types"]["tasks"],
+            issue["fields"]["issuetype"]["name"],
+        ),
+        # TaskFolderId: None,  # Not in plan to be developed right now
+        "RequirementId": None,  # Set when inserted, from the requirement of the requirementlink
+        "ReleaseId": jira_version_to_spira_release_id(
+            spira_metadata["lookups"]["releases"], issue
+        ),  # REQUIRED - the id of the release to connect to, releases in Spira must be prepared beforehand
+        # ComponentId - READ ONLY - cant be set, only retrieved as it inherits the component from the parent.
+        "CreatorId": find_spira_user_id_by_email(
+            spira_metadata["users_by_email"], "reporter", issue
+        ),
+        "OwnerId": find_spira_user_id_by_email(
+            spira_metadata["users_by_email"], "assignee", issue
+        ),
+        "TaskPriorityId": jira_priority_to_spira_priority_id(
+            spira_metadata["lookups"]["priorities"]["tasks"],
+            issue["fields"]["priority"],
+        ),  # REQUIRED - differs between jira and spira, mapped in the mapping file
+        "Name": issue["fields"]["summary"],
+        "Description": render_issue_markup(
+            jira_connection_dict,
+            skip_ssl,
+            issue,
+            "description",
+            issue["fields"]["description"],
+        ),
+        # CreationDate # READ ONLY - is read only, special solution needed with custom properties below.
+        # LastUpdateDate" # READ ONLY - is read only, special solution needed with custom properties below.
+        "StartDate": get_jira_data_from_custom_field(
+            issue, jira_metadata["customfield_ids"], "Target start"
+        ),
+        "EndDate": get_jira_data_from_custom_field(
+            issue, jira_metadata["customfield_ids"], "Target end"
+        ),
+        "CompletionPercent": 0,
+        # For Incidents & Tasks, EstEffort, ActualEffort and RemaningEffort has to be transformed from seconds to minutes
+        "EstimatedEffort": calculate_estimate_minutes(
+            issue["fields"]["aggregatetimeoriginalestimate"]
+        ),
+        "RemainingEffort": calculate_estimate_minutes(issue["fields"]["timeestimate"]),
+        "ActualEffort": calculate_estimate_minutes(issue["fields"]["timespent"]),
+        "ProjectedEffort": None,
+        "TaskStatusName": None,
+        "TaskTypeName": None,
+        "OwnerName": None,
+        "TaskPriorityName": None,
+        "ProjectName": None,
+        "ReleaseVersionNumber": None,
+        "RequirementName": None,
+        "RiskId": None,
+        # "ProjectId":0,
+        # "ProjectGuid":None,
+        # "ArtifactTypeId":0,
+        # "ConcurrencyDate":READ ONLY "0001-01-01T00:00:00",
+        # "IsAttachments":False,
+        # "Tags":? None,
+        # "Guid":None
+        "Tags": ",".join(map(str, issue["fields"]["labels"])),
+    }
+
+    task["artifact_type"] = "task"
+
+    # Add all the custom properties
+    payload["CustomProperties"] = add_custom_properties(
+        issue,
+        spira_metadata,
+        jira_metadata,
+        mapping_dict["custom_props"]["tasks"],
+        "task",
+        jira_connection_dict,
+        skip_ssl,
+    )
+
+    task["payload"] = payload
+    task["requirementlink"] = get_task_requirement_link(
+        issue, jira_metadata["customfield_ids"]
+    )
+    return task
+
+
+# Convert the incident issue types to spira incidents.
+def convert_jira_issue_to_spira_incident(
+    jira_connection_dict,
+    skip_ssl,
+    issue,
+    mapping_dict,
+    spira_metadata,
+    jira_metadata,
+) -> dict:
+    incident = {
+        "project_id": spira_metadata["project"]["ProjectId"],
+        "jira_key": issue["key"],
+    }
+    incident_releases = jira_version_to_spira_release_id_incident_type(
+        spira_metadata["lookups"]["releases"], issue
+    )
+
+    payload = {
+        # IncidentId - READ ONLY - set when spira creates the artifact inside its system
+        "IncidentStatusId": jira_status_to_spira_status_id(
+            spira_metadata["lookups"]["statuses"]["incidents"],
+            issue["fields"]["status"]["name"],
+        ),
+        "IncidentTypeId": jira_issue_type_to_spira_type_id(
+            spira_metadata["lookups"]["types"]["incidents"],
+            issue["fields"]["issuetype"]["name"],
+        ),
+        # ArtifactTypeId - READ ONLY
+        "PriorityId": jira_priority_to_spira_priority_id(
+            spira_metadata["lookups"]["priorities"]["incidents"],
+            issue["fields"]["priority"],
+        ),  # REQUIRED - differs between jira and spira, mapped in the mapping file
+        # TODO "SeverityId"
+        "OpenerId": find_spira_user_id_by_email(
+            spira_metadata["users_by_email"], "reporter", issue
+        ),
+        "OwnerId": find_spira_user_id_by_email(
+            spira_metadata["users_by_email"], "assignee", issue
+        ),
+        "DetectedReleaseId": incident_releases["detected_release"],
+        "ResolvedReleaseId": incident_releases["planned_release"],
+        "VerifiedReleaseId": incident_releases["verified_release"],
+        "Name": issue["fields"]["summary"],
+        "Description": render_issue_markup(
+            jira_connection_dict,
+            skip_ssl,
+            issue,
+            "description",
+            issue["fields"]["description"],
+        ),
+        # CreationDate - READ ONLY
+        "StartDate": get_jira_data_from_custom_field(
+            issue, jira_metadata["customfield_ids"], "Target start"
+        ),
+        "EndDate": get_jira_data_from_custom_field(
+            issue, jira_metadata["customfield_ids"], "Target end"
+        ),
+        # TODO "ClosedDate"
+        # For Incidents & Tasks, EstEffort, ActualEffort and RemaningEffort has to be transformed from seconds to minutes
+        "EstimatedEffort": calculate_estimate_minutes(
+            issue["fields"]["aggregatetimeoriginalestimate"]
+        ),
+        "ActualEffort": calculate_estimate_minutes(issue["fields"]["timespent"]),
+        "RemainingEffort": calculate_estimate_minutes(issue["fields"]["timeestimate"]),
+        # FixedBuildId - ?
+        # DetectedBuildId - ?
+        # ProjectId - Suspected that it is derived from the projectid in the input, as it's populated later when a GET of the artifact is made
+        # LastUpdateDate # READ ONLY - is read only, special solution needed with custom properties below.
+        # CreationDate # READ ONLY - is read only, special solution needed with custom properties below.
+        # ConcurrencyDate - READ ONLY
+        "Tags": ",".join(map(str, issue["fields"]["labels"])),
+        "ComponentIds": jira_component_to_spira_component_id(
+            spira_metadata["lookups"]["components"],
+            issue,
+            isComponentArray=True,
+        ),  # - Array of component Ids
+    }
+
+    # releaseid and componentid
+    incident["artifact_type"] = "incident"
+
+    # Add all the custom properties
+    payload["CustomProperties"] = add_custom_properties(
+        issue,
+        spira_metadata,
+        jira_metadata,
+        mapping_dict["custom_props"]["incidents"],
+        "incident",
+        jira_connection_dict,
+        skip_ssl,
+    )
+
+    incident["payload"] = payload
+    incident["parentlink"] = get_jira_data_from_custom_field(
+        issue, jira_metadata["customfield_ids"], "Parent Link"
+    )
+    incident["epiclink"] = get_jira_data_from_custom_field(
+        issue, jira_metadata["customfield_ids"], "Epic Link"
+    )
+    return incident
+
+
+# Process pool for the issue conversion
+# The compiled metadata and mapping are shipped to every worker process once, when the pool starts.
+
+ISSUE_CONVERSION_CHUNK_SIZE = 250
+
+# Number of chunks converting on the worker processes, ahead of the chunk that is being inserted
+ISSUE_CONVERSION_CHUNKS_AHEAD = 8
+
+# Number of converted issues waiting for their html, ahead of the issue that is being inserted
+ISSUE_RENDERS_AHEAD = 64
+
+# Number of converted issues waiting to be inserted, before the conversion waits for the inserts
+CONVERTED_ISSUE_QUEUE_SIZE = 500
+
+# The conversion context of a worker process, set by init_issue_conversion_worker.
+issue_conversion_context = {}
+
+
+# The workers are spawned, not forked, as the pool is created while render threads, sqlite connections and
+# pooled sessions are live, and a fork could copy their locks in a held state. The initializer ships the context.
+def create_issue_conversion_pool(
+    workers, jira_connection_dict, skip_ssl, mapping_dict, spira_metadata, jira_metadata
+) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_issue_conversion_worker,
+        initargs=(
+            jira_connection_dict,
+            skip_ssl,
+            mapping_dict,
+            spira_metadata,
+            jira_metadata,
+        ),
+    )
+
+
+def init_issue_conversion_worker(
+    jira_connection_dict, skip_ssl, mapping_dict, spira_metadata, jira_metadata
+):
+    issue_conversion_context["jira_connection_dict"] = jira_connection_dict
+    issue_conversion_context["skip_ssl"] = skip_ssl
+    issue_conversion_context["mapping_dict"] = mapping_dict
+    issue_conversion_context["spira_metadata"] = spira_metadata
+    issue_conversion_context["jira_metadata"] = jira_metadata
+
+    # The workers don't run atexit, the renderers are closed when the worker process exits
+    multiprocessing.util.Finalize(None, close_jira_markup_renderers, exitpriority=10)
+
+
+# Convert a chunk of issues on a worker process, using the context the worker was started with.
+# The renders are collected on the worker, as they can't be sent back to the main process.
+# Returns the converted issues, the jira keys and errors of the issues that failed, and the render statistics
+# of the chunk. The errors are sent back as text, the failure log is written by the main process.
+def convert_jira_issue_chunk(issues, current_artifact_type) -> tuple:
+    converted_chunk = []
+    failures = []
+
+    for issue in issues:
+        try:
+            converted_chunk.append(
+                convert_jira_issue(
+                    issue_conversion_context["jira_connection_dict"],
+                    issue_conversion_context["skip_ssl"],
                     issue,
-                    spira_metadata,
-                    jira_metadata,
-                    mapping_dict["custom_props"]["incidents"],
-                    "incident",
-                    jira_connection_dict,
-                    skip_ssl,
+                    issue_conversion_context["mapping_dict"],
+                    issue_conversion_context["spira_metadata"],
+                    issue_conversion_context["jira_metadata"],
+                    current_artifact_type,
                 )
+            )
+        except Exception as e:
+            failures.append((issue.get("key"), str(e)))
 
-                incident["payload"] = payload
-                incident["parentlink"] = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], "Parent Link"
-                )
-                incident["epiclink"] = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], "Epic Link"
-                )
-                validation_dict["product"].append(incident)
+    resolved_chunk = []
+    for artifact in converted_chunk:
+        try:
+            resolved_chunk.append(resolve_rendered_markup(artifact))
+        except Exception as e:
+            failures.append((artifact.get("jira_key"), str(e)))
 
-    json.dump(validation_dict, to_validate, indent=4)
+    return resolved_chunk, failures, take_render_statistics()
 
-    to_validate.close()
 
+def chunk_issues(issues, chunk_size):
+    for i in range(0, len(issues), chunk_size):
+        yield issues[i : i + chunk_size]
 
-# Special case for finding the requirement id in tasks, as it can be commonly connected in a non-standard way by using the custom field "Epic Link".
-def find_task_requirement_id(issue, all_requirements_in_spira, jira_custom_fields):
+
+# Special case for finding the requirement of tasks, as it can be commonly connected in a non-standard way by using the custom field "Epic Link".
+def get_task_requirement_link(issue, jira_customfield_ids):
     if "parent" in issue["fields"]:
-        spira_id = get_spira_id_from_jira_id(
-            all_requirements_in_spira, issue["fields"]["parent"]["key"]
-        )
-        if spira_id is not None:
-            return spira_id
-        else:
-            return 0
+        return issue["fields"]["parent"]["key"]
     else:
-        epic_link_jira_id = get_jira_data_from_custom_field(
-            issue, jira_custom_fields, "Epic Link"
-        )
-        spira_id = get_spira_id_from_jira_id(
-            all_requirements_in_spira, epic_link_jira_id
-        )
-        if spira_id is not None:
-            return spira_id
-        else:
-            return 0
+        return get_jira_data_from_custom_field(issue, jira_customfield_ids, "Epic Link")
 
 
-def find_spira_user_id_by_email(users, person_field, issue):
+# Find the spira user id through the email index of the spira users, defaults to the system administrator (1).
+def find_spira_user_id_by_email(users_by_email, person_field, issue):
     if not issue["fields"][person_field]:
         return 1
-    else:
-        user = next(
-            filter(
-                lambda x: x["EmailAddress"]
-                == issue["fields"][person_field]["emailAddress"],
-                users,
-            ),
-            None,
-        )
+
+    user = users_by_email.get(
+        normalize_email(issue["fields"][person_field].get("emailAddress"))
+    )
 
     if user:
         return user["UserId"]
     else:
         return 1
 
+
+# Emails are matched case insensitive between jira and spira.
+def normalize_email(email) -> str | None:
+    if not email:
+        return None
+    return email.strip().lower()
+
+
 ## Requirements should get story points as is
 def calculate_estimate_points(aggregatetimeoriginalestimate: int | None):
     if aggregatetimeoriginalestimate is None:
         return None
     else:
         return round((aggregatetimeoriginalestimate / 3600) / 8, 2)
-    
+
 ## Incidents and tasks should get the timeestimate in hours
 def calculate_estimate_minutes(aggregatetimeoriginalestimate: int | None):
     if aggregatetimeoriginalestimate is None:
@@ -410,228 +633,108 @@ def calculate_estimate_minutes(aggregatetimeoriginalestimate: int | None):
     else:
         return aggregatetimeoriginalestimate // 60
 
-def get_jira_data_from_custom_field(issue, jira_custom_fields, jira_field_name):
-    customfield = next(
-        filter(lambda x: x["name"] == jira_field_name, jira_custom_fields), None
-    )
 
-    if customfield and customfield["id"] in issue["fields"]:
-        custom_value = issue["fields"][customfield["id"]]
+# Resolve a jira custom field by its name through the name to field id index in the jira metadata.
+def get_jira_data_from_custom_field(issue, jira_customfield_ids, jira_field_name):
+    return get_jira_data_from_field_id(issue, jira_customfield_ids.get(jira_field_name))
 
-        try:
-            if is_datetime(str(custom_value)):
-                custom_value = convert_datetime(custom_value)
-        except Exception as e:
-            print(e)
 
-        return custom_value
-    else:
+def get_jira_data_from_field_id(issue, field_id):
+    if field_id is None or field_id not in issue["fields"]:
         return None
 
+    custom_value = issue["fields"][field_id]
 
-def jira_priority_to_requirement_importance_id(
-    importances, jira_priority_name, mapping
-) -> int:
-    if jira_priority_name is None:
-        print(
-            "Priority is null, artifact priority will have to be added in spira manually"
-        )
-        return 0
-
-    mapped_name = mapping["priorities"]["requirements"][jira_priority_name["name"]]
-
-    importance_object = next(
-        filter(lambda x: x["Name"] == mapped_name, importances), None
-    )
+    # Only strings can hold a jira date, skip the date parsing for lists, numbers, etc.
+    if isinstance(custom_value, str):
+        custom_value = parse_jira_datetime(custom_value) or custom_value
 
-    if importance_object:
-        return int(importance_object["ImportanceId"])
-    else:
-        return 0
+    return custom_value
 
 
-def jira_priority_to_task_priority_id(priorities, jira_priority_name, mapping) -> int:
-    if jira_priority_name is None:
-        print(
-            "Priority is null, artifact priority will have to be added in spira manually"
-        )
-        return 0
-
-    mapped_name = mapping["priorities"]["tasks"][jira_priority_name["name"]]
+# Resolve the jira_custom_field_name of every custom property mapping to a field id once, before the conversion starts.
+def resolve_custom_field_ids(custom_props_mapping, jira_metadata):
+    for artifact_type, props in custom_props_mapping.items():
+        for prop in props or []:
+            if not prop.get("jira_custom_field_name"):
+                prop["jira_custom_field_id"] = None
+                continue
 
-    priority_object = next(filter(lambda x: x["Name"] == mapped_name, priorities), None)
+            prop["jira_custom_field_id"] = jira_metadata["customfield_ids"].get(
+                prop["jira_custom_field_name"]
+            )
 
-    if priority_object:
-        return int(priority_object["PriorityId"])
-    else:
-        return 0
+            if prop["jira_custom_field_id"] is None:
+                print(
+                    "Jira custom field: '"
+                    + str(prop["jira_custom_field_name"])
+                    + "' mapped for "
+                    + artifact_type
+                    + " was not found in jira, the spira custom property will be empty"
+                )
 
 
-def jira_priority_to_incident_priority_id(
-    priorities, jira_priority_name, mapping
-) -> int:
-    if jira_priority_name is None:
+# Priorities, statuses and types are resolved through the lookup tables compiled by compile_mapping_lookups.
+def jira_priority_to_spira_priority_id(priority_ids, jira_priority) -> int:
+    if jira_priority is None:
         print(
             "Priority is null, artifact priority will have to be added in spira manually"
         )
         return 0
 
-    mapped_name = mapping["priorities"]["incidents"][jira_priority_name["name"]]
-
-    priority_obejct = next(filter(lambda x: x["Name"] == mapped_name, priorities), None)
-
-    if priority_obejct:
-        return int(priority_obejct["PriorityId"])
-    else:
-        return 0
+    return priority_ids.get(jira_priority["name"], 0)
 
 
-def jira_issue_type_to_spira_requirement_type_id(
-    requirement_types, issue_type, mapping
-) -> int:
+def jira_issue_type_to_spira_type_id(type_ids, issue_type) -> int:
     if issue_type is None:
         return 0
 
-    spira_mapped_type_name = get_mapped_spira_type_name(
-        mapping["types"]["requirements"], issue_type
-    )
+    return type_ids.get(issue_type, 0)
 
-    if not spira_mapped_type_name:
-        # If the spira type is not mapped to a jira type
-        return 0
 
-    requirement_type_object = next(
-        filter(lambda x: x["Name"] == spira_mapped_type_name, requirement_types), None
-    )
+# The jira keys of the partitioned issues of the jira types, i.e. of all the issues that will be converted.
+def get_partitioned_jira_keys(issue_partitions, spira_metadata, jira_types) -> set:
+    jira_keys = set()
+    for jira_type in jira_types:
+        artifact_type = spira_metadata["lookups"]["artifact_types"].get(jira_type)
+        for issue in issue_partitions.get(artifact_type, {}).get(jira_type, []):
+            jira_keys.add(issue["key"])
+    return jira_keys
 
-    if requirement_type_object:
-        return int(requirement_type_object["RequirementTypeId"])
-    else:
-        return 0
 
+# Group the extracted issues once by artifact type and jira issue type, keeping the order of the extract.
+# Issues already migrated as capabilities and issue types without a mapped spira type are left out.
+def partition_issues(issues, spira_metadata) -> dict:
+    capability_jira_ids = get_capability_jira_ids(spira_metadata["capabilites"])
+    lookups = spira_metadata["lookups"]
 
-def jira_issue_type_to_spira_incident_type_id(
-    incident_types, issue_type, mapping
-) -> int:
-    if issue_type is None:
-        return 0
-
-    spira_mapped_type_name = get_mapped_spira_type_name(
-        mapping["types"]["incidents"], issue_type
-    )
-
-    if not spira_mapped_type_name:
-        # If the spira type is not mapped to a jira type
-        return 0
-
-    requirement_type_object = next(
-        filter(lambda x: x["Name"] == spira_mapped_type_name, incident_types), None
-    )
+    partitions = {artifact_type: {} for artifact_type in lookups["type_names"]}
 
-    if requirement_type_object:
-        return int(requirement_type_object["IncidentTypeId"])
-    else:
-        return 0
-
-
-def jira_issue_type_to_spira_task_type_id(task_types, issue_type, mapping) -> int:
-    if issue_type is None:
-        return 0
-
-    spira_mapped_type_name = get_mapped_spira_type_name(
-        mapping["types"]["tasks"], issue_type
-    )
-
-    if not spira_mapped_type_name:
-        # If the spira type is not mapped to a jira type
-        return 0
-
-    task_type_object = next(
-        filter(lambda x: x["Name"] == spira_mapped_type_name, task_types), None
-    )
-
-    if task_type_object:
-        return int(task_type_object["TaskTypeId"])
-    else:
-        return 0
+    for issue in issues:
+        if issue["key"] in capability_jira_ids:
+            continue
 
+        issue_type = issue["fields"]["issuetype"]["name"]
+        artifact_type = lookups["artifact_types"].get(issue_type)
 
-def get_mapped_spira_type_name(type_mapping, jira_issue_type) -> str | None:
-    spira_mapped_type_name = None
-    for spira_type in type_mapping:
-        jira_types = type_mapping[spira_type]
-        if isinstance(jira_types, list) and jira_issue_type in type_mapping[spira_type]:
-            spira_mapped_type_name = spira_type
-            break
-        elif (
-            isinstance(jira_types, str) and jira_issue_type == type_mapping[spira_type]
+        if (
+            artifact_type in partitions
+            and issue_type in lookups["type_names"][artifact_type]
         ):
-            spira_mapped_type_name = spira_type
-            break
-    return spira_mapped_type_name
+            partitions[artifact_type].setdefault(issue_type, []).append(issue)
 
+    return partitions
 
-def get_spira_id_from_jira_id(all_requirements_in_spira, jira_id):
-    for requirement in all_requirements_in_spira:
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == jira_id
-                ),
-                requirement["CustomProperties"],
-            ),
-            None,
-        )
-        if property is not None:
-            return requirement["RequirementId"]
-
-    return None
 
+def get_capability_jira_ids(all_capabilites) -> set:
+    capability_jira_ids = set()
 
-def not_in_capabilities(jira_id, all_capabilites):
     for capability in all_capabilites:
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == jira_id
-                ),
-                capability["CustomProperties"],
-            ),
-            None,
-        )
-        if property is not None:
-            return False
-
-    return True
-
-
-def is_datetime(date_string):
-    date_formats = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%S.%f%z"]
-
-    if date_string is None:
-        return False
-
-    for date_format in date_formats:
-        try:
-            datetime.strptime(date_string, date_format)
-            return True
-        except ValueError:
-            continue
-    return False
-
-
-def convert_datetime(date_string):
-    date_formats = ["%Y-%m-%d", "%Y-%m-%dT%H:%M:%S.%fZ", "%Y-%m-%dT%H:%M:%S.%f%z"]
+        for property in capability["CustomProperties"] or []:
+            if property["Definition"]["Name"] == "Jira Id":
+                capability_jira_ids.add(property["StringValue"])
 
-    for date_format in date_formats:
-        try:
-            modified_date_string = datetime.strptime(date_string, date_format)
-            return modified_date_string.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
-
-        except ValueError:
-            continue
+    return capability_jira_ids
 
 
 def add_custom_properties(
@@ -664,9 +767,7 @@ def add_custom_properties(
                 )
             # Handle it if the value is in a custom field
             else:
-                time = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], prop["jira_custom_field_name"]
-                )
+                time = get_jira_data_from_field_id(issue, prop["jira_custom_field_id"])
                 custom_prop_to_add = jira_datetime_field_to_spira_custom_prop(
                     spira_metadata, artifact_type, prop["spira_name"], time
                 )
@@ -686,9 +787,7 @@ def add_custom_properties(
                     issue["fields"][prop["jira_key"]],
                 )
             else:
-                text = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], prop["jira_custom_field_name"]
-                )
+                text = get_jira_data_from_field_id(issue, prop["jira_custom_field_id"])
                 custom_prop_to_add = jira_string_field_to_spira_custom_prop(
                     spira_metadata, artifact_type, prop["spira_name"], text
                 )
@@ -703,8 +802,8 @@ def add_custom_properties(
                     issue["fields"][prop["jira_key"]],
                 )
             else:
-                number = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], prop["jira_custom_field_name"]
+                number = get_jira_data_from_field_id(
+                    issue, prop["jira_custom_field_id"]
                 )
 
                 custom_prop_to_add = jira_decimal_field_to_spira_custom_prop(
@@ -725,12 +824,12 @@ def add_custom_properties(
                     issue["fields"][prop["jira_key"]],
                     jira_connection_dict,
                     skip_ssl,
+                    issue,
+                    prop["jira_key"],
                 )
             # Else it is a custom field
             else:
-                text = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], prop["jira_custom_field_name"]
-                )
+                text = get_jira_data_from_field_id(issue, prop["jira_custom_field_id"])
                 custom_prop_to_add = jira_textarea_field_to_spira_custom_prop(
                     spira_metadata,
                     artifact_type,
@@ -738,6 +837,8 @@ def add_custom_properties(
                     text,  # type: ignore
                     jira_connection_dict,
                     skip_ssl,
+                    issue,
+                    prop["jira_custom_field_id"],
                 )
 
         # Check if it's a list custom prop
@@ -751,8 +852,8 @@ def add_custom_properties(
                 )
 
             else:
-                list_value = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], prop["jira_custom_field_name"]
+                list_value = get_jira_data_from_field_id(
+                    issue, prop["jira_custom_field_id"]
                 )
 
                 custom_prop_to_add = jira_list_field_to_spira_custom_prop(
@@ -772,8 +873,8 @@ def add_custom_properties(
                 )
 
             else:
-                list_of_values = get_jira_data_from_custom_field(
-                    issue, jira_metadata["customfields"], prop["jira_custom_field_name"]
+                list_of_values = get_jira_data_from_field_id(
+                    issue, prop["jira_custom_field_id"]
                 )
 
                 custom_prop_to_add = jira_multiselect_list_field_to_spira_custom_prop(
@@ -785,49 +886,98 @@ def add_custom_properties(
     return custom_properties
 
 
-def jira_list_field_to_spira_custom_prop(
-    spira_metadata, artifact_type, spira_custom_prop_name, issue_field_value
-) -> dict | None:
-    spira_custom_props = spira_metadata["custom_properties"][artifact_type]
+# Compile a custom property prototype per artifact type and spira custom property name, once per run.
+# Each prototype holds the shared Definition for every kind of custom property the migration can create,
+# and a value to id dict for custom lists. Building a custom property then only has to fill in the value.
+def compile_custom_property_prototypes(spira_metadata) -> dict:
+    prototypes = {}
 
-    custom_prop_data = next(
-        filter((lambda x: x["Name"] == spira_custom_prop_name), spira_custom_props),
-        None,
-    )
+    for artifact_type, spira_custom_props in spira_metadata[
+        "custom_properties"
+    ].items():
+        project_template_id = (
+            None
+            if artifact_type == "capability" or "project" not in spira_metadata
+            else spira_metadata["project"]["ProjectTemplateId"]
+        )
+
+        prototypes[artifact_type] = {}
 
-    if custom_prop_data:
-        custom_prop = {
+        for custom_prop_data in spira_custom_props:
+            # The first custom property found with the name wins
+            if custom_prop_data["Name"] in prototypes[artifact_type]:
+                continue
+
+            prototypes[artifact_type][custom_prop_data["Name"]] = (
+                compile_custom_property_prototype(custom_prop_data, project_template_id)
+            )
+
+    return prototypes
+
+
+def compile_custom_property_prototype(custom_prop_data, project_template_id) -> dict:
+    prototype = {
+        "PropertyNumber": custom_prop_data["PropertyNumber"],
+        "definitions": {},
+        "list_name": None,
+        "list_value_ids": {},
+    }
+
+    # Text, rich text, date and decimal custom properties share the same definition apart from the type
+    for kind, type_name, system_data_type in [
+        ("text", "Text", "System.String"),
+        ("date_time", "Date & Time", "System.DateTime"),
+        ("decimal", "Decimal", "System.Decimal"),
+    ]:
+        prototype["definitions"][kind] = {
+            "CustomPropertyId": custom_prop_data["CustomPropertyId"],
+            "ProjectTemplateId": project_template_id,
+            "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
+            "Name": custom_prop_data["CustomPropertyFieldName"],
+            "CustomList": None,
+            "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
+            "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
+            "CustomPropertyTypeName": type_name,
+            "IsDeleted": False,
             "PropertyNumber": custom_prop_data["PropertyNumber"],
-            "StringValue": None,
-            "IntegerValue": (
-                jira_list_value_to_spira_id(
-                    custom_prop_data["CustomList"]["Values"], issue_field_value
-                )
-                if issue_field_value
-                else None
+            "SystemDataType": system_data_type,
+            "Options": None,
+            "Position": None,
+            "Description": None,
+            "Guid": None,
+            "ConcurrencyGuid": None,
+            "LastUpdateDate": None,
+        }
+
+    # Only custom properties with a custom list can be used as list and multiselect list
+    if custom_prop_data.get("CustomList"):
+        custom_list = custom_prop_data["CustomList"]
+
+        prototype["list_name"] = custom_list["Name"]
+
+        # The first list value found with the name wins
+        for value in custom_list["Values"] or []:
+            if value["Name"] not in prototype["list_value_ids"]:
+                prototype["list_value_ids"][value["Name"]] = value[
+                    "CustomPropertyValueId"
+                ]
+
+        for kind, type_name, system_data_type in [
+            ("list", "List", "System.Int32"),
+            (
+                "multiselect_list",
+                "Multiselect List",
+                "System.Collections.Generic.List`1[System.Int32]",
             ),
-            "BooleanValue": None,
-            "DateTimeValue": None,
-            "DecimalValue": None,
-            "IntegerListValue": None,
-            "Definition": {
+        ]:
+            prototype["definitions"][kind] = {
                 "CustomPropertyId": custom_prop_data["CustomPropertyId"],
-                "ProjectTemplateId": (
-                    None
-                    if artifact_type == "capability"
-                    else spira_metadata["project"]["ProjectTemplateId"]
-                ),
+                "ProjectTemplateId": project_template_id,
                 "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
-                "Name": custom_prop_data["CustomList"]["Name"],
+                "Name": custom_list["Name"],
                 "CustomList": {
-                    "CustomPropertyListId": custom_prop_data["CustomList"][
-                        "CustomPropertyListId"
-                    ],
-                    "ProjectTemplateId": (
-                        None
-                        if artifact_type == "capability"
-                        else spira_metadata["project"]["ProjectTemplateId"]
-                    ),
+                    "CustomPropertyListId": custom_list["CustomPropertyListId"],
+                    "ProjectTemplateId": project_template_id,
                     "Name": None,
                     "Active": False,
                     "SortedOnValue": False,
@@ -838,19 +988,71 @@ def jira_list_field_to_spira_custom_prop(
                 },
                 "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
                 "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
-                "CustomPropertyTypeName": "List",
+                "CustomPropertyTypeName": type_name,
                 "IsDeleted": False,
                 "PropertyNumber": custom_prop_data["PropertyNumber"],
-                "SystemDataType": "System.Int32",
+                "SystemDataType": system_data_type,
                 "Options": None,
                 "Position": None,
                 "Description": "",
                 "Guid": None,
                 "ConcurrencyGuid": None,
                 "LastUpdateDate": None,
-            },
-        }
-        return custom_prop
+            }
+
+    return prototype
+
+
+def get_custom_property_prototype(
+    spira_metadata, artifact_type, spira_custom_prop_name
+) -> dict | None:
+    return (
+        spira_metadata["custom_property_prototypes"]
+        .get(artifact_type, {})
+        .get(spira_custom_prop_name)
+    )
+
+
+# Create a custom property from the prototype, the Definition is shared between all custom properties of the prototype.
+def new_custom_prop(prototype, kind, value_key, value) -> dict | None:
+    if kind not in prototype["definitions"]:
+        return None
+
+    custom_prop = {
+        "PropertyNumber": prototype["PropertyNumber"],
+        "StringValue": None,
+        "IntegerValue": None,
+        "BooleanValue": None,
+        "DateTimeValue": None,
+        "DecimalValue": None,
+        "IntegerListValue": None,
+        "Definition": prototype["definitions"][kind],
+    }
+    custom_prop[value_key] = value
+
+    return custom_prop
+
+
+def jira_list_field_to_spira_custom_prop(
+    spira_metadata, artifact_type, spira_custom_prop_name, issue_field_value
+) -> dict | None:
+    prototype = get_custom_property_prototype(
+        spira_metadata, artifact_type, spira_custom_prop_name
+    )
+
+    if prototype:
+        return new_custom_prop(
+            prototype,
+            "list",
+            "IntegerValue",
+            (
+                jira_list_value_to_spira_id(
+                    prototype["list_value_ids"], issue_field_value
+                )
+                if issue_field_value
+                else None
+            ),
+        )
     else:
         return None
 
@@ -858,71 +1060,25 @@ def jira_list_field_to_spira_custom_prop(
 def jira_multiselect_list_field_to_spira_custom_prop(
     spira_metadata, artifact_type, spira_custom_prop_name, issue_field_value
 ) -> dict | None:
-    spira_custom_props = spira_metadata["custom_properties"][artifact_type]
-
-    custom_prop_data = next(
-        filter((lambda x: x["Name"] == spira_custom_prop_name), spira_custom_props),
-        None,
+    prototype = get_custom_property_prototype(
+        spira_metadata, artifact_type, spira_custom_prop_name
     )
 
-    if custom_prop_data:
-        custom_prop = {
-            "PropertyNumber": custom_prop_data["PropertyNumber"],
-            "StringValue": None,
-            "IntegerValue": None,
-            "BooleanValue": None,
-            "DateTimeValue": None,
-            "DecimalValue": None,
-            "IntegerListValue": (
+    if prototype:
+        return new_custom_prop(
+            prototype,
+            "multiselect_list",
+            "IntegerListValue",
+            (
                 jira_multi_list_values_to_spira_ids(
-                    custom_prop_data["CustomList"]["Values"],
+                    prototype["list_value_ids"],
                     issue_field_value,
-                    custom_prop_data["CustomList"]["Name"],
+                    prototype["list_name"],
                 )
                 if issue_field_value
                 else None
             ),
-            "Definition": {
-                "CustomPropertyId": custom_prop_data["CustomPropertyId"],
-                "ProjectTemplateId": (
-                    None
-                    if artifact_type == "capability"
-                    else spira_metadata["project"]["ProjectTemplateId"]
-                ),
-                "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
-                "Name": custom_prop_data["CustomList"]["Name"],
-                "CustomList": {
-                    "CustomPropertyListId": custom_prop_data["CustomList"][
-                        "CustomPropertyListId"
-                    ],
-                    "ProjectTemplateId": (
-                        None
-                        if artifact_type == "capability"
-                        else spira_metadata["project"]["ProjectTemplateId"]
-                    ),
-                    "Name": None,
-                    "Active": False,
-                    "SortedOnValue": False,
-                    "Values": None,
-                    "Guid": None,
-                    "ConcurrencyGuid": None,
-                    "LastUpdateDate": None,
-                },
-                "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
-                "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
-                "CustomPropertyTypeName": "Multiselect List",
-                "IsDeleted": False,
-                "PropertyNumber": custom_prop_data["PropertyNumber"],
-                "SystemDataType": "System.Collections.Generic.List`1[System.Int32]",
-                "Options": None,
-                "Position": None,
-                "Description": "",
-                "Guid": None,
-                "ConcurrencyGuid": None,
-                "LastUpdateDate": None,
-            },
-        }
-        return custom_prop
+        )
     else:
         return None
 
@@ -930,50 +1086,17 @@ def jira_multiselect_list_field_to_spira_custom_prop(
 def jira_datetime_field_to_spira_custom_prop(
     spira_metadata, artifact_type, spira_custom_prop_name, issue_field_value
 ) -> dict | None:
-    spira_custom_props = spira_metadata["custom_properties"][artifact_type]
-
-    custom_prop_data = next(
-        filter((lambda x: x["Name"] == spira_custom_prop_name), spira_custom_props),
-        None,
+    prototype = get_custom_property_prototype(
+        spira_metadata, artifact_type, spira_custom_prop_name
     )
 
     if issue_field_value:
-        issue_field_value = convert_datetime(issue_field_value)
+        issue_field_value = parse_jira_datetime(issue_field_value)
 
-    if custom_prop_data:
-        custom_prop = {
-            "PropertyNumber": custom_prop_data["PropertyNumber"],
-            "StringValue": None,
-            "IntegerValue": None,
-            "BooleanValue": None,
-            "DateTimeValue": issue_field_value,
-            "DecimalValue": None,
-            "IntegerListValue": None,
-            "Definition": {
-                "CustomPropertyId": custom_prop_data["CustomPropertyId"],
-                "ProjectTemplateId": (
-                    None
-                    if artifact_type == "capability"
-                    else spira_metadata["project"]["ProjectTemplateId"]
-                ),
-                "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
-                "Name": custom_prop_data["CustomPropertyFieldName"],
-                "CustomList": None,
-                "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
-                "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
-                "CustomPropertyTypeName": "Date & Time",
-                "IsDeleted": False,
-                "PropertyNumber": custom_prop_data["PropertyNumber"],
-                "SystemDataType": "System.DateTime",
-                "Options": None,
-                "Position": None,
-                "Description": None,
-                "Guid": None,
-                "ConcurrencyGuid": None,
-                "LastUpdateDate": None,
-            },
-        }
-        return custom_prop
+    if prototype:
+        return new_custom_prop(
+            prototype, "date_time", "DateTimeValue", issue_field_value
+        )
     else:
         return None
 
@@ -981,47 +1104,12 @@ def jira_datetime_field_to_spira_custom_prop(
 def jira_string_field_to_spira_custom_prop(
     spira_metadata, artifact_type, spira_custom_prop_name, issue_field_value
 ) -> dict | None:
-    spira_custom_props = spira_metadata["custom_properties"][artifact_type]
-
-    custom_prop_data = next(
-        filter((lambda x: x["Name"] == spira_custom_prop_name), spira_custom_props),
-        None,
+    prototype = get_custom_property_prototype(
+        spira_metadata, artifact_type, spira_custom_prop_name
     )
 
-    if custom_prop_data:
-        custom_prop = {
-            "PropertyNumber": custom_prop_data["PropertyNumber"],
-            "StringValue": issue_field_value,
-            "IntegerValue": None,
-            "BooleanValue": None,
-            "DateTimeValue": None,
-            "DecimalValue": None,
-            "IntegerListValue": None,
-            "Definition": {
-                "CustomPropertyId": custom_prop_data["CustomPropertyId"],
-                "ProjectTemplateId": (
-                    None
-                    if artifact_type == "capability"
-                    else spira_metadata["project"]["ProjectTemplateId"]
-                ),
-                "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
-                "Name": custom_prop_data["CustomPropertyFieldName"],
-                "CustomList": None,
-                "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
-                "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
-                "CustomPropertyTypeName": "Text",
-                "IsDeleted": False,
-                "PropertyNumber": custom_prop_data["PropertyNumber"],
-                "SystemDataType": "System.String",
-                "Options": None,
-                "Position": None,
-                "Description": None,
-                "Guid": None,
-                "ConcurrencyGuid": None,
-                "LastUpdateDate": None,
-            },
-        }
-        return custom_prop
+    if prototype:
+        return new_custom_prop(prototype, "text", "StringValue", issue_field_value)
     else:
         return None
 
@@ -1029,47 +1117,12 @@ def jira_string_field_to_spira_custom_prop(
 def jira_decimal_field_to_spira_custom_prop(
     spira_metadata, artifact_type, spira_custom_prop_name, issue_field_value
 ) -> dict | None:
-    spira_custom_props = spira_metadata["custom_properties"][artifact_type]
-
-    custom_prop_data = next(
-        filter((lambda x: x["Name"] == spira_custom_prop_name), spira_custom_props),
-        None,
+    prototype = get_custom_property_prototype(
+        spira_metadata, artifact_type, spira_custom_prop_name
     )
 
-    if custom_prop_data:
-        custom_prop = {
-            "PropertyNumber": custom_prop_data["PropertyNumber"],
-            "StringValue": None,
-            "IntegerValue": None,
-            "BooleanValue": None,
-            "DateTimeValue": None,
-            "DecimalValue": issue_field_value,
-            "IntegerListValue": None,
-            "Definition": {
-                "CustomPropertyId": custom_prop_data["CustomPropertyId"],
-                "ProjectTemplateId": (
-                    None
-                    if artifact_type == "capability"
-                    else spira_metadata["project"]["ProjectTemplateId"]
-                ),
-                "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
-                "Name": custom_prop_data["CustomPropertyFieldName"],
-                "CustomList": None,
-                "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
-                "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
-                "CustomPropertyTypeName": "Decimal",
-                "IsDeleted": False,
-                "PropertyNumber": custom_prop_data["PropertyNumber"],
-                "SystemDataType": "System.Decimal",
-                "Options": None,
-                "Position": None,
-                "Description": None,
-                "Guid": None,
-                "ConcurrencyGuid": None,
-                "LastUpdateDate": None,
-            },
-        }
-        return custom_prop
+    if prototype:
+        return new_custom_prop(prototype, "decimal", "DecimalValue", issue_field_value)
     else:
         return None
 
@@ -1081,98 +1134,46 @@ def jira_textarea_field_to_spira_custom_prop(
     issue_field_value: str,
     jira_connection_dict,
     skip_ssl,
+    issue=None,  # With the field key, used for the markup pre-rendered on extraction
+    field_key=None,
 ) -> dict | None:
-    spira_custom_props = spira_metadata["custom_properties"][artifact_type]
-
-    custom_prop_data = next(
-        filter((lambda x: x["Name"] == spira_custom_prop_name), spira_custom_props),
-        None,
+    prototype = get_custom_property_prototype(
+        spira_metadata, artifact_type, spira_custom_prop_name
     )
 
-    if custom_prop_data:
-        custom_prop = {
-            "PropertyNumber": custom_prop_data["PropertyNumber"],
-            "StringValue": convert_jira_markup_to_html(
-                jira_connection_dict, skip_ssl, issue_field_value
+    if prototype:
+        return new_custom_prop(
+            prototype,
+            "text",
+            "StringValue",
+            render_issue_markup(
+                jira_connection_dict,
+                skip_ssl,
+                issue or {},
+                field_key,
+                issue_field_value,
             ),
-            "IntegerValue": None,
-            "BooleanValue": None,
-            "DateTimeValue": None,
-            "DecimalValue": None,
-            "IntegerListValue": None,
-            "Definition": {
-                "CustomPropertyId": custom_prop_data["CustomPropertyId"],
-                "ProjectTemplateId": (
-                    None
-                    if artifact_type == "capability"
-                    else spira_metadata["project"]["ProjectTemplateId"]
-                ),
-                "ArtifactTypeId": custom_prop_data["ArtifactTypeId"],
-                "Name": custom_prop_data["CustomPropertyFieldName"],
-                "CustomList": None,
-                "CustomPropertyFieldName": custom_prop_data["CustomPropertyFieldName"],
-                "CustomPropertyTypeId": custom_prop_data["CustomPropertyTypeId"],
-                "CustomPropertyTypeName": "Text",
-                "IsDeleted": False,
-                "PropertyNumber": custom_prop_data["PropertyNumber"],
-                "SystemDataType": "System.String",
-                "Options": None,
-                "Position": None,
-                "Description": None,
-                "Guid": None,
-                "ConcurrencyGuid": None,
-                "LastUpdateDate": None,
-            },
-        }
-        return custom_prop
+        )
     else:
         return None
 
 
-def jira_status_to_spira_status_id(mapping, status_types, issue_status_name) -> int:
-    mapped_name = mapping[issue_status_name]
+def jira_status_to_spira_status_id(status_ids, issue_status_name) -> int:
+    return status_ids.get(issue_status_name, 0)
 
-    status_object = next(filter(lambda x: x["Name"] == mapped_name, status_types), None)
 
-    if status_object and "StatusId" in status_object:
-        return int(status_object["StatusId"])
-    elif status_object and "RequirementStatusId" in status_object:
-        return int(status_object["RequirementStatusId"])
-    elif status_object and "IncidentStatusId" in status_object:
-        return int(status_object["IncidentStatusId"])
-    elif status_object and "TaskStatusId" in status_object:
-        return int(status_object["TaskStatusId"])
-    elif status_object and "CapabilityStatusId" in status_object:
-        return int(status_object["CapabilityStatusId"])
-    else:
-        return 0
-
-
-def jira_list_value_to_spira_id(custom_list_values, issue_field_value):
-    spira_list_value_id = next(
-        filter((lambda x: x["Name"] == issue_field_value["value"]), custom_list_values),
-        None,
-    )
-
-    if spira_list_value_id:
-        return spira_list_value_id["CustomPropertyValueId"]
-    else:
-        return None
+def jira_list_value_to_spira_id(list_value_ids, issue_field_value):
+    return list_value_ids.get(issue_field_value["value"])
 
 
 def jira_multi_list_values_to_spira_ids(
-    custom_list_values, issue_field_value, custom_list_name
+    list_value_ids, issue_field_value, custom_list_name
 ):
     list_of_ids = []
 
     for item in issue_field_value:
-        spira_list_value_id = next(
-            filter((lambda x: x["Name"] == item["value"]), custom_list_values),
-            None,
-        )
-
-        if spira_list_value_id:
-            list_of_ids.append(spira_list_value_id["CustomPropertyValueId"])
+        if item["value"] in list_value_ids:
+            list_of_ids.append(list_value_ids[item["value"]])
         else:
             print(
                 "Error: Spira can't match this value when migrating a multiselect list: "
@@ -1183,7 +1184,7 @@ def jira_multi_list_values_to_spira_ids(
     return list_of_ids
 
 
-def jira_version_to_spira_release_id(releases, issue):
+def jira_version_to_spira_release_id(release_ids, issue):
     affectedVersions = issue["fields"]["versions"]
     fixVersions = issue["fields"]["fixVersions"]
 
@@ -1202,16 +1203,12 @@ def jira_version_to_spira_release_id(releases, issue):
         print(str(fixVersions[1:]))
 
     if len(fixVersions) > 0:
-        release = next(
-            filter(lambda x: x["Name"] == fixVersions[0]["name"], releases), None
-        )
-
-        return release["ReleaseId"] if release is not None else None
+        return release_ids.get(fixVersions[0]["name"])
     else:
         return None
 
 
-def jira_version_to_spira_release_id_incident_type(releases, issue):
+def jira_version_to_spira_release_id_incident_type(release_ids, issue):
     affectedVersions = issue["fields"]["versions"]
     fixVersions = issue["fields"]["fixVersions"]
 
@@ -1234,33 +1231,21 @@ def jira_version_to_spira_release_id_incident_type(releases, issue):
         print(str(fixVersions[1:]))
 
     if len(affectedVersions) > 0:
-        detected_release_obj = next(
-            filter(lambda x: x["Name"] == affectedVersions[0]["name"], releases), None
-        )
-
-        incident_releases["detected_release"] = (
-            detected_release_obj["ReleaseId"]
-            if detected_release_obj is not None
-            else None
+        incident_releases["detected_release"] = release_ids.get(
+            affectedVersions[0]["name"]
         )
 
     if len(fixVersions) > 0:
-        fix_release_obj = next(
-            filter(lambda x: x["Name"] == fixVersions[0]["name"], releases), None
-        )
+        fix_release_id = release_ids.get(fixVersions[0]["name"])
         if issue["fields"]["resolution"] is not None:
-            incident_releases["verified_release"] = (
-                fix_release_obj["ReleaseId"] if fix_release_obj is not None else None
-            )
+            incident_releases["verified_release"] = fix_release_id
         else:
-            incident_releases["planned_release"] = (
-                fix_release_obj["ReleaseId"] if fix_release_obj is not None else None
-            )
+            incident_releases["planned_release"] = fix_release_id
 
     return incident_releases
 
 
-def jira_component_to_spira_component_id(components, issue, isComponentArray=False):
+def jira_component_to_spira_component_id(component_ids, issue, isComponentArray=False):
     jira_components = issue["fields"]["components"]
 
     if not isComponentArray and len(jira_components) > 1:
@@ -1275,19 +1260,10 @@ def jira_component_to_spira_component_id(components, issue, isComponentArray=Fal
         return []
 
     if isComponentArray:
-        component_ids = []
+        component_ids_of_issue = []
         for component in jira_components:
-            spira_component_obj = next(
-                filter(lambda x: x["Name"] == component["name"], components), None
-            )
-            if spira_component_obj is not None and "ComponentId" in spira_component_obj:
-                component_ids.append(spira_component_obj["ComponentId"])
-        return component_ids
+            if component["name"] in component_ids:
+                component_ids_of_issue.append(component_ids[component["name"]])
+        return component_ids_of_issue
     else:
-        spira_component_obj = next(
-            filter(lambda x: x["Name"] == jira_components[0]["name"], components), None
-        )
-        if spira_component_obj is not None and "ComponentId" in spira_component_obj:
-            return spira_component_obj["ComponentId"]
-        else:
-            return None
+        return component_ids.get(jira_components[0]["name"])
@@ -1,15 +1,14 @@
 import json
-from utility import convert_jira_markup_to_html
+from jira_markup_renderer import render_issue_markup, resolve_rendered_markup
 from convert_jira_to_spira_issues import (
     find_spira_user_id_by_email,
     get_jira_data_from_custom_field,
     add_custom_properties,
-    get_mapped_spira_type_name,
     jira_status_to_spira_status_id,
-    get_mapped_spira_type_name,
+    jira_priority_to_spira_priority_id,
+    jira_issue_type_to_spira_type_id,
 )
 
-
 # Convert a single type of issues to the correctly mapped one on the program level in spira.
 def convert_jira_issues_to_spira_program_capabilities(
     jira_connection_dict,
@@ -35,58 +34,57 @@ def convert_jira_issues_to_spira_program_capabilities(
 
     for issue in issues:
         if (
-            get_mapped_spira_type_name(
-                mapping_dict["types"]["capabilities"],
-                issue["fields"]["issuetype"]["name"],
-            )
-            is not None
+            issue["fields"]["issuetype"]["name"]
+            in spira_metadata["lookups"]["type_names"]["capabilities"]
             and issue["fields"]["issuetype"]["name"] == current_issue_type
         ):
             capability = {
                 "issue_type": issue["fields"]["issuetype"]["name"],
                 "program_id": program_id,
+                "jira_key": issue["key"],
             }
 
             payload = {
                 # CapabilityId - READ ONLY - set when spira creates the capability
                 # ProjectGroupId - essentially READ ONLY - set when inserted into a program, as ProjectGroupId is the same as program_id
                 "MilestoneId": get_milestone_id_from_jira_issue(
-                    issue, spira_metadata["milestones"]
+                    issue, spira_metadata["lookups"]["milestones"]
                 ),
                 # MilestoneName
                 "StatusId": jira_status_to_spira_status_id(
-                    mapping_dict["statuses"]["capabilities"],
-                    spira_metadata["statuses"]["capability"],
+                    spira_metadata["lookups"]["statuses"]["capabilities"],
                     issue["fields"]["status"]["name"],
                 ),
                 # StatusName
                 # StatusIsOpen
-                "TypeId": jira_issue_type_to_spira_capability_type_id(
-                    spira_metadata["types"]["capability"],
+                "TypeId": jira_issue_type_to_spira_type_id(
+                    spira_metadata["lookups"]["types"]["capabilities"],
                     issue["fields"]["issuetype"]["name"],
-                    mapping_dict,
                 ),
                 # TypeName
-                "PriorityId": jira_priority_to_capability_priority_id(
-                    spira_metadata["priorities"]["capability"],
-                    issue["fields"]["priority"]["name"],
-                    mapping_dict["priorities"]["capabilities"],
+                "PriorityId": jira_priority_to_spira_priority_id(
+                    spira_metadata["lookups"]["priorities"]["capabilities"],
+                    issue["fields"]["priority"],
                 ),
                 # PriorityName
                 "Name": issue["fields"]["summary"],
-                "Description": convert_jira_markup_to_html(
-                    jira_connection_dict, skip_ssl, issue["fields"]["description"]
+                "Description": render_issue_markup(
+                    jira_connection_dict,
+                    skip_ssl,
+                    issue,
+                    "description",
+                    issue["fields"]["description"],
                 ),
                 # PercentComplete - probably read only
                 # RequirementCount - probably read only
                 # IndentLevel
                 # Guid - READ ONLY - assigned when created
                 "CreatorId": find_spira_user_id_by_email(
-                    spira_metadata["users"], "reporter", issue
+                    spira_metadata["users_by_email"], "reporter", issue
                 ),
                 # CreatorName - Above method is enough
                 "OwnerId": find_spira_user_id_by_email(
-                    spira_metadata["users"], "assignee", issue
+                    spira_metadata["users_by_email"], "assignee", issue
                 ),
                 # OwnerName - Above method is enough
                 # CreationDate - READ ONLY - probably need to be put in a custom field or something
@@ -108,14 +106,17 @@ def convert_jira_issues_to_spira_program_capabilities(
 
             capability["payload"] = payload
             capability["parent_link"] = get_jira_data_from_custom_field(
-                issue, jira_metadata["customfields"], "Parent Link"
+                issue, jira_metadata["customfield_ids"], "Parent Link"
             )
             capability["epic_link"] = get_jira_data_from_custom_field(
-                issue, jira_metadata["customfields"], "Epic Link"
+                issue, jira_metadata["customfield_ids"], "Epic Link"
             )
 
             output_dict["program"].append(capability)
 
+    # The markup of all the capabilities was submitted while building, collect the html
+    resolve_rendered_markup(output_dict)
+
     json.dump(output_dict, conversion_output, indent=4)
 
     conversion_output.close()
@@ -211,7 +212,7 @@ def convert_jira_versions_to_spira_program_milestones(
     milestones_to_spira.close()
 
 
-def get_milestone_id_from_jira_issue(issue, milestones):
+def get_milestone_id_from_jira_issue(issue, milestone_ids):
     affectedVersions = issue["fields"]["versions"]
     fixVersions = issue["fields"]["fixVersions"]
 
@@ -230,13 +231,7 @@ def get_milestone_id_from_jira_issue(issue, milestones):
         print(str(fixVersions[1:]))
 
     if len(fixVersions) > 0:
-        milestone = next(
-            filter(lambda x: x["Name"] == fixVersions[0]["name"], milestones), None
-        )
-        if milestone is not None and "MilestoneId" in milestone:
-            return milestone["MilestoneId"]
-        else:
-            return None
+        return milestone_ids.get(fixVersions[0]["name"])
     else:
         return None
 
@@ -273,46 +268,3 @@ def calculate_milestone_status_id(
         return found_milestone["StatusId"] if found_milestone is not None else 0
     else:
         return 0
-
-
-def jira_priority_to_capability_priority_id(
-    spira_priorities, jira_priority_name, priority_mapping
-) -> int:
-    if jira_priority_name is None:
-        print(
-            "Priority is null, artifact priority will have to be added in spira manually"
-        )
-        return 0
-
-    mapped_name = priority_mapping[jira_priority_name]
-
-    priority_object = next(
-        filter(lambda x: x["Name"] == mapped_name, spira_priorities), None
-    )
-
-    if priority_object:
-        return int(priority_object["CapabilityPriorityId"])
-    else:
-        return 0
-
-
-def jira_issue_type_to_spira_capability_type_id(capability_types, issue_type, mapping):
-    if issue_type is None:
-        return 0
-
-    spira_mapped_type_name = get_mapped_spira_type_name(
-        mapping["types"]["capabilities"], issue_type
-    )
-
-    if not spira_mapped_type_name:
-        # If the spira type is not mapped to a jira type
-        return 0
-
-    capability_type_object = next(
-        filter(lambda x: x["Name"] == spira_mapped_type_name, capability_types)
-    )
-
-    if capability_type_object:
-        return int(capability_type_object["CapabilityTypeId"])
-    else:
-        return 0
@@ -53,6 +53,7 @@ def convert_jira_to_spira_releases(jira_output_versions_dict, mapping_dict):
 
         is_parent = check_if_parent(version["name"])
 
+        release["jira_key"] = version["name"] if "name" in version else ""
         release["is_parent"] = is_parent
         release["payload"] = payload
 
@@ -88,6 +89,7 @@ def convert_jira_to_spira_components(
             # LastUpdateDate - READ ONLY
         }
 
+        spira_component["jira_key"] = component["name"] if "name" in component else ""
         spira_component["payload"] = payload
 
         to_spira_dict["components"].append(spira_component)
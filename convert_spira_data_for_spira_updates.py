@@ -1,9 +1,10 @@
 from convert_jira_to_spira_issue_elements import get_artifact_id_data_from_jira_id
+from artifact_index import ArtifactIndex
 import json
 
 
 def convert_spira_data_for_spira_updates(
-    all_documents_in_spira, all_artifacts_in_spira, action, spira_metadata
+    all_documents_in_spira, artifact_index: ArtifactIndex, action, spira_metadata
 ):
     print("Starting conversion")
 
@@ -22,7 +23,7 @@ def convert_spira_data_for_spira_updates(
 
             if property:
                 artifact_id_data = get_artifact_id_data_from_jira_id(
-                    property["StringValue"], all_artifacts_in_spira
+                    property["StringValue"], artifact_index
                 )
                 document["artifact_id_data"] = artifact_id_data
                 validation_dict["update_action"] = "add_document_association"
@@ -0,0 +1,147 @@
+# Failure log
+# Compact record of the creates that failed in spira, one json object per line, per spira product or program.
+# A failure keeps the spira request to send again, the error and the http status code. The file contents
+# of documents are left out, so a bad run doesn't flood the terminal or the disk.
+# The retry_failed command sends the logged requests again.
+import json
+import os
+import threading
+import time
+from migration_journal import MigrationJournal, get_payload_hash
+
+FAILURE_LOG_DIRECTORY = "temp"
+
+# Used for the failures of the stages without a migration journal
+DEFAULT_FAILURE_LOG_NAME = "migration"
+
+# Payload fields left out of the log, documents are downloaded from jira again when they are retried
+OMITTED_PAYLOAD_FIELDS = ["BinaryData"]
+
+MAX_ERROR_LENGTH = 1000
+
+# The open failure logs by path, and the number of failures written to them
+failure_logs = {}
+failure_statistics = {}
+failure_logs_lock = threading.Lock()
+
+# When set, all the failures are written to this file instead of the failure log of their journal
+redirected_failure_log = {"path": None}
+
+
+# Log a failed create in the failure log of the journal, and print a single line about it.
+# request is the spira method and its arguments before the payload, e.g. {"method": "create_task", "args": [1]}.
+# After a successful retry the created id is read from id_key, or else spira_id is used, and recorded in the journal.
+# Anything else needed for the retry, e.g. the jira attachment id of a document, is passed as details.
+# Failures of the conversion, before anything is sent to spira, pass stage="conversion".
+def log_failure(
+    error,
+    artifact_type,
+    jira_key,
+    request,
+    payload=None,
+    journal: MigrationJournal | None = None,
+    id_key=None,
+    spira_id=None,
+    **details,
+):
+    status_code = getattr(error, "status_code", None)
+    failure = {
+        "artifact_type": artifact_type,
+        "jira_key": jira_key,
+        "status_code": status_code,
+        "error": str(error)[:MAX_ERROR_LENGTH],
+        "request": request,
+        "payload": get_loggable_payload(payload),
+        "payload_hash": get_payload_hash(payload),
+        "journal": journal.name if journal is not None else None,
+        "id_key": id_key,
+        "spira_id": spira_id,
+        "failed_at": time.time(),
+        **details,
+    }
+
+    is_conversion = details.get("stage") == "conversion"
+    print(
+        "An error occured when trying to "
+        + ("convert" if is_conversion else "create")
+        + " the "
+        + artifact_type.replace("_", " ")
+        + " of jira key "
+        + str(jira_key)
+        + (" for spira" if is_conversion else " in spira")
+        + (", status code " + str(status_code) if status_code is not None else "")
+        + ": "
+        + str(error)[:200]
+    )
+
+    write_failure(failure["journal"] or DEFAULT_FAILURE_LOG_NAME, failure)
+
+
+def write_failure(name, failure):
+    line = json.dumps(failure, default=str, separators=(",", ":")) + "\n"
+
+    with failure_logs_lock:
+        path = redirected_failure_log["path"] or get_failure_log_path(name)
+        if path not in failure_logs:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            failure_logs[path] = open(path, "a", encoding="UTF-8")
+
+        failure_logs[path].write(line)
+        failure_logs[path].flush()
+        failure_statistics[path] = failure_statistics.get(path, 0) + 1
+
+
+def get_failure_log_path(name) -> str:
+    return os.path.join(FAILURE_LOG_DIRECTORY, "failures_" + name + ".ndjson")
+
+
+def get_loggable_payload(payload):
+    if not isinstance(payload, dict):
+        return payload
+
+    return {
+        key: value
+        for key, value in payload.items()
+        if key not in OMITTED_PAYLOAD_FIELDS
+    }
+
+
+# Read the failures of a failure log file, the lines that can't be parsed are skipped.
+def read_failures(path) -> list:
+    failures = []
+    with open(path, "r", encoding="UTF-8") as file:
+        for line in file:
+            try:
+                failures.append(json.loads(line))
+            except ValueError:
+                continue
+
+    return failures
+
+
+# Write all the failures to the given file, e.g. the failure log being retried, or back to their own log with None.
+def redirect_failure_log(path):
+    close_failure_logs()
+    with failure_logs_lock:
+        redirected_failure_log["path"] = path
+
+
+def close_failure_logs():
+    with failure_logs_lock:
+        for failure_log in failure_logs.values():
+            failure_log.close()
+        failure_logs.clear()
+
+
+def print_failure_statistics():
+    close_failure_logs()
+
+    for path, count in failure_statistics.items():
+        print(
+            str(count)
+            + " failures written to "
+            + path
+            + ", they can be sent again with the retry_failed command"
+        )
+    failure_statistics.clear()
@@ -0,0 +1,348 @@
+# Jira markup renderer
+# Renders jira wiki markup to html through the render endpoint of jira.
+# The renders share a pooled session and run on a bounded thread pool, so converters can submit
+# the markup while building the payloads and collect the html afterwards.
+# Rendered markup is kept in the render cache, so the same markup is only sent to jira once.
+# With local rendering the markup is rendered by the jira wiki renderer, and only sent to jira
+# when it uses something the local renderer does not support.
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+import json
+from utility import try_json_dump_string
+from jira_wiki_renderer import render_jira_wiki_markup
+from render_cache import (
+    DEFAULT_RENDER_CACHE_SIZE_MB,
+    RenderCache,
+    get_render_cache_key,
+)
+
+# Number of renders running at the same time, if not set in the jira connection dict
+DEFAULT_RENDER_WORKERS = 8
+
+# Number of submitted renders that can wait per render worker, before submitting blocks
+RENDER_QUEUE_SIZE_PER_WORKER = 4
+
+# Pre-compiled regex for stripping the \xhh chars from the markup.
+regex_x_escape_chars = re.compile(r"\\x([0-9a-fA-F]{2})")
+
+
+# Number of renders taken from the render cache and sent to jira, in this process
+render_statistics = {"local_renders": 0, "cache_hits": 0, "renders": 0}
+render_statistics_lock = threading.Lock()
+
+
+class JiraMarkupRenderer:
+
+    def __init__(
+        self,
+        jira_base_url,
+        skip_ssl,
+        workers=DEFAULT_RENDER_WORKERS,
+        cache=None,
+        render_locally=False,
+    ):
+        self.jira_base_url = jira_base_url
+        self.render_locally = render_locally
+        self.render_markup_url = jira_base_url + "/rest/api/1.0/render"
+        self.renderer_type = "atlassian-wiki-renderer"
+        self.cache: RenderCache | None = cache
+
+        # All the renders reuse the connections of the same session
+        self.session = requests.Session()
+        self.session.verify = not skip_ssl
+        self.session.headers.update({"Content-Type": "application/json"})
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="jira-render"
+        )
+        self.queue_slots = threading.BoundedSemaphore(
+            workers * RENDER_QUEUE_SIZE_PER_WORKER
+        )
+
+        # Renders that are submitted but not finished, the same markup shares the render
+        self.pending_renders = {}
+        self.pending_renders_lock = threading.Lock()
+
+    # Render the markup and wait for the html.
+    def render(self, jira_markup: str) -> str:
+        prepared_markup, result = self.prepare_markup(jira_markup)
+
+        if result is None:
+            result = self.get_local_render(prepared_markup)
+
+        if result is None:
+            result = self.get_cached_render(prepared_markup)
+
+        if result is not None:
+            return result
+
+        return self.request_render(prepared_markup)
+
+    # Submit the markup for rendering, the future resolves to the html.
+    # Blocks when the render queue is full, until one of the submitted renders finishes.
+    def submit(self, jira_markup: str) -> Future:
+        prepared_markup, result = self.prepare_markup(jira_markup)
+
+        if result is None:
+            result = self.get_local_render(prepared_markup)
+
+        if result is None:
+            result = self.get_cached_render(prepared_markup)
+
+        if result is not None:
+            future = Future()
+            future.set_result(result)
+            return future
+
+        render_key = self.get_cache_key(prepared_markup)
+
+        with self.pending_renders_lock:
+            if render_key in self.pending_renders:
+                count_render_statistic("cache_hits")
+                return self.pending_renders[render_key]
+
+        self.queue_slots.acquire()
+
+        with self.pending_renders_lock:
+            future = self.executor.submit(self.request_render, prepared_markup)
+            self.pending_renders[render_key] = future
+
+        future.add_done_callback(lambda _: self.finish_pending_render(render_key))
+
+        return future
+
+    def finish_pending_render(self, render_key):
+        with self.pending_renders_lock:
+            self.pending_renders.pop(render_key, None)
+
+        self.queue_slots.release()
+
+    # Returns the markup to render, or the result directly if the markup should not be sent to jira.
+    def prepare_markup(self, jira_markup: str):
+        if jira_markup is None or jira_markup == "":
+            return None, "--EMPTY--"
+
+        # Strip all the \x unicode chars.
+        jira_markup = regex_x_escape_chars.sub("", jira_markup)
+
+        # Try to dump a string to json. If it fails return a standard string and warning messages.
+        if not try_json_dump_string(jira_markup):
+            return (
+                None,
+                "--MIGRATION OF TEXT FAILED because of error during JSON validation--",
+            )
+
+        return jira_markup, None
+
+    def get_local_render(self, jira_markup: str) -> str | None:
+        if not self.render_locally:
+            return None
+
+        html = render_jira_wiki_markup(jira_markup, self.jira_base_url)
+
+        if html is not None:
+            count_render_statistic("local_renders")
+
+        return html
+
+    def get_cached_render(self, jira_markup: str) -> str | None:
+        if self.cache is None:
+            return None
+
+        html = self.cache.get(self.get_cache_key(jira_markup))
+
+        if html is not None:
+            count_render_statistic("cache_hits")
+
+        return html
+
+    def get_cache_key(self, jira_markup: str) -> str:
+        return get_render_cache_key(self.jira_base_url, self.renderer_type, jira_markup)
+
+    def request_render(self, jira_markup: str) -> str:
+        body = {
+            "rendererType": self.renderer_type,
+            "unrenderedMarkup": jira_markup,
+        }
+
+        response = self.session.post(self.render_markup_url, data=json.dumps(body))
+        count_render_statistic("renders")
+
+        if response.status_code != 200:
+            print(response.text)
+            print("Conversion of text from jira markup to html failed for text:")
+            print(jira_markup)
+            print(repr(jira_markup))
+            return "--MIGRATION OF TEXT FAILED because of jira renderer error--"
+        else:
+            # Only successful renders are cached, failed ones are tried again on the next run
+            if self.cache is not None:
+                self.cache.put(self.get_cache_key(jira_markup), response.text)
+
+            return response.text
+
+    def close(self):
+        self.executor.shutdown()
+        self.session.close()
+
+        if self.cache is not None:
+            self.cache.close()
+
+
+# One renderer per process and jira instance, worker processes create their own.
+jira_markup_renderers = {}
+
+
+def get_jira_markup_renderer(jira_connection_dict, skip_ssl) -> JiraMarkupRenderer:
+    renderer_key = (os.getpid(), jira_connection_dict["jira_base_url"], skip_ssl)
+
+    if renderer_key not in jira_markup_renderers:
+        # The render cache is only used when a path is set in the jira connection dict
+        cache = None
+        if jira_connection_dict.get("render_cache_path"):
+            cache = RenderCache(
+                jira_connection_dict["render_cache_path"],
+                jira_connection_dict.get(
+                    "render_cache_size", DEFAULT_RENDER_CACHE_SIZE_MB
+                ),
+            )
+
+        jira_markup_renderers[renderer_key] = JiraMarkupRenderer(
+            jira_connection_dict["jira_base_url"],
+            skip_ssl,
+            jira_connection_dict.get("render_workers", DEFAULT_RENDER_WORKERS),
+            cache,
+            jira_connection_dict.get("render_locally", False),
+        )
+
+    return jira_markup_renderers[renderer_key]
+
+
+# Close the renderers of this process, so the last uses of the cached renders are written to the cache.
+def close_jira_markup_renderers():
+    for renderer_key in [
+        renderer_key
+        for renderer_key in jira_markup_renderers
+        if renderer_key[0] == os.getpid()
+    ]:
+        jira_markup_renderers.pop(renderer_key).close()
+
+
+def convert_jira_markup_to_html(jira_connection_dict, skip_ssl, jira_markup: str):
+    return get_jira_markup_renderer(jira_connection_dict, skip_ssl).render(jira_markup)
+
+
+# Submit the markup for rendering, resolve the returned future with resolve_rendered_markup.
+def submit_jira_markup_to_html(
+    jira_connection_dict, skip_ssl, jira_markup: str
+) -> Future:
+    return get_jira_markup_renderer(jira_connection_dict, skip_ssl).submit(jira_markup)
+
+
+# Key of the pre-rendered comment bodies in the rendered markup of an issue
+def get_comment_rendered_key(comment) -> str:
+    return "comment:" + str(comment["id"])
+
+
+# Submit the markup of a page of extracted issues for rendering, the futures are stored next to the raw
+# issue under "rendered" and resolved with resolve_rendered_markup before the issues are saved.
+# The field keys are "description", the jira keys and ids of rich text fields, and "comments" for all comments.
+def pre_render_issue_markup(jira_connection_dict, skip_ssl, issues, field_keys):
+    for issue in issues:
+        rendered = issue.setdefault("rendered", {})
+
+        for field_key in field_keys:
+            if field_key == "comments":
+                for comment in issue["fields"].get("comment", {}).get("comments", []):
+                    rendered[get_comment_rendered_key(comment)] = (
+                        submit_jira_markup_to_html(
+                            jira_connection_dict, skip_ssl, comment["body"]
+                        )
+                    )
+            # Only text is rendered, other values are left to the conversion
+            elif isinstance(issue["fields"].get(field_key, ""), str | None):
+                rendered[field_key] = submit_jira_markup_to_html(
+                    jira_connection_dict, skip_ssl, issue["fields"].get(field_key)
+                )
+
+
+# The html of the markup, pre-rendered when the issue was extracted or else submitted for rendering.
+def render_issue_markup(
+    jira_connection_dict, skip_ssl, issue, rendered_key, jira_markup: str
+):
+    rendered = issue.get("rendered", {})
+
+    if rendered_key in rendered:
+        return rendered[rendered_key]
+
+    return submit_jira_markup_to_html(jira_connection_dict, skip_ssl, jira_markup)
+
+
+# Replace all the submitted renders in the converted data with their html, in place.
+def resolve_rendered_markup(converted_data):
+    if isinstance(converted_data, dict):
+        items = converted_data.items()
+    elif isinstance(converted_data, list):
+        items = enumerate(converted_data)
+    else:
+        return converted_data
+
+    for key, value in items:
+        if isinstance(value, Future):
+            converted_data[key] = value.result()
+        else:
+            resolve_rendered_markup(value)
+
+    return converted_data
+
+
+def count_render_statistic(name):
+    with render_statistics_lock:
+        render_statistics[name] += 1
+
+
+# Take the render statistics of this process and reset them, used to send them from worker processes.
+def take_render_statistics() -> dict:
+    with render_statistics_lock:
+        statistics = dict(render_statistics)
+        for name in render_statistics:
+            render_statistics[name] = 0
+    return statistics
+
+
+def add_render_statistics(statistics):
+    with render_statistics_lock:
+        for name, count in statistics.items():
+            render_statistics[name] += count
+
+
+def print_render_statistics():
+    local_renders = render_statistics["local_renders"]
+    cache_hits = render_statistics["cache_hits"]
+    renders = render_statistics["renders"]
+    total = local_renders + cache_hits + renders
+
+    print(
+        "Rendered markup: "
+        + str(total)
+        + ", rendered locally: "
+        + str(local_renders)
+        + ", taken from the render cache: "
+        + str(cache_hits)
+        + ", rendered by jira: "
+        + str(renders)
+        + (
+            " (cache hit rate "
+            + str(round(cache_hits * 100 / (cache_hits + renders), 1))
+            + "%)"
+            if cache_hits + renders > 0
+            else ""
+        )
+    )
@@ -2,9 +2,15 @@ import sys
 import json
 import os
 from jira import JIRA
+from jira_markup_renderer import resolve_rendered_markup
 
+# Number of issues extracted from jira per page
+JIRA_SEARCH_PAGE_SIZE = 100
 
-def jira_to_json(jira, output_file_handle, jql):
+
+# Extract the issues of the jql page by page. If set, pre_render is called with every page
+# of raw issues, so the markup of the page is rendered while the next pages are extracted.
+def jira_to_json(jira, output_file_handle, jql, pre_render=None):
     if not (jira and output_file_handle):
         print("Jira connection instance or output file handle found, exiting")
         sys.exit(1)
@@ -13,23 +19,44 @@ def jira_to_json(jira, output_file_handle, jql):
 
     print("Using jql query: '" + jql + "' to search for issues...")
 
-    issues = jira.search_issues(
-        jql, maxResults=False, fields="*all"
-    )  # The script expect it to retrieve all issues, but it is unknown if it's actually the case as the docs dont specify it.
+    start_at = 0
+    while True:
+        issues = jira.search_issues(
+            jql, startAt=start_at, maxResults=JIRA_SEARCH_PAGE_SIZE, fields="*all"
+        )
+
+        raw_issues = [issue.raw for issue in issues]
+
+        if pre_render is not None:
+            pre_render(raw_issues)
+
+        outdict["issues"] += raw_issues
+        start_at += len(raw_issues)
+
+        # Jira can return smaller pages than asked for, the total tells when it's done
+        if len(raw_issues) == 0 or (
+            issues.total is not None and start_at >= issues.total
+        ):
+            break
+
+        print("Extracted " + str(start_at) + " of " + str(issues.total) + " issues...")
 
-    print("Number of issues found: " + str(len(issues)))
+    print("Number of issues found: " + str(len(outdict["issues"])))
     print(
         "Saving to file in directory: " + str(os.path.realpath(output_file_handle.name))
     )
 
-    for issue in issues:
-        outdict["issues"].append(issue.raw)
+    # Wait for the renders of the last pages
+    if pre_render is not None:
+        print("Waiting for the pre-rendered markup...")
+        for issue in outdict["issues"]:
+            resolve_rendered_markup(issue["rendered"])
 
     json.dump(outdict, output_file_handle, indent=4)
 
     print("Extraction of issues complete")
 
-    return len(issues)
+    return len(outdict["issues"])
 
 
 def jira_versions_to_json(jira, output_file_handle, projects):
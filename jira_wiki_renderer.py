@@ -0,0 +1,460 @@
+# Jira wiki renderer
+# Renders the common jira wiki markup to html locally, following the html of the jira render endpoint.
+# Covers headings, text effects, lists, tables, {noformat}, {quote}, {panel}, {color}, links and external
+# images. For {code}, which jira highlights, mentions, which jira shows by the name of the user, any other
+# macro, attachment images, issue links and emoticons render_jira_wiki_markup returns None, so the markup
+# can be rendered by jira instead.
+# The renders are checked against recorded renders of jira in tests/test_jira_wiki_renderer.py.
+import re
+
+# Block macros that are rendered locally, when they start on their own line
+regex_block_macro = re.compile(
+    r"^[ \t]*\{(noformat|quote|panel)(?::([^}]*))?\}", re.MULTILINE
+)
+
+regex_heading = re.compile(r"^h([1-6])\.\s+(.*)$")
+regex_block_quote = re.compile(r"^bq\.\s+(.*)$")
+regex_list_item = re.compile(r"^([*#]+|-)\s+(.*)$")
+regex_horizontal_rule = re.compile(r"^-{4,}$")
+
+regex_monospace = re.compile(r"\{\{(.+?)\}\}")
+regex_color = re.compile(r"\{color:([#\w]+)\}(.*?)\{color\}")
+regex_link = re.compile(r"\[([^\[\]\n]+)\]")
+regex_image = re.compile(r"!([^\s!][^!\n]*?)!")
+regex_url = re.compile(
+    r"(?<![\w\"'=/])((?:https?|ftp)://[^\s<>\"'\[\]|]+[^\s<>\"'\[\]|.,;:!?)])"
+)
+regex_escaped_char = re.compile(r"\\([^\\])")
+regex_macro = re.compile(r"\{[a-zA-Z]+(?::[^}]*)?\}")
+regex_emoticon = re.compile(
+    r"(?<!\w)(?::\)|:\(|:P|:D|;\)|\((?:y|n|i|/|x|!|\+|-|\?|on|off|\*[rgby]?|flag|flagoff)\))"
+)
+regex_link_url = re.compile(r"^(?:(?:https?|ftp|file)://|mailto:)\S+$")
+regex_placeholder = re.compile("\x00(\\d+)\x00")
+
+# Text effects, from the markup character to the html tag
+text_effects = [
+    (r"\?\?", "cite"),
+    (r"\*", "b"),
+    (r"_", "em"),
+    (r"-", "del"),
+    (r"\+", "ins"),
+    (r"\^", "sup"),
+    (r"~", "sub"),
+]
+regex_text_effects = [
+    (
+        re.compile(
+            r"(?<![\w"
+            + char
+            + r"])"
+            + char
+            + r"(?=\S)(.+?)(?<=\S)"
+            + char
+            + r"(?![\w"
+            + char
+            + r"])"
+        ),
+        tag,
+    )
+    for char, tag in text_effects
+]
+
+list_tags = {
+    "*": ("<ul>", "</ul>"),
+    "#": ("<ol>", "</ol>"),
+    "-": ('<ul class="alternate" type="square">', "</ul>"),
+}
+
+
+class UnsupportedMarkup(Exception):
+    pass
+
+
+# Render the markup to html, None if the markup uses something that is not rendered locally.
+def render_jira_wiki_markup(jira_markup: str, jira_base_url="") -> str | None:
+    # The placeholders of the inline rendering use the null character
+    if "\x00" in jira_markup:
+        return None
+
+    try:
+        return "\n".join(
+            render_blocks(jira_markup.replace("\r\n", "\n"), jira_base_url)
+        )
+    except UnsupportedMarkup:
+        return None
+
+
+def render_blocks(markup, jira_base_url) -> list:
+    html = []
+    position = 0
+
+    while True:
+        match = regex_block_macro.search(markup, position)
+        if match is None:
+            html += render_lines(markup[position:].split("\n"), jira_base_url)
+            return html
+
+        html += render_lines(
+            markup[position : match.start()].split("\n"), jira_base_url
+        )
+
+        name, params = match.group(1), match.group(2)
+        closing_tag = "{" + name + "}"
+        end = markup.find(closing_tag, match.end())
+        if end == -1:
+            raise UnsupportedMarkup()
+
+        html.append(
+            render_block_macro(name, params, markup[match.end() : end], jira_base_url)
+        )
+        position = end + len(closing_tag)
+
+
+def render_block_macro(name, params, content, jira_base_url) -> str:
+    params = parse_macro_params(params)
+
+    if params.keys() - {"title"}:
+        raise UnsupportedMarkup()
+
+    if name == "noformat":
+        return (
+            '<div class="preformatted panel" style="border-width: 1px;">'
+            + render_panel_header(params.get("title"), "preformattedHeader panelHeader")
+            + '<div class="preformattedContent panelContent">\n<pre>'
+            + escape_html(content.strip("\n"))
+            + "</pre>\n</div></div>"
+        )
+
+    inner_html = "\n".join(render_blocks(content.strip("\n"), jira_base_url))
+
+    if name == "quote":
+        if params:
+            raise UnsupportedMarkup()
+        return "<blockquote>\n" + inner_html + "\n</blockquote>"
+
+    return (
+        '<div class="panel" style="border-width: 1px;">'
+        + render_panel_header(params.get("title"), "panelHeader")
+        + '<div class="panelContent">\n'
+        + inner_html
+        + "\n</div></div>"
+    )
+
+
+def render_panel_header(title, header_class) -> str:
+    if title is None:
+        return ""
+    return (
+        '<div class="'
+        + header_class
+        + '" style="border-bottom-width: 1px;"><b>'
+        + escape_html(title)
+        + "</b></div>"
+    )
+
+
+# Params of a macro, "python|title=Example" gives {"": "python", "title": "Example"}.
+def parse_macro_params(params) -> dict:
+    parsed = {}
+    for param in (params or "").split("|"):
+        if param == "":
+            continue
+        if "=" in param:
+            key, value = param.split("=", 1)
+            parsed[key.strip()] = value.strip()
+        elif "" not in parsed:
+            parsed[""] = param.strip()
+        else:
+            raise UnsupportedMarkup()
+    return parsed
+
+
+def render_lines(lines, jira_base_url) -> list:
+    html = []
+    paragraph = []
+    list_items = []
+    table_rows = []
+
+    def close_blocks():
+        if paragraph:
+            html.append("<p>" + "<br/>\n".join(paragraph) + "</p>")
+            paragraph.clear()
+        if list_items:
+            html.append(render_list(list_items))
+            list_items.clear()
+        if table_rows:
+            html.append(render_table(table_rows, jira_base_url))
+            table_rows.clear()
+
+    for line in lines:
+        stripped_line = line.strip()
+
+        if stripped_line == "":
+            close_blocks()
+            continue
+
+        if stripped_line.startswith("|"):
+            if paragraph or list_items:
+                close_blocks()
+            table_rows.append(stripped_line)
+            continue
+
+        if regex_horizontal_rule.match(stripped_line):
+            close_blocks()
+            html.append("<hr />")
+            continue
+
+        heading = regex_heading.match(stripped_line)
+        if heading:
+            close_blocks()
+            text = render_inline(heading.group(2), jira_base_url)
+            html.append(
+                "<h"
+                + heading.group(1)
+                + '><a name="'
+                + get_anchor_name(heading.group(2))
+                + '"></a>'
+                + text
+                + "</h"
+                + heading.group(1)
+                + ">"
+            )
+            continue
+
+        block_quote = regex_block_quote.match(stripped_line)
+        if block_quote:
+            close_blocks()
+            html.append(
+                "<blockquote><p>"
+                + render_inline(block_quote.group(1), jira_base_url)
+                + "</p></blockquote>"
+            )
+            continue
+
+        list_item = regex_list_item.match(stripped_line)
+        if list_item:
+            if paragraph or table_rows:
+                close_blocks()
+            list_items.append(
+                (list_item.group(1), render_inline(list_item.group(2), jira_base_url))
+            )
+            continue
+
+        if list_items or table_rows:
+            close_blocks()
+        paragraph.append(render_inline(line.rstrip(), jira_base_url))
+
+    close_blocks()
+
+    return html
+
+
+def render_list(list_items) -> str:
+    html = ""
+    open_lists = []
+
+    for markers, text in list_items:
+        markers = list(markers)
+
+        # How many of the currently open lists the item is still in
+        common = 0
+        while (
+            common < len(open_lists)
+            and common < len(markers)
+            and list_tags[open_lists[common]] == list_tags[markers[common]]
+        ):
+            common += 1
+
+        while len(open_lists) > common:
+            html += "</li>\n" + list_tags[open_lists.pop()][1] + "\n"
+
+        if open_lists and len(open_lists) == len(markers):
+            html += "</li>\n"
+
+        while len(open_lists) < len(markers):
+            if open_lists:
+                html += "\n"
+            html += list_tags[markers[len(open_lists)]][0] + "\n"
+            open_lists.append(markers[len(open_lists)])
+
+        html += "\t<li>" + text
+
+    while open_lists:
+        html += "</li>\n" + list_tags[open_lists.pop()][1] + "\n"
+
+    return html.rstrip("\n")
+
+
+def render_table(table_rows, jira_base_url) -> str:
+    html = "<div class='table-wrap'>\n<table class='confluenceTable'><tbody>\n"
+
+    for row in table_rows:
+        html += "<tr>\n"
+        for is_header, cell in split_table_row(row):
+            tag = "th" if is_header else "td"
+            html += (
+                "<"
+                + tag
+                + " class='confluence"
+                + tag.capitalize()
+                + "'>"
+                + render_inline(cell.strip(), jira_base_url)
+                + "</"
+                + tag
+                + ">\n"
+            )
+        html += "</tr>\n"
+
+    return html + "</tbody></table>\n</div>"
+
+
+# Split a table row to its cells, the "|" inside links and monospace text don't split the cell.
+def split_table_row(row) -> list:
+    cells = []
+    current = None
+    is_header = False
+    depth = 0
+    i = 0
+
+    while i < len(row):
+        if row.startswith("{{", i):
+            depth += 1
+            current = (current or "") + "{{"
+            i += 2
+            continue
+        if row.startswith("}}", i) and depth > 0:
+            depth -= 1
+            current = (current or "") + "}}"
+            i += 2
+            continue
+        char = row[i]
+        if char == "[":
+            depth += 1
+        elif char == "]" and depth > 0:
+            depth -= 1
+        elif char == "|" and depth == 0:
+            if current is not None:
+                cells.append((is_header, current))
+            is_header = row.startswith("||", i)
+            current = ""
+            i += 2 if is_header else 1
+            continue
+        current = (current or "") + char
+        i += 1
+
+    # The row ends with a separator, anything after the last one is a cell of its own
+    if current:
+        cells.append((is_header, current))
+
+    return cells
+
+
+def render_inline(text, jira_base_url) -> str:
+    placeholders = []
+
+    def protect(html):
+        placeholders.append(html)
+        return "\x00" + str(len(placeholders) - 1) + "\x00"
+
+    # Line breaks and escaped characters are taken as they are
+    text = text.replace("\\\\", protect("<br/>"))
+    text = regex_escaped_char.sub(lambda m: protect(escape_html(m.group(1))), text)
+
+    text = regex_monospace.sub(
+        lambda m: protect("<tt>" + render_inline(m.group(1), jira_base_url) + "</tt>"),
+        text,
+    )
+    text = regex_link.sub(
+        lambda m: protect(render_link(m.group(1), jira_base_url)), text
+    )
+    text = regex_image.sub(lambda m: protect(render_image(m.group(1))), text)
+    text = regex_url.sub(lambda m: protect(render_external_link(m.group(1))), text)
+    text = regex_color.sub(
+        lambda m: protect(
+            '<font color="'
+            + escape_html(m.group(1))
+            + '">'
+            + render_inline(m.group(2), jira_base_url)
+            + "</font>"
+        ),
+        text,
+    )
+
+    if regex_macro.search(text) or regex_emoticon.search(text):
+        raise UnsupportedMarkup()
+
+    text = escape_html(text)
+
+    # Dashes before the text effects, so they are not taken as deleted text
+    text = re.sub(r"(?<!\S)---(?!\S)", "&#8212;", text)
+    text = re.sub(r"(?<!\S)--(?!\S)", "&#8211;", text)
+
+    for regex_text_effect, tag in regex_text_effects:
+        text = regex_text_effect.sub(
+            lambda m: "<" + tag + ">" + m.group(1) + "</" + tag + ">", text
+        )
+
+    # Restore the protected html, it can hold placeholders of its own
+    while regex_placeholder.search(text):
+        text = regex_placeholder.sub(lambda m: placeholders[int(m.group(1))], text)
+
+    return text
+
+
+def render_link(link, jira_base_url) -> str:
+    # Mentions are shown by the name of the user, which needs the user lookup of jira
+    if link.startswith("~"):
+        raise UnsupportedMarkup()
+
+    text, separator, url = link.rpartition("|")
+    if not separator:
+        text = None
+
+    # Links to issues, anchors and attachments need the context of jira
+    url = url.strip()
+    if not regex_link_url.match(url):
+        raise UnsupportedMarkup()
+
+    return render_external_link(url, text)
+
+
+def render_external_link(url, text=None) -> str:
+    if text is None:
+        text = url[len("mailto:") :] if url.startswith("mailto:") else url
+        text_html = escape_html(text)
+    else:
+        text_html = render_inline(text, "")
+
+    return (
+        '<a href="'
+        + escape_html(url)
+        + '" class="external-link" rel="nofollow">'
+        + text_html
+        + "</a>"
+    )
+
+
+def render_image(image) -> str:
+    # Only external images without params, attachments need the issue in jira
+    if "|" in image or not regex_link_url.match(image):
+        raise UnsupportedMarkup()
+
+    return (
+        '<span class="image-wrap" style=""><img src="'
+        + escape_html(image)
+        + '" style="border: 0px solid black" /></span>'
+    )
+
+
+def get_anchor_name(heading) -> str:
+    return escape_html(re.sub(r"[^\w]", "", heading))
+
+
+def escape_html(text) -> str:
+    return (
+        text.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+    )
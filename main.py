@@ -1,7 +1,6 @@
 import argparse, json, sys, os
 import yaml
 import re
-import itertools
 from jira import JIRA
 from convert_jira_to_spira_program import (
     convert_jira_issues_to_spira_program_capabilities,
@@ -15,7 +14,17 @@ from jira_to_json import (
 )
 
 from spira import Spira
-from convert_jira_to_spira_issues import convert_jira_to_spira_issues
+from convert_jira_to_spira_issues import (
+    iterate_converted_issue_types,
+    tap_artifacts_to_file,
+    get_partitioned_jira_keys,
+    CONVERTED_ISSUE_QUEUE_SIZE,
+    partition_issues,
+    create_issue_conversion_pool,
+    resolve_custom_field_ids,
+    normalize_email,
+    compile_custom_property_prototypes,
+)
 from convert_jira_to_spira_issue_elements import convert_jira_to_spira_issue_elements
 from convert_spira_data_for_spira_updates import convert_spira_data_for_spira_updates
 from convert_jira_to_spira_project_objects import (
@@ -24,6 +33,26 @@ from convert_jira_to_spira_project_objects import (
     convert_jira_to_spira_customlists,
 )
 from to_spira_insert_issue import insert_issue_to_spira
+from artifact_index import get_capability_ids_by_jira_id, load_artifact_index
+from parallel_insert import produce_in_background
+from failure_log import print_failure_statistics
+from attachment_transfer import DEFAULT_TRANSFER_BUDGET, MEGABYTE
+from attachment_store import (
+    DEFAULT_ATTACHMENT_STORE_PATH,
+    DEFAULT_ATTACHMENT_STORE_SIZE_MB,
+    AttachmentStore,
+    prefetch_attachments,
+)
+from to_spira_retry_failed import RETRYING_SUFFIX, retry_failed
+from migration_journal import (
+    ELEMENT_ARTIFACT_TYPES,
+    DOCUMENT_ARTIFACT_TYPES,
+    ISSUE_ARTIFACT_TYPES,
+    PRODUCT_OBJECT_ARTIFACT_TYPES,
+    PROGRAM_ARTIFACT_TYPES,
+    get_product_journal,
+    get_program_journal,
+)
 from to_spira_insert_program_objects import (
     insert_milestones_to_spira,
     insert_capabilities_to_spira,
@@ -42,6 +71,17 @@ from clean_spira import (
 from typing import Any, Dict
 
 from utility import combine_jira_types
+from jira_markup_renderer import (
+    DEFAULT_RENDER_WORKERS,
+    close_jira_markup_renderers,
+    print_render_statistics,
+    pre_render_issue_markup,
+)
+from render_cache import DEFAULT_RENDER_CACHE_PATH, DEFAULT_RENDER_CACHE_SIZE_MB
+from compile_mapping_lookups import (
+    compile_product_mapping_lookups,
+    compile_program_mapping_lookups,
+)
 
 # Load env variables from .env file
 from dotenv import load_dotenv
@@ -104,6 +144,49 @@ def main():
         default=False,
     )
 
+    ## Settings for rendering the jira markup to html
+    add_render_arguments(parser_migrate_issues)
+
+    ## Number of worker processes converting the issues
+    parser_migrate_issues.add_argument(
+        "-w",
+        "--workers",
+        help="Number of worker processes that convert the issues in parallel. Default is 1, which converts the issues in the main process.",
+        type=int,
+        default=1,
+    )
+
+    ## Number of artifacts inserted into spira at the same time
+    parser_migrate_issues.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of artifacts inserted into spira at the same time. Parents are always inserted before their children. Default is 1, which inserts the artifacts one at a time.",
+        type=int,
+        default=1,
+    )
+
+    ## Optional copy of the converted artifacts, for checking what was sent to spira
+    parser_migrate_issues.add_argument(
+        "-so",
+        "--spira-output",
+        help="Also write the converted artifacts to this file while they are inserted, e.g. 'temp/to_spira.json'. Default is off, the artifacts go straight from the conversion to spira.",
+        type=argparse.FileType("w", encoding="UTF-8"),
+        default=None,
+    )
+
+    ## Bool if artifacts already in spira should be left as they are
+    parser_migrate_issues.add_argument(
+        "-se",
+        "--skip-existing",
+        help="Only create the artifacts that are not in spira yet, found by their jira id. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_issues)
+
     # ------------------------------------------------------
     # Full issue migration flow to a program with defaults
     # ------------------------------------------------------
@@ -150,6 +233,31 @@ def main():
         default=False,
     )
 
+    ## Settings for rendering the jira markup to html
+    add_render_arguments(parser_migrate_capabilities)
+
+    ## Bool if artifacts already in spira should be left as they are
+    parser_migrate_capabilities.add_argument(
+        "-se",
+        "--skip-existing",
+        help="Only create the capabilities that are not in spira yet, found by their jira id. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Number of capabilities inserted into spira at the same time
+    parser_migrate_capabilities.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of capabilities inserted into spira at the same time. Capabilities are always inserted after their epic or parent. Default is 1, which inserts the capabilities one at a time.",
+        type=int,
+        default=1,
+    )
+
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_capabilities)
+
     # ------------------------------------------------------
     # Document migration flow with defaults
     # ------------------------------------------------------
@@ -195,6 +303,101 @@ def main():
         default=False,
     )
 
+    ## Number of attachments downloaded from jira at the same time
+    parser_migrate_documents.add_argument(
+        "-dw",
+        "--download-workers",
+        help="Number of attachments downloaded from jira at the same time. Default is 1.",
+        type=int,
+        default=1,
+    )
+
+    ## Number of documents uploaded to spira at the same time
+    parser_migrate_documents.add_argument(
+        "-uw",
+        "--upload-workers",
+        help="Number of documents uploaded to spira at the same time, while the next attachments are downloaded. Default is 1.",
+        type=int,
+        default=1,
+    )
+
+    ## Size of the attachments downloaded and not uploaded yet
+    parser_migrate_documents.add_argument(
+        "-tb",
+        "--transfer-budget",
+        help="Megabytes of attachments downloaded from jira and not uploaded to spira yet, the downloads wait while it's used up. Default is 256.",
+        type=int,
+        default=DEFAULT_TRANSFER_BUDGET // MEGABYTE,
+    )
+
+    ## Upload identical attachments once, and associate the copies with the uploaded document
+    parser_migrate_documents.add_argument(
+        "-dd",
+        "--deduplicate-documents",
+        help="Upload attachments with the same contents once, the copies on other issues are associated with the uploaded document. Default is true.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=True,
+    )
+
+    ## Bool if the attachments should be kept in the attachment store between runs
+    parser_migrate_documents.add_argument(
+        "-as",
+        "--attachment-store",
+        help="Keep the attachments in a store in the temp directory, so an attachment downloaded by an earlier run or by prefetch_attachments is not downloaded from jira again. Default is on.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=True,
+    )
+
+    add_attachment_store_arguments(parser_migrate_documents)
+
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_documents)
+
+    # ------------------------------------------------------
+    # Download the attachments ahead of the document migration
+    # ------------------------------------------------------
+    parser_prefetch_attachments = subparsers.add_parser(
+        "prefetch_attachments",
+        help="Download the attachments of the jira issues to the attachment store ahead of migrate_documents, so the migration only uploads them.",
+    )
+
+    parser_prefetch_attachments.add_argument(
+        "jql",
+        help="The jira jql that the argument will use to query issues from the specified jira instance",
+    )
+
+    ## Output file for outputting json file from jira
+    parser_prefetch_attachments.add_argument(
+        "-jo",
+        "--jira-to-json-output",
+        help="Output file and location for jira extraction to a json file. Default is 'jira_output.json' in the temp directory.",
+        type=argparse.FileType("w", encoding="UTF-8"),
+        default="temp/jira_output.json",
+    )
+
+    ## Bool if it should skip the ssl check when using the REST api routes
+    parser_prefetch_attachments.add_argument(
+        "-nossl",
+        "--skip-ssl-check",
+        help="Skip the ssl check on the jira instance",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Number of attachments downloaded from jira at the same time
+    parser_prefetch_attachments.add_argument(
+        "-dw",
+        "--download-workers",
+        help="Number of attachments downloaded from jira at the same time. Default is 4.",
+        type=int,
+        default=4,
+    )
+
+    add_attachment_store_arguments(parser_prefetch_attachments)
+
     # ------------------------------------------------------
     # Update document migration flow with defaults
     # ------------------------------------------------------
@@ -227,6 +430,9 @@ def main():
         default=False,
     )
 
+    ## Settings of the migration journal
+    add_journal_arguments(parser_add_document_associations)
+
     # ------------------------------------------------------
     # Comment migration flow with defaults
     # ------------------------------------------------------
@@ -272,6 +478,12 @@ def main():
         default=False,
     )
 
+    ## Settings for rendering the jira markup to html
+    add_render_arguments(parser_migrate_comments)
+
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_comments)
+
     # ------------------------------------------------------
     # Association migration flow with defaults
     # ------------------------------------------------------
@@ -317,6 +529,9 @@ def main():
         default=False,
     )
 
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_associations)
+
     # ------------------------------------------------------
     # Releases migration flow with defaults
     # ------------------------------------------------------
@@ -363,6 +578,28 @@ def main():
         default=False,
     )
 
+    ## Bool if artifacts already in spira should be left as they are
+    parser_migrate_releases.add_argument(
+        "-se",
+        "--skip-existing",
+        help="Only create the releases that are not in spira yet, found by their name. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Number of releases inserted into spira at the same time
+    parser_migrate_releases.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of releases inserted into spira at the same time. Parent releases are always inserted before the child releases. Default is 1, which inserts the releases one at a time.",
+        type=int,
+        default=1,
+    )
+
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_releases)
+
     # ------------------------------------------------------
     # Milestones migration flow with defaults
     # ------------------------------------------------------
@@ -423,6 +660,15 @@ def main():
         default=False,
     )
 
+    ## Number of milestones inserted into spira at the same time
+    parser_migrate_milestones.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of milestones inserted into spira at the same time. Default is 1, which inserts the milestones one at a time.",
+        type=int,
+        default=1,
+    )
+
     # ------------------------------------------------------
     # Components migration flow with defaults
     # ------------------------------------------------------
@@ -469,6 +715,28 @@ def main():
         default=False,
     )
 
+    ## Bool if artifacts already in spira should be left as they are
+    parser_migrate_components.add_argument(
+        "-se",
+        "--skip-existing",
+        help="Only create the components that are not in spira yet, found by their name. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Number of components inserted into spira at the same time
+    parser_migrate_components.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of components inserted into spira at the same time. Default is 1, which inserts the components one at a time.",
+        type=int,
+        default=1,
+    )
+
+    ## Settings of the migration journal
+    add_journal_arguments(parser_migrate_components)
+
     # ------------------------------------------------------
     # Custom list migration with defaults
     # ------------------------------------------------------
@@ -520,6 +788,15 @@ def main():
         default=False,
     )
 
+    ## Number of customlists inserted into spira at the same time
+    parser_migrate_customlists.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of customlists inserted into spira at the same time, across all the templates. Default is 1, which inserts the customlists one at a time.",
+        type=int,
+        default=1,
+    )
+
     # ------------------------------------------------------
     # Clean a product from the spira instance automatically.
     # ------------------------------------------------------
@@ -589,6 +866,38 @@ def main():
         default=False,
     )
 
+    # ------------------------------------------------------
+    # Send the failed creates of a failure log again
+    # ------------------------------------------------------
+    parser_retry_failed = subparsers.add_parser(
+        "retry_failed",
+        help="Send the creates that failed in an earlier migration to spira again, from a failure log in the temp directory.",
+    )
+
+    parser_retry_failed.add_argument(
+        "failure_log",
+        help="The failure log with the failed creates, e.g. temp/failures_product_1_{instance hash}.ndjson. The creates that fail again are written back to this file.",
+    )
+
+    ## Number of failed creates sent to spira at the same time
+    parser_retry_failed.add_argument(
+        "-iw",
+        "--insert-workers",
+        help="Number of failed creates sent to spira at the same time. Default is 4.",
+        type=int,
+        default=4,
+    )
+
+    ## Bool if it should skip the ssl check when using the REST api routes
+    parser_retry_failed.add_argument(
+        "-nossl",
+        "--skip-ssl-check",
+        help="Skip the ssl check on both the jira and spira instance",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
     args = parser.parse_args()
 
     jira_connection_dict = {}
@@ -603,6 +912,7 @@ def main():
 
         # Set up some variables
         jira_connection_dict: Dict = get_jira_conn_dict()
+        set_render_settings(jira_connection_dict, args)
         spira_connection_dict = get_spira_conn_dict()
         mapping_dict = get_mapping_dict(args.mapping)
         skip_ssl = args.skip_ssl_check
@@ -626,19 +936,31 @@ def main():
         # Adding the spira_product_id to mapping dict
         mapping_dict["spira_product_id"] = spira_product_id
 
-        # Extract the jira issues to a file
-        print("Extracting the issues from jira...")
-        total_number_of_issues = jira_to_json(jira, args.jira_to_json_output, args.jql)
-
-        args.jira_to_json_output.close()
-
-        # Get all the required data for migration
+        # Get all the required data for migration, the custom field ids are needed to pre-render rich text
         print("Extracting metadata from jira...")
         jira_metadata = construct_jira_metadata(
             jira
         )  # only gets customfields metadata atm
+        resolve_custom_field_ids(mapping_dict["custom_props"], jira_metadata)
         print("Jira metadata extraction complete.")
 
+        # Extract the jira issues to a file
+        print("Extracting the issues from jira...")
+        total_number_of_issues = jira_to_json(
+            jira,
+            args.jira_to_json_output,
+            args.jql,
+            get_pre_render(
+                jira_connection_dict,
+                skip_ssl,
+                args,
+                ["description"]
+                + get_rich_text_field_keys(mapping_dict["custom_props"]),
+            ),
+        )
+
+        args.jira_to_json_output.close()
+
         print("Extracting metadata from spira...")
         spira_metadata = construct_spira_metadata(
             spira, mapping_dict["spira_product_id"]
@@ -648,70 +970,91 @@ def main():
         with open(args.jira_to_json_output.name, "r") as file:
             json_output_dict = json.load(file)
 
-        # Counter for number of processed issues
-        number_of_processed_issues = 0
-
-        # Convert and insert types in order
-        for jira_type in mapping_dict["artifact_type_order"]:
-            print("------------------------------------------------------------")
-            print("Processing issues of jira type: " + jira_type)
-            print("------------------------------------------------------------")
-            print(
-                "Getting all newly added, if available, artifacts from spira to be able to infer data and connections..."
-            )
-            all_requirements_in_spira_project = spira.get_all_requirements(
-                mapping_dict["spira_product_id"]
+        print("Compiling the mapping to lookup tables...")
+        spira_metadata["lookups"] = compile_product_mapping_lookups(
+            mapping_dict, spira_metadata, json_output_dict["issues"]
+        )
+
+        # Group the issues once, so every type below only converts its own issues
+        issue_partitions = partition_issues(json_output_dict["issues"], spira_metadata)
+
+        # Start the worker processes after all the metadata is compiled, it's shipped to them once
+        conversion_pool = None
+        if args.workers > 1:
+            print("Starting " + str(args.workers) + " issue conversion workers...")
+            conversion_pool = create_issue_conversion_pool(
+                args.workers,
+                jira_connection_dict,
+                skip_ssl,
+                mapping_dict,
+                spira_metadata,
+                jira_metadata,
             )
-            all_tasks_in_spira_project = spira.get_all_tasks(
-                mapping_dict["spira_product_id"]
+
+        # Loaded once, the index is kept current from the create responses while inserting.
+        # Issues already in the migration journal are not inserted again.
+        # Skipping the existing artifacts needs all of them, fetched once without a request per artifact
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, ISSUE_ARTIFACT_TYPES, args)
+        artifact_index = load_artifact_index(
+            spira,
+            mapping_dict["spira_product_id"],
+            journal,
+            ISSUE_ARTIFACT_TYPES if args.skip_existing else ["requirement"],
+            args.skip_existing,
+        )
+
+        # The types are converted in order, and the artifacts are inserted while the conversion goes on.
+        # The conversion runs at most a queue of artifacts ahead of the inserts.
+        converted_artifacts = produce_in_background(
+            iterate_converted_issue_types(
+                jira_connection_dict,
+                skip_ssl,
+                issue_partitions,
+                mapping_dict,
+                spira_metadata,
+                jira_metadata,
+                conversion_pool,
+            ),
+            CONVERTED_ISSUE_QUEUE_SIZE,
+        )
+
+        if args.spira_output is not None:
+            converted_artifacts = tap_artifacts_to_file(
+                converted_artifacts, args.spira_output
             )
-            # TODO Add incidents and tasks aswell if needed
 
-            # Check which artifact type and send the correct jira counterpart
-            if jira_type in combine_jira_types(mapping_dict["types"]["requirements"]):
-                convert_jira_to_spira_issues(
-                    jira_connection_dict,
-                    skip_ssl,
-                    json_output_dict,
-                    mapping_dict,
-                    spira_metadata,
-                    jira_metadata,
-                    all_requirements_in_spira_project,
-                    "requirements",
-                    jira_type,
-                )
-            elif jira_type in combine_jira_types(mapping_dict["types"]["incidents"]):
-                convert_jira_to_spira_issues(
-                    jira_connection_dict,
-                    skip_ssl,
-                    json_output_dict,
-                    mapping_dict,
-                    spira_metadata,
-                    jira_metadata,
-                    all_requirements_in_spira_project,
-                    "incidents",
-                    jira_type,
-                )
-            elif jira_type in combine_jira_types(mapping_dict["types"]["tasks"]):
-                convert_jira_to_spira_issues(
-                    jira_connection_dict,
-                    skip_ssl,
-                    json_output_dict,
-                    mapping_dict,
-                    spira_metadata,
-                    jira_metadata,
-                    all_requirements_in_spira_project,
-                    "tasks",
-                    jira_type,
-                )
+        # Parents are inserted before their children, independent artifacts in parallel
+        print(
+            "Inserting the artifacts with "
+            + str(args.insert_workers)
+            + " insert worker(s)..."
+        )
+        number_of_processed_issues = insert_issue_to_spira(
+            spira,
+            spira_metadata,
+            converted_artifacts,
+            artifact_index,
+            args.insert_workers,
+            journal,
+            args.skip_existing,
+            get_partitioned_jira_keys(
+                issue_partitions, spira_metadata, mapping_dict["artifact_type_order"]
+            ),
+        )
+
+        if conversion_pool is not None:
+            conversion_pool.shutdown()
 
-            spira_input = open("temp/to_spira.json", "r")
+        if args.spira_output is not None:
+            args.spira_output.close()
 
-            number_of_processed_issues += insert_issue_to_spira(spira, spira_metadata, spira_input, all_requirements_in_spira_project)  # type: ignore
-            print("Migration of type " + jira_type + " finished.")
+        # Write the last uses of the cached renders to the render cache
+        close_jira_markup_renderers()
 
         print("--------------------------------------")
         print("Migration of issues complete")
+        print_render_statistics()
         print(
             "Migration processed "
             + str(number_of_processed_issues)
@@ -729,6 +1072,7 @@ def main():
 
         # Set up some variables
         jira_connection_dict: Dict = get_jira_conn_dict()
+        set_render_settings(jira_connection_dict, args)
         spira_connection_dict = get_spira_conn_dict()
         mapping_dict = get_mapping_dict(args.mapping)
         skip_ssl = args.skip_ssl_check
@@ -752,19 +1096,31 @@ def main():
         # Adding the spira_program_id to mapping dict
         mapping_dict["spira_program_id"] = spira_program_id
 
-        # Extract the jira issues to a file
-        print("Extracting the issues from jira...")
-        total_number_of_issues = jira_to_json(jira, args.jira_to_json_output, args.jql)
-
-        args.jira_to_json_output.close()
-
-        # Get all the required data for migration
+        # Get all the required data for migration, the custom field ids are needed to pre-render rich text
         print("Extracting metadata from jira...")
         jira_metadata = construct_jira_metadata(
             jira
         )  # only gets customfields metadata atm
+        resolve_custom_field_ids(mapping_dict["custom_props"], jira_metadata)
         print("Jira metadata extraction complete.")
 
+        # Extract the jira issues to a file
+        print("Extracting the issues from jira...")
+        total_number_of_issues = jira_to_json(
+            jira,
+            args.jira_to_json_output,
+            args.jql,
+            get_pre_render(
+                jira_connection_dict,
+                skip_ssl,
+                args,
+                ["description"]
+                + get_rich_text_field_keys(mapping_dict["custom_props"]),
+            ),
+        )
+
+        args.jira_to_json_output.close()
+
         print("Extracting metadata from spira...")
         spira_metadata = construct_program_spira_metadata(
             spira, mapping_dict["spira_program_id"]
@@ -774,6 +1130,21 @@ def main():
         with open(args.jira_to_json_output.name, "r") as file:
             json_output_dict = json.load(file)
 
+        print("Compiling the mapping to lookup tables...")
+        spira_metadata["lookups"] = compile_program_mapping_lookups(
+            mapping_dict, spira_metadata, json_output_dict["issues"]
+        )
+
+        # Capabilities already in the migration journal are not inserted again
+        journal = get_program_journal(spira.base_url, mapping_dict["spira_program_id"])
+        reset_journal(journal, PROGRAM_ARTIFACT_TYPES, args)
+
+        # Fetched once, the capabilities created for a type are added to it for the next types
+        print("Getting all the capabilities from spira to infer connections...")
+        capability_ids = get_capability_ids_by_jira_id(
+            spira.get_all_program_capabilities(mapping_dict["spira_program_id"])
+        )
+
         # Counter for number of processed issues
         number_of_processed_issues = 0
 
@@ -782,13 +1153,6 @@ def main():
             print("------------------------------------------------------------")
             print("Processing issues of jira type: " + jira_type)
             print("------------------------------------------------------------")
-            print(
-                "Getting all newly added, if available, artifacts from spira to be able to infer data and connections..."
-            )
-
-            all_capabilites_in_spira_project = spira.get_all_program_capabilities(
-                mapping_dict["spira_program_id"]
-            )
 
             # Check which artifact type and send the correct jira counterpart
             if jira_type in combine_jira_types(mapping_dict["types"]["capabilities"]):
@@ -804,11 +1168,15 @@ def main():
 
             spira_input = open("temp/capabilities_to_spira.json", "r")
 
-            number_of_processed_issues += insert_capabilities_to_spira(spira, spira_metadata, spira_input, all_capabilites_in_spira_project)  # type: ignore
+            number_of_processed_issues += insert_capabilities_to_spira(spira, spira_metadata, spira_input, capability_ids, journal, args.skip_existing, args.insert_workers)  # type: ignore
             print("Migration of type " + jira_type + " to program finished.")
 
+        # Write the last uses of the cached renders to the render cache
+        close_jira_markup_renderers()
+
         print("--------------------------------------")
         print("Migration of issues to program complete")
+        print_render_statistics()
         print(
             "Migration processed "
             + str(number_of_processed_issues)
@@ -853,23 +1221,11 @@ def main():
 
         args.jira_to_json_output.close()
 
-        print("Getting all current artifacts from spira")
-        all_requirements_in_spira_project = spira.get_all_requirements(
-            mapping_dict["spira_product_id"]
-        )
-        all_tasks_in_spira_project = spira.get_all_tasks(
-            mapping_dict["spira_product_id"]
-        )
-        all_incidents_in_spira_projects = spira.get_all_incidents(
-            mapping_dict["spira_product_id"]
-        )
-
-        all_artifacts_in_spira = list(
-            itertools.chain(
-                all_requirements_in_spira_project,
-                all_tasks_in_spira_project,
-                all_incidents_in_spira_projects,
-            )
+        # The migrated artifacts are resolved from the migration journal, or else fetched from spira
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, ["association"], args)
+        artifact_index = load_artifact_index(
+            spira, mapping_dict["spira_product_id"], journal, ISSUE_ARTIFACT_TYPES
         )
 
         with open(args.jira_to_json_output.name, "r") as file:
@@ -880,14 +1236,16 @@ def main():
             skip_ssl,
             json_output_dict,
             mapping_dict,
-            all_artifacts_in_spira,
+            artifact_index,
             "associations",
             spira,
         )
 
         spira_input = open("temp/to_spira.json", "r")
 
-        update_artifacts(spira, mapping_dict["spira_product_id"], spira_input, jira)
+        update_artifacts(
+            spira, mapping_dict["spira_product_id"], spira_input, jira, journal
+        )
 
         print("--------------------------------------")
         print("Migration of associations between artifacts complete")
@@ -932,23 +1290,11 @@ def main():
         )
         print("Spira metadata extraction complete.")
 
-        print("Getting all current artifacts from spira")
-        all_requirements_in_spira_project = spira.get_all_requirements(
-            mapping_dict["spira_product_id"]
-        )
-        all_tasks_in_spira_project = spira.get_all_tasks(
-            mapping_dict["spira_product_id"]
-        )
-        all_incidents_in_spira_projects = spira.get_all_incidents(
-            mapping_dict["spira_product_id"]
-        )
-
-        all_artifacts_in_spira = list(
-            itertools.chain(
-                all_requirements_in_spira_project,
-                all_tasks_in_spira_project,
-                all_incidents_in_spira_projects,
-            )
+        # The migrated artifacts are resolved from the migration journal, or else fetched from spira
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, DOCUMENT_ARTIFACT_TYPES, args)
+        artifact_index = load_artifact_index(
+            spira, mapping_dict["spira_product_id"], journal, ISSUE_ARTIFACT_TYPES
         )
 
         with open(args.jira_to_json_output.name, "r") as file:
@@ -959,18 +1305,36 @@ def main():
             skip_ssl,
             json_output_dict,
             mapping_dict,
-            all_artifacts_in_spira,
+            artifact_index,
             "documents",
             spira,
             spira_metadata,
         )
 
+        attachment_store = (
+            AttachmentStore(DEFAULT_ATTACHMENT_STORE_PATH, args.attachment_store_size)
+            if args.attachment_store
+            else None
+        )
+
         spira_input = open("temp/to_spira.json", "r")
 
         no_of_documents = update_artifacts(
-            spira, mapping_dict["spira_product_id"], spira_input, jira
+            spira,
+            mapping_dict["spira_product_id"],
+            spira_input,
+            jira,
+            journal,
+            args.download_workers,
+            args.upload_workers,
+            args.transfer_budget * MEGABYTE,
+            args.deduplicate_documents,
+            attachment_store,
         )
 
+        if attachment_store is not None:
+            attachment_store.close()
+
         print("--------------------------------------")
         print("Migration of " + str(no_of_documents) + " documents complete")
         print("--------------------------------------")
@@ -1006,23 +1370,11 @@ def main():
         )
         print("Spira metadata extraction complete.")
 
-        print("Getting all current artifacts from spira")
-        all_requirements_in_spira_project = spira.get_all_requirements(
-            mapping_dict["spira_product_id"]
-        )
-        all_tasks_in_spira_project = spira.get_all_tasks(
-            mapping_dict["spira_product_id"]
-        )
-        all_incidents_in_spira_projects = spira.get_all_incidents(
-            mapping_dict["spira_product_id"]
-        )
-
-        all_artifacts_in_spira = list(
-            itertools.chain(
-                all_requirements_in_spira_project,
-                all_tasks_in_spira_project,
-                all_incidents_in_spira_projects,
-            )
+        # The migrated artifacts are resolved from the migration journal, or else fetched from spira
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, ["document_association"], args)
+        artifact_index = load_artifact_index(
+            spira, mapping_dict["spira_product_id"], journal, ISSUE_ARTIFACT_TYPES
         )
 
         all_documents_in_spira = spira.get_all_documents(
@@ -1031,7 +1383,7 @@ def main():
 
         convert_spira_data_for_spira_updates(
             all_documents_in_spira,
-            all_artifacts_in_spira,
+            artifact_index,
             "add_document_association",
             spira_metadata,
         )
@@ -1039,7 +1391,7 @@ def main():
         spira_input = open("temp/to_spira.json", "r")
 
         no_of_documents = update_artifacts(
-            spira, mapping_dict["spira_product_id"], spira_input, jira
+            spira, mapping_dict["spira_product_id"], spira_input, jira, journal
         )
 
         print("--------------------------------------")
@@ -1049,6 +1401,7 @@ def main():
     elif args.command == "migrate_comments":
         # Set up some variables
         jira_connection_dict: Dict = get_jira_conn_dict()
+        set_render_settings(jira_connection_dict, args)
         spira_connection_dict = get_spira_conn_dict()
         mapping_dict = get_mapping_dict(args.mapping)
         skip_ssl = args.skip_ssl_check
@@ -1074,7 +1427,12 @@ def main():
 
         # Extract the jira issues to a file
         print("Extracting the issues from jira...")
-        jira_to_json(jira, args.jira_to_json_output, args.jql)
+        jira_to_json(
+            jira,
+            args.jira_to_json_output,
+            args.jql,
+            get_pre_render(jira_connection_dict, skip_ssl, args, ["comments"]),
+        )
 
         args.jira_to_json_output.close()
 
@@ -1084,23 +1442,11 @@ def main():
         )
         print("Spira metadata extraction complete.")
 
-        print("Getting all artifacts from spira")
-        all_requirements_in_spira_project = spira.get_all_requirements(
-            mapping_dict["spira_product_id"]
-        )
-        all_tasks_in_spira_project = spira.get_all_tasks(
-            mapping_dict["spira_product_id"]
-        )
-        all_incidents_in_spira_projects = spira.get_all_incidents(
-            mapping_dict["spira_product_id"]
-        )
-
-        all_artifacts_in_spira = list(
-            itertools.chain(
-                all_requirements_in_spira_project,
-                all_tasks_in_spira_project,
-                all_incidents_in_spira_projects,
-            )
+        # The migrated artifacts are resolved from the migration journal, or else fetched from spira
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, ["comment"], args)
+        artifact_index = load_artifact_index(
+            spira, mapping_dict["spira_product_id"], journal, ISSUE_ARTIFACT_TYPES
         )
 
         with open(args.jira_to_json_output.name, "r") as file:
@@ -1111,7 +1457,7 @@ def main():
             skip_ssl,
             json_output_dict,
             mapping_dict,
-            all_artifacts_in_spira,
+            artifact_index,
             "comments",
             spira,
             spira_metadata,  # type: ignore
@@ -1120,11 +1466,15 @@ def main():
         spira_input = open("temp/to_spira.json", "r")
 
         no_of_comments = update_artifacts(
-            spira, mapping_dict["spira_product_id"], spira_input, jira
+            spira, mapping_dict["spira_product_id"], spira_input, jira, journal
         )
 
+        # Write the last uses of the cached renders to the render cache
+        close_jira_markup_renderers()
+
         print("--------------------------------------")
         print("Migration of " + str(no_of_comments) + " comments to artifacts complete")
+        print_render_statistics()
         print("--------------------------------------")
 
     elif args.command == "migrate_releases":
@@ -1195,10 +1545,20 @@ def main():
 
         convert_jira_to_spira_releases(json_version_output_dict, mapping_dict)
 
+        # Releases and components already in the migration journal are not inserted again
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, ["release"], args)
+
         spira_input = open("temp/releases_to_spira.json", "r")
 
         number_of_processed_releases += insert_releases_to_spira(
-            spira, spira_metadata, spira_input, spira_release_dict
+            spira,
+            spira_metadata,
+            spira_input,
+            spira_release_dict,
+            journal,
+            args.skip_existing,
+            args.insert_workers,
         )
 
         print("--------------------------------------")
@@ -1274,7 +1634,7 @@ def main():
         spira_input = open("temp/milestones_to_spira.json", "r")
 
         number_of_processed_milestones += insert_milestones_to_spira(
-            spira, spira_metadata, spira_input
+            spira, spira_metadata, spira_input, args.insert_workers
         )
 
         print("--------------------------------------")
@@ -1336,10 +1696,19 @@ def main():
 
         convert_jira_to_spira_components(json_component_output_dict)
 
+        # Releases and components already in the migration journal are not inserted again
+        journal = get_product_journal(spira.base_url, mapping_dict["spira_product_id"])
+        reset_journal(journal, ["component"], args)
+
         spira_input = open("temp/components_to_spira.json", "r")
 
         number_of_processed_components += insert_components_to_spira(
-            spira, spira_metadata, spira_input
+            spira,
+            spira_metadata,
+            spira_input,
+            journal,
+            args.skip_existing,
+            args.insert_workers,
         )
 
         print("--------------------------------------")
@@ -1409,7 +1778,11 @@ def main():
         spira_input = open("temp/customlists_to_spira.json", "r")
 
         number_of_processed_lists += insert_lists_to_spira(
-            spira, spira_input, system_level, mapping_dict["spira_template_ids"]
+            spira,
+            spira_input,
+            system_level,
+            mapping_dict["spira_template_ids"],
+            args.insert_workers,
         )
 
         print("--------------------------------------")
@@ -1435,6 +1808,14 @@ def main():
 
         clean_spira_product(spira, spira_product_id)
 
+        # The removed artifacts have to be migrated again
+        get_product_journal(spira.base_url, spira_product_id).clear(
+            ISSUE_ARTIFACT_TYPES
+            + ELEMENT_ARTIFACT_TYPES
+            + ["document_association"]
+            + PRODUCT_OBJECT_ARTIFACT_TYPES
+        )
+
         print("Clean complete")
 
     elif args.command == "clean_program":
@@ -1455,6 +1836,11 @@ def main():
 
         clean_spira_program(spira, spira_program_id)
 
+        # The removed capabilities have to be migrated again
+        get_program_journal(spira.base_url, spira_program_id).clear(
+            PROGRAM_ARTIFACT_TYPES
+        )
+
         print("Clean complete")
 
     elif args.command == "clean_product_documents":
@@ -1474,13 +1860,199 @@ def main():
 
         clean_spira_product_documents(spira, spira_product_id)
 
+        # The removed documents have to be migrated again
+        get_product_journal(spira.base_url, spira_product_id).clear(
+            DOCUMENT_ARTIFACT_TYPES
+        )
+
         print("Cleaning of documents complete")
 
+    elif args.command == "prefetch_attachments":
+        jira_connection_dict: Dict = get_jira_conn_dict()
+        skip_ssl = args.skip_ssl_check
+
+        if skip_ssl:
+            print("HTTPS/SSL certificate verification is turned off, beware!")
+
+        jira = get_jira_instance(jira_connection_dict, skip_ssl)
+
+        # Extract the jira issues to a file
+        print("Extracting the issues from jira...")
+        jira_to_json(jira, args.jira_to_json_output, args.jql)
+
+        args.jira_to_json_output.close()
+
+        with open(args.jira_to_json_output.name, "r") as file:
+            json_output_dict = json.load(file)
+
+        attachment_store = AttachmentStore(
+            DEFAULT_ATTACHMENT_STORE_PATH, args.attachment_store_size
+        )
+        number_of_prefetched = prefetch_attachments(
+            jira,
+            json_output_dict["issues"],
+            attachment_store,
+            args.download_workers,
+        )
+        attachment_store.close()
+
+        print("--------------------------------------")
+        print("Prefetch of " + str(number_of_prefetched) + " attachments complete")
+        print("--------------------------------------")
+
+    elif args.command == "retry_failed":
+        skip_ssl = args.skip_ssl_check
+
+        if skip_ssl:
+            print("HTTPS/SSL certificate verification is turned off, beware!")
+
+        spira = get_spira_instance(get_spira_conn_dict(), skip_ssl)
+
+        # An interrupted retry leaves its failures in a .retrying file, they are retried too
+        if not os.path.isfile(args.failure_log) and not os.path.isfile(
+            args.failure_log + RETRYING_SUFFIX
+        ):
+            print("Could not find the failure log " + args.failure_log + ", exiting.")
+            sys.exit(EXIT_FAILURE)
+
+        # Jira is only needed to download the failed documents again
+        number_of_retried = retry_failed(
+            spira,
+            args.failure_log,
+            lambda: get_jira_instance(get_jira_conn_dict(), skip_ssl),
+            args.insert_workers,
+        )
+
+        print("--------------------------------------")
+        print("Retry of " + str(number_of_retried) + " failed creates complete")
+        print("--------------------------------------")
+
     else:
         print(
             "Command not recognized, please try again with a registered command, see -h for more info"
         )
 
+    print_failure_statistics()
+
+
+# Arguments shared by the commands that render jira markup to html.
+def add_render_arguments(parser):
+    ## Number of jira markup renders running at the same time
+    parser.add_argument(
+        "-rw",
+        "--render-workers",
+        help="Number of jira markup renders sent to jira at the same time. Default is 8.",
+        type=int,
+        default=DEFAULT_RENDER_WORKERS,
+    )
+
+    ## Bool if the rendered markup should be kept in the render cache between runs
+    parser.add_argument(
+        "-rc",
+        "--render-cache",
+        help="Keep the rendered jira markup in a cache in the temp directory, so the same markup is only rendered by jira once. Default is on.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=True,
+    )
+
+    ## Bool if the jira markup should be rendered locally when possible
+    parser.add_argument(
+        "-lr",
+        "--local-render",
+        help="Render the jira markup locally, only markup the local renderer does not support is sent to jira. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Bool if the markup should be rendered while the issues are extracted
+    parser.add_argument(
+        "-pr",
+        "--pre-render",
+        help="Render the jira markup of the issues while they are extracted from jira, and store the html next to the issues in the extracted json. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+    ## Size limit of the render cache
+    parser.add_argument(
+        "-rcs",
+        "--render-cache-size",
+        help="Size limit of the render cache in MB, the least recently used renders are removed when it's exceeded. Default is 512.",
+        type=int,
+        default=DEFAULT_RENDER_CACHE_SIZE_MB,
+    )
+
+
+# Arguments shared by the commands that use the attachment store.
+def add_attachment_store_arguments(parser):
+    ## Size limit of the attachment store
+    parser.add_argument(
+        "-ass",
+        "--attachment-store-size",
+        help="Size limit of the attachment store in MB, the least recently used attachments are removed when it's exceeded. Default is 4096.",
+        type=int,
+        default=DEFAULT_ATTACHMENT_STORE_SIZE_MB,
+    )
+
+
+# Arguments shared by the commands that record what they create in the migration journal.
+def add_journal_arguments(parser):
+    ## Bool if the journal records of what the command creates should be forgotten before the run
+    parser.add_argument(
+        "-rj",
+        "--reset-journal",
+        help="Forget what the migration journal recorded for the artifacts this command creates, so they are checked against spira and created again. Use it when the artifacts were removed from spira without the clean commands. Default is off.",
+        action=argparse.BooleanOptionalAction,
+        type=bool,
+        default=False,
+    )
+
+
+# Forget the journal records of the artifact types when the command is run with --reset-journal.
+def reset_journal(journal, artifact_types, args):
+    if args.reset_journal:
+        print(
+            "Resetting the migration journal for the artifact types: "
+            + ", ".join(artifact_types)
+        )
+        journal.clear(artifact_types)
+
+
+# Add the render settings from the arguments to the jira connection dict, used by the markup renderer.
+def set_render_settings(jira_connection_dict, args):
+    jira_connection_dict["render_workers"] = args.render_workers
+    jira_connection_dict["render_cache_path"] = (
+        DEFAULT_RENDER_CACHE_PATH if args.render_cache else None
+    )
+    jira_connection_dict["render_cache_size"] = args.render_cache_size
+    jira_connection_dict["render_locally"] = args.local_render
+
+
+# The pre-render stage of the issue extraction, if turned on, renders the markup of the field keys.
+def get_pre_render(jira_connection_dict, skip_ssl, args, field_keys):
+    if not args.pre_render:
+        return None
+
+    return lambda issues: pre_render_issue_markup(
+        jira_connection_dict, skip_ssl, issues, field_keys
+    )
+
+
+# The jira keys and custom field ids of all the fields mapped to rich text custom properties.
+def get_rich_text_field_keys(custom_props_mapping) -> list:
+    field_keys = []
+    for props in custom_props_mapping.values():
+        for prop in props or []:
+            if prop["type"] != "rich_text":
+                continue
+            field_key = prop.get("jira_key") or prop.get("jira_custom_field_id")
+            if field_key is not None and field_key not in field_keys:
+                field_keys.append(field_key)
+    return field_keys
+
 
 def get_jira_conn_dict() -> Dict:
     if (
@@ -1564,7 +2136,7 @@ def get_spira_instance(spira_conn_dict, skip_ssl) -> Spira:
 
 
 def construct_jira_metadata(jira) -> Dict:
-    jira_metadata = {"customfields": []}
+    jira_metadata = {"customfields": [], "customfield_ids": {}}
 
     fields = jira.fields()
 
@@ -1574,6 +2146,10 @@ def construct_jira_metadata(jira) -> Dict:
     for customfield in customfields:
         jira_metadata["customfields"].append(customfield)
 
+        # Index the customfields by name, the first field found wins if jira has several fields with the same name
+        if customfield["name"] not in jira_metadata["customfield_ids"]:
+            jira_metadata["customfield_ids"][customfield["name"]] = customfield["id"]
+
     return jira_metadata
 
 
@@ -1616,7 +2192,10 @@ def construct_spira_metadata(spira: Spira, project_id: int) -> Dict:
 
     # Get the users on the instance
 
-    spira_metadata["users"] = spira.get_all_users()
+    spira_metadata["users"] = get_all_spira_users(spira)
+    spira_metadata["users_by_email"] = index_spira_users_by_email(
+        spira_metadata["users"]
+    )
 
     # Get all types
 
@@ -1706,6 +2285,11 @@ def construct_spira_metadata(spira: Spira, project_id: int) -> Dict:
     # Get document folders
     spira_metadata["document_folders"] = spira.get_all_document_folders(project_id)
 
+    # Compile the custom properties to prototypes used when building artifacts
+    spira_metadata["custom_property_prototypes"] = compile_custom_property_prototypes(
+        spira_metadata
+    )
+
     return spira_metadata
 
 
@@ -1728,7 +2312,10 @@ def construct_program_spira_metadata(spira: Spira, program_id: int) -> Dict:
     spira_metadata["custom_properties"] = {"capability": capability_custom_properties}
 
     # Get the users on the instance
-    spira_metadata["users"] = spira.get_all_users()
+    spira_metadata["users"] = get_all_spira_users(spira)
+    spira_metadata["users_by_email"] = index_spira_users_by_email(
+        spira_metadata["users"]
+    )
 
     # Get all program types
     spira_metadata["types"] = {}
@@ -1763,9 +2350,51 @@ def construct_program_spira_metadata(spira: Spira, program_id: int) -> Dict:
     # Get all program milestones
     spira_metadata["milestones"] = spira.get_all_program_milestones(program_id)
 
+    # Compile the custom properties to prototypes used when building artifacts
+    spira_metadata["custom_property_prototypes"] = compile_custom_property_prototypes(
+        spira_metadata
+    )
+
     return spira_metadata
 
 
+# Page through all the users on the instance, a single call only returns as many users as the page size.
+def get_all_spira_users(spira: Spira, page_size=5000) -> list:
+    users = []
+    seen_user_ids = set()
+    start_row = 1
+
+    while True:
+        page = spira.get_all_users(start_row=start_row, number_rows=page_size)
+
+        # Stop if the page is empty or if spira starts returning users that were already fetched
+        if not page or page[0]["UserId"] in seen_user_ids:
+            break
+
+        for user in page:
+            seen_user_ids.add(user["UserId"])
+        users += page
+
+        if len(page) < page_size:
+            break
+
+        start_row += page_size
+
+    return users
+
+
+# Index the spira users on their case normalized email address, the first user found wins on duplicates.
+def index_spira_users_by_email(users) -> Dict:
+    users_by_email = {}
+
+    for user in users:
+        email = normalize_email(user["EmailAddress"])
+        if email and email not in users_by_email:
+            users_by_email[email] = user
+
+    return users_by_email
+
+
 def get_spira_product_id_from_identifier(spira_product_identifier: str, spira) -> int:
     # If string is actually an int and therefore the spira product_id
     try:
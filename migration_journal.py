@@ -0,0 +1,211 @@
+# Migration journal
+# Local record of everything the migration created in spira, one SQLite file per spira product and program.
+# Every successful create is recorded with its jira key, artifact type, spira id, payload hash and time,
+# so later stages can resolve the spira ids without fetching the artifacts, and a migration that
+# stopped halfway can be run again without creating the same artifacts twice.
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+MIGRATION_JOURNAL_DIRECTORY = "temp"
+
+# Artifact types recorded in the journal of a product
+ISSUE_ARTIFACT_TYPES = ["requirement", "task", "incident"]
+ELEMENT_ARTIFACT_TYPES = ["association", "comment"]
+DOCUMENT_ARTIFACT_TYPES = ["document", "document_hash", "document_association"]
+PRODUCT_OBJECT_ARTIFACT_TYPES = ["release", "component"]
+
+# Artifact types recorded in the journal of a program
+PROGRAM_ARTIFACT_TYPES = ["capability"]
+
+
+class MigrationJournal:
+
+    def __init__(self, path, name=None):
+        self.path = path
+        self.name = name
+        self.lock = threading.Lock()
+
+        # The inserts run on several threads
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS migrated ("
+            "jira_key TEXT NOT NULL, artifact_type TEXT NOT NULL, "
+            "spira_id INTEGER, payload_hash TEXT, migrated_at REAL NOT NULL, "
+            "PRIMARY KEY (jira_key, artifact_type))"
+        )
+        # The last time the artifacts in spira were checked against the journal, per artifact type
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS spira_checks ("
+            "artifact_type TEXT PRIMARY KEY, outside_journal INTEGER NOT NULL, "
+            "checked_at REAL NOT NULL)"
+        )
+        self.connection.commit()
+
+    # Record a successful create, the first record of a jira key and artifact type is kept.
+    def record(self, jira_key, artifact_type, spira_id, payload=None):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR IGNORE INTO migrated "
+                "(jira_key, artifact_type, spira_id, payload_hash, migrated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (
+                    str(jira_key),
+                    artifact_type,
+                    spira_id,
+                    get_payload_hash(payload),
+                    time.time(),
+                ),
+            )
+            self.connection.commit()
+
+    # Returns the spira id recorded for the jira key, or None if it's not migrated.
+    def get_spira_id(self, jira_key, artifact_type):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT spira_id FROM migrated WHERE jira_key = ? AND artifact_type = ?",
+                (str(jira_key), artifact_type),
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def is_migrated(self, jira_key, artifact_type) -> bool:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT 1 FROM migrated WHERE jira_key = ? AND artifact_type = ?",
+                (str(jira_key), artifact_type),
+            ).fetchone()
+
+        return row is not None
+
+    # Returns (jira_key, artifact_type, spira_id) of all the records of the artifact types.
+    def get_entries(self, artifact_types) -> list:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT jira_key, artifact_type, spira_id FROM migrated "
+                "WHERE artifact_type IN (" + ", ".join("?" * len(artifact_types)) + ") "
+                "ORDER BY migrated_at",
+                artifact_types,
+            ).fetchall()
+
+    # Record how many artifacts with a jira id were found in spira without being in the journal.
+    def record_spira_check(self, artifact_type, outside_journal):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO spira_checks "
+                "(artifact_type, outside_journal, checked_at) VALUES (?, ?, ?)",
+                (artifact_type, outside_journal, time.time()),
+            )
+            self.connection.commit()
+
+    # Returns (outside_journal, checked_at) of the last check of the artifact type, or None if it was never checked.
+    def get_spira_check(self, artifact_type):
+        with self.lock:
+            return self.connection.execute(
+                "SELECT outside_journal, checked_at FROM spira_checks WHERE artifact_type = ?",
+                (artifact_type,),
+            ).fetchone()
+
+    # Forget the records of the artifact types, used when the artifacts are removed from spira.
+    # The artifact types are checked against spira again on the next load.
+    def clear(self, artifact_types):
+        with self.lock:
+            for table in ["migrated", "spira_checks"]:
+                self.connection.execute(
+                    "DELETE FROM "
+                    + table
+                    + " WHERE artifact_type IN ("
+                    + ", ".join("?" * len(artifact_types))
+                    + ")",
+                    artifact_types,
+                )
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def get_product_journal(spira_base_url, spira_product_id) -> MigrationJournal:
+    return get_instance_journal(spira_base_url, "product_" + str(spira_product_id))
+
+
+def get_program_journal(spira_base_url, spira_program_id) -> MigrationJournal:
+    return get_instance_journal(spira_base_url, "program_" + str(spira_program_id))
+
+
+# The journals are kept per spira instance, so a journal of a rehearsal on another instance with the same
+# product ids doesn't skip the artifacts of this one.
+def get_instance_journal(spira_base_url, name) -> MigrationJournal:
+    instance_name = name + "_" + get_spira_instance_hash(spira_base_url)
+
+    # Journals of older versions of the tool are not tied to an instance, they are left alone
+    unbound_path = get_migration_journal_path(name)
+    if os.path.exists(unbound_path) and not os.path.exists(
+        get_migration_journal_path(instance_name)
+    ):
+        print(
+            "The migration journal "
+            + unbound_path
+            + " is not tied to a spira instance and is not used. Rename it to "
+            + get_migration_journal_path(instance_name)
+            + " if it belongs to "
+            + spira_base_url
+        )
+
+    return get_migration_journal(instance_name)
+
+
+def get_spira_instance_hash(spira_base_url) -> str:
+    return hashlib.sha256(
+        spira_base_url.strip().rstrip("/").lower().encode("UTF-8")
+    ).hexdigest()[:12]
+
+
+def get_migration_journal(name) -> MigrationJournal:
+    return MigrationJournal(get_migration_journal_path(name), name)
+
+
+def get_migration_journal_path(name) -> str:
+    return os.path.join(
+        MIGRATION_JOURNAL_DIRECTORY, "migration_journal_" + name + ".sqlite"
+    )
+
+
+# Objects migrated by an earlier run are skipped, so a stopped migration can be run again without duplicates.
+def skip_journaled(journal: MigrationJournal | None, jira_key, artifact_type) -> bool:
+    if journal is None or jira_key is None:
+        return False
+
+    if not journal.is_migrated(jira_key, artifact_type):
+        return False
+
+    print(
+        "Jira "
+        + artifact_type.replace("_", " ")
+        + " "
+        + str(jira_key)
+        + " is already migrated according to the migration journal, skipping."
+    )
+    return True
+
+
+def record_migrated(
+    journal: MigrationJournal | None, jira_key, artifact_type, spira_id, payload=None
+):
+    if journal is not None and jira_key is not None:
+        journal.record(jira_key, artifact_type, spira_id, payload)
+
+
+def get_payload_hash(payload) -> str | None:
+    if payload is None:
+        return None
+
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
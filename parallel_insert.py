@@ -0,0 +1,200 @@
+# Parallel insert
+# Runs inserts with bounded concurrency, in the order of the dependencies between them.
+# An item is started as soon as all the items it depends on in the same run have finished,
+# so independent items and subtrees are inserted at the same time.
+# The items can be streamed in while the first ones are inserted, e.g. straight from the conversion.
+import queue
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+# Run insert_item for all the items, returns the results in the order the items came in.
+# The dependency keys of an item that are not the key of another item in the run are ignored,
+# as they are either already in spira or not migrated. When the items are streamed, keys are the
+# keys of all the items that will come, so items can wait for an item that is not converted yet.
+# Items on a dependency cycle are run in the order of the items, once nothing else can run.
+def run_in_dependency_order(
+    items, get_key, get_dependency_keys, insert_item, workers=1, keys=None
+) -> list:
+    if keys is None:
+        items = list(items)
+        keys = [get_key(item) for item in items]
+
+    dependency_ordered_run = DependencyOrderedRun(
+        get_key, get_dependency_keys, insert_item, workers, keys
+    )
+    return dependency_ordered_run.run(items)
+
+
+# Run insert_item for items that don't depend on each other, returns the results in the order of the items.
+def run_concurrently(items, insert_item, workers=1) -> list:
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return list(executor.map(insert_item, items))
+
+
+# Only the key and the result of an item are kept once it's finished, the item itself and the state
+# of waiting for its dependencies are dropped, so streamed items don't pile up in memory.
+# The waiting items are not bounded: an item that comes in before an item it depends on is held until that
+# item is finished, or until the end of the items if it never comes. Stream the parents before their children,
+# e.g. the parent types first in the artifact type order, so the children don't wait in memory.
+class DependencyOrderedRun:
+    def __init__(self, get_key, get_dependency_keys, insert_item, workers, keys):
+        self.get_key = get_key
+        self.get_dependency_keys = get_dependency_keys
+        self.insert_item = insert_item
+        self.workers = workers
+        self.keys = set(keys) - {None}
+
+        # The items by their index, until they are finished
+        self.items = {}
+        self.results = []
+        self.unstarted = set()
+
+        # For every waiting item, the keys it still waits for, and for every key the items waiting for it
+        self.waiting_for = {}
+        self.dependents = {}
+        self.finished_keys = set()
+        self.received_keys = set()
+
+        self.ready = deque()
+        self.running = {}
+
+    def run(self, items) -> list:
+        items_iterator = iter(items)
+        exhausted = False
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while True:
+                while len(self.running) < self.workers:
+                    if self.ready:
+                        index = self.ready.popleft()
+                        self.unstarted.discard(index)
+                        future = executor.submit(self.insert_item, self.items[index])
+                        self.running[future] = index
+                        continue
+
+                    if exhausted:
+                        break
+
+                    # Release what finished meanwhile before waiting for the next item
+                    if self.running:
+                        done, _ = wait(self.running, timeout=0)
+                        self.finish(done)
+                        if self.ready:
+                            continue
+
+                    try:
+                        self.receive(next(items_iterator))
+                    except StopIteration:
+                        exhausted = True
+                        self.release_missing_keys()
+
+                if not self.running:
+                    if not self.ready and not self.unstarted:
+                        break
+
+                    # Nothing can run, the remaining items wait for each other
+                    if not self.ready:
+                        self.break_cycle()
+                    continue
+
+                done, _ = wait(self.running, return_when=FIRST_COMPLETED)
+                self.finish(done)
+
+        return self.results
+
+    def receive(self, item):
+        index = len(self.results)
+        key = self.get_key(item)
+
+        self.items[index] = item
+        self.results.append(None)
+        self.unstarted.add(index)
+        self.received_keys.add(key)
+
+        dependency_keys = (
+            set(self.get_dependency_keys(item)) & self.keys
+        ) - self.finished_keys
+        dependency_keys.discard(key)
+
+        if not dependency_keys:
+            self.ready.append(index)
+            return
+
+        self.waiting_for[index] = dependency_keys
+        for dependency_key in dependency_keys:
+            self.dependents.setdefault(dependency_key, []).append(index)
+
+    def finish(self, done):
+        for future in done:
+            index = self.running.pop(future)
+            key = self.get_key(self.items.pop(index))
+
+            try:
+                self.results[index] = future.result()
+            except Exception as e:
+                print(e)
+                print(
+                    "An error occured when inserting the item with jira key: "
+                    + str(key)
+                )
+
+            # Release the items that waited for this one, failed or not
+            self.release_key(key)
+
+    def release_key(self, key):
+        self.finished_keys.add(key)
+
+        for dependent in self.dependents.pop(key, []):
+            waiting_for = self.waiting_for[dependent]
+            waiting_for.discard(key)
+            if not waiting_for:
+                del self.waiting_for[dependent]
+                self.ready.append(dependent)
+
+    # Keys that never came in, e.g. issues that failed to convert, are not waited for.
+    def release_missing_keys(self):
+        for key in list(self.dependents):
+            if key not in self.received_keys:
+                self.release_key(key)
+
+    def break_cycle(self):
+        index = min(self.unstarted)
+        print(
+            "Dependency cycle found for jira key: "
+            + str(self.get_key(self.items[index]))
+            + ", it's inserted without waiting for its dependencies"
+        )
+
+        for key in self.waiting_for.pop(index):
+            self.dependents[key].remove(index)
+        self.ready.append(index)
+
+
+# Run the producing iterable on a background thread, and yield its items through a bounded queue.
+# The producer is ahead by at most queue_size items, so the items are never all in memory at once.
+def produce_in_background(iterable, queue_size):
+    items = queue.Queue(maxsize=queue_size)
+    end_of_items = object()
+
+    def produce():
+        try:
+            for item in iterable:
+                items.put((item, None))
+        except Exception as e:
+            items.put((end_of_items, e))
+        else:
+            items.put((end_of_items, None))
+
+    threading.Thread(target=produce, daemon=True).start()
+
+    while True:
+        item, error = items.get()
+
+        if item is end_of_items:
+            if error is not None:
+                raise error
+            return
+
+        yield item
@@ -0,0 +1,127 @@
+# Render cache
+# Persistent cache of the jira markup rendered to html, shared between runs and commands.
+# The entries are keyed by a hash of the jira base url, the renderer type and the markup.
+# When the cache grows over its size limit the least recently used entries are evicted.
+import hashlib
+import sqlite3
+import threading
+import time
+
+# Default location and size limit of the render cache
+DEFAULT_RENDER_CACHE_PATH = "temp/render_cache.sqlite"
+DEFAULT_RENDER_CACHE_SIZE_MB = 512
+
+# Evict down to this part of the size limit, so eviction doesn't run on every insert
+RENDER_CACHE_EVICTION_TARGET = 0.9
+
+# The last use of the hits is written in batches of this many renders, or after this many seconds
+RENDER_CACHE_TOUCH_BATCH_SIZE = 1000
+RENDER_CACHE_TOUCH_INTERVAL = 30
+
+
+class RenderCache:
+    def __init__(self, path, max_size_mb=DEFAULT_RENDER_CACHE_SIZE_MB):
+        self.max_size = max_size_mb * 1024 * 1024
+        self.lock = threading.Lock()
+
+        # The renders run on several threads, and several processes can share the file
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS renders ("
+            "key TEXT PRIMARY KEY, html TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS renders_last_used ON renders (last_used)"
+        )
+        self.connection.commit()
+
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM renders"
+        ).fetchone()[0]
+
+        # The last use of the hits not written yet, so a hit is a read without a commit
+        self.touched = {}
+        self.touched_at = time.monotonic()
+
+    def get(self, key) -> str | None:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT html FROM renders WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            self.touched[key] = time.time()
+            if (
+                len(self.touched) >= RENDER_CACHE_TOUCH_BATCH_SIZE
+                or time.monotonic() - self.touched_at >= RENDER_CACHE_TOUCH_INTERVAL
+            ):
+                self.write_touched()
+                self.connection.commit()
+
+            return row[0]
+
+    def put(self, key, html):
+        size = len(html.encode("utf-8"))
+
+        with self.lock:
+            previous = self.connection.execute(
+                "SELECT size FROM renders WHERE key = ?", (key,)
+            ).fetchone()
+
+            self.connection.execute(
+                "INSERT OR REPLACE INTO renders (key, html, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, html, size, time.time()),
+            )
+            self.size += size - (previous[0] if previous else 0)
+
+            if self.size > self.max_size:
+                # The recent hits are written first, so they are not evicted as unused
+                self.write_touched()
+                self.evict()
+
+            self.connection.commit()
+
+    def write_touched(self):
+        self.connection.executemany(
+            "UPDATE renders SET last_used = ? WHERE key = ?",
+            [(last_used, key) for key, last_used in self.touched.items()],
+        )
+        self.touched.clear()
+        self.touched_at = time.monotonic()
+
+    # Remove the least recently used entries until the cache is under the eviction target.
+    def evict(self):
+        target_size = self.max_size * RENDER_CACHE_EVICTION_TARGET
+
+        # Other processes might have added entries, start from the real size
+        self.size = self.connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM renders"
+        ).fetchone()[0]
+
+        evicted_keys = []
+        for key, size in self.connection.execute(
+            "SELECT key, size FROM renders ORDER BY last_used"
+        ):
+            if self.size <= target_size:
+                break
+            evicted_keys.append((key,))
+            self.size -= size
+
+        self.connection.executemany("DELETE FROM renders WHERE key = ?", evicted_keys)
+
+    def close(self):
+        with self.lock:
+            self.write_touched()
+            self.connection.commit()
+            self.connection.close()
+
+
+def get_render_cache_key(jira_base_url, renderer_type, jira_markup) -> str:
+    return hashlib.sha256(
+        "\0".join([jira_base_url, renderer_type, jira_markup]).encode("utf-8")
+    ).hexdigest()
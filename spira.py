@@ -4,11 +4,33 @@ import json
 from urllib.parse import urlparse
 import urllib.parse
 from typing import Dict
+from attachment_transfer import Base64JsonBody
 
 # Disable the warnings when https verify is off, instead only warn once in console on higher level
 requests.packages.urllib3.disable_warnings(category=InsecureRequestWarning)  # type: ignore
 
 
+# Raised when spira responds to a create with an error, keeps the http status code for the failure log.
+class SpiraError(Exception):
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# The created object of a successful response, an error response is raised as a SpiraError.
+def get_created_json(response):
+    if not response.ok:
+        raise SpiraError(
+            "Spira responded with status code "
+            + str(response.status_code)
+            + ": "
+            + response.text[:500],
+            response.status_code,
+        )
+
+    return response.json()
+
+
 class Spira:
     def __init__(self, base_url, basic_auth, verify=True):
         if base_url[-1] == "/":
@@ -94,7 +116,7 @@ class Spira:
             "POST", new_task_url, headers=self.headers, data=payload, verify=self.verify
         )
 
-        return response.json()
+        return get_created_json(response)
 
     def get_requirement_types(self, project_template_id) -> Dict:
         get_requirement_types_url = (
@@ -125,7 +147,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a new requirement
     def create_child_requirement(self, project_id, parentid, body) -> Dict:
@@ -146,7 +168,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Get all requirements
     def get_all_requirements(self, project_id, starting_row=1, number_of_rows=100000):
@@ -194,7 +216,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a new release
     def create_release(self, project_id, body) -> Dict:
@@ -209,7 +231,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a new child release
     def create_child_release(self, project_id, parent_id, body) -> Dict:
@@ -230,7 +252,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a new component
     def create_component(self, project_id, body) -> Dict:
@@ -247,7 +269,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a new customlist at project template level
     def create_project_template_customlist(self, project_template_id, body) -> Dict:
@@ -267,7 +289,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a new customlist at system level
     def create_system_customlist(self, body) -> Dict:
@@ -282,7 +304,7 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     # Create a incidents
     def get_all_incidents(
@@ -333,7 +355,7 @@ class Spira:
             verify=self.verify,
         )
 
-        return response.json()
+        return get_created_json(response)
 
     # Create a new incident comment
     def create_incident_comment(self, project_id, incident_id, body) -> Dict:
@@ -356,7 +378,7 @@ class Spira:
             verify=self.verify,
         )
 
-        return response.json()
+        return get_created_json(response)
 
     # Create a new requirement comment
     def create_requirement_comment(self, project_id, requirement_id, body) -> Dict:
@@ -379,7 +401,7 @@ class Spira:
             verify=self.verify,
         )
 
-        return response.json()
+        return get_created_json(response)
 
     def get_all_document_folders(self, project_id) -> Dict:
         get_all_document_folders = (
@@ -474,7 +496,22 @@ class Spira:
             data=payload,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
+
+    # Add a document with the contents of the file, the file is base64 encoded while the request is sent.
+    def add_document_file(self, project_id, body, file) -> Dict:
+        add_document_url = (
+            self.base_url + "projects/" + str(project_id) + "/documents/file"
+        )
+
+        response = requests.request(
+            "POST",
+            add_document_url,
+            headers=self.headers,
+            data=Base64JsonBody(body, "BinaryData", file),
+            verify=self.verify,
+        )
+        return get_created_json(response)
 
     def add_artifact_document_association(
         self, project_id, artifact_type_id, artifact_id, document_id
@@ -497,7 +534,7 @@ class Spira:
             headers=self.headers,
             verify=self.verify,
         )
-        return response.json()
+        return get_created_json(response)
 
     def remove_artifact_document_association(
         self, project_id, artifact_type_id, artifact_id, document_id
@@ -930,7 +967,7 @@ class Spira:
             verify=self.verify,
         )
 
-        return response.json()
+        return get_created_json(response)
 
     def get_all_program_milestones(self, program_id):
         get_all_program_milestones_url = (
@@ -961,7 +998,7 @@ class Spira:
             verify=self.verify,
         )
 
-        return response.json()
+        return get_created_json(response)
 
     def create_child_capability(self, program_id, parentid, body):
         create_child_capability_url = (
@@ -982,7 +1019,7 @@ class Spira:
             verify=self.verify,
         )
 
-        return response.json()
+        return get_created_json(response)
 
     def get_all_program_capabilities(self, program_id):
         params = {"current_page": 1, "page_size": 10000}
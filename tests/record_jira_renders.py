@@ -0,0 +1,42 @@
+# Record the renders of the parity tests from a jira instance, with the jira connection of the .env file.
+# The html of every markup in tests/fixtures/jira_renders.json is replaced by the render of the instance.
+# The mentions need a user of the instance, edit their markup and the name before recording.
+#   python3 tests/record_jira_renders.py
+import json
+import os
+import sys
+import requests
+from requests.auth import HTTPBasicAuth
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tests.test_jira_wiki_renderer import JIRA_RENDERS_PATH, load_jira_renders
+
+
+def record_jira_renders():
+    load_dotenv()
+    jira_base_url = os.getenv("JIRA_BASE_URL").rstrip("/")
+    auth = HTTPBasicAuth(os.getenv("JIRA_USERNAME"), os.getenv("JIRA_API_KEY"))
+
+    jira_renders = load_jira_renders()
+    jira_renders["jira_base_url"] = jira_base_url
+
+    for jira_render in jira_renders["renders"]:
+        response = requests.post(
+            jira_base_url + "/rest/api/1.0/render",
+            json={
+                "rendererType": "atlassian-wiki-renderer",
+                "unrenderedMarkup": jira_render["markup"],
+            },
+            auth=auth,
+        )
+        response.raise_for_status()
+        jira_render["html"] = response.text
+        print("Recorded " + jira_render["name"])
+
+    with open(JIRA_RENDERS_PATH, "w", encoding="UTF-8") as file:
+        file.write(json.dumps(jira_renders, indent=4) + "\n")
+
+
+if __name__ == "__main__":
+    record_jira_renders()
@@ -0,0 +1,101 @@
+# Artifact index: the ids of the spira artifacts by the jira id, from the journal and from spira.
+import os
+import tempfile
+import unittest
+from artifact_index import ArtifactIndex, load_artifact_index
+from migration_journal import MigrationJournal
+
+
+def get_spira_requirement(requirement_id, jira_id) -> dict:
+    return {
+        "RequirementId": requirement_id,
+        "ProjectId": 1,
+        "CustomProperties": [
+            {"Definition": {"Name": "Jira Id"}, "StringValue": jira_id}
+        ],
+    }
+
+
+class FakeSpira:
+    def __init__(self, requirements):
+        self.requirements = requirements
+        self.fetches = 0
+
+    def get_all_requirements(self, spira_product_id):
+        self.fetches += 1
+        return self.requirements
+
+    def get_all_tasks(self, spira_product_id):
+        return []
+
+    def get_all_incidents(self, spira_product_id):
+        return []
+
+
+class ArtifactIndexTest(unittest.TestCase):
+    def test_id_is_read_from_the_id_key_of_the_artifact_type(self):
+        artifact_index = ArtifactIndex()
+
+        self.assertTrue(
+            artifact_index.add_artifact(
+                "PRJ-1", {"ProjectId": 1, "RequirementId": 11}, "requirement"
+            )
+        )
+        self.assertTrue(
+            artifact_index.add_artifact("PRJ-2", {"ArtifactTypeId": 6, "TaskId": 21})
+        )
+
+        self.assertEqual(11, artifact_index.get_artifact_id("PRJ-1", "requirement"))
+        self.assertEqual(21, artifact_index.get_artifact_id("PRJ-2", "task"))
+
+    def test_artifact_without_its_id_is_left_out(self):
+        artifact_index = ArtifactIndex()
+
+        self.assertFalse(
+            artifact_index.add_artifact("PRJ-1", {"ProjectId": 1}, "requirement")
+        )
+        self.assertFalse(artifact_index.add_artifact("PRJ-2", {"ProjectId": 1}))
+        self.assertIsNone(artifact_index.get("PRJ-1"))
+        self.assertIsNone(artifact_index.get("PRJ-2"))
+
+
+class LoadArtifactIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = MigrationJournal(
+            os.path.join(self.directory.name, "journal.sqlite"), "test"
+        )
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_journal_wins_over_spira(self):
+        self.journal.record("PRJ-1", "requirement", 11)
+        spira = FakeSpira(
+            [get_spira_requirement(99, "PRJ-1"), get_spira_requirement(12, "PRJ-2")]
+        )
+
+        artifact_index = load_artifact_index(spira, 1, self.journal, ["requirement"])
+
+        self.assertEqual(11, artifact_index.get_artifact_id("PRJ-1", "requirement"))
+        self.assertEqual(12, artifact_index.get_artifact_id("PRJ-2", "requirement"))
+        self.assertEqual(1, self.journal.get_spira_check("requirement")[0])
+
+    # Spira is not fetched again once a fetch found nothing outside the journal
+    def test_spira_is_fetched_until_nothing_is_outside_the_journal(self):
+        self.journal.record("PRJ-1", "requirement", 11)
+        spira = FakeSpira([get_spira_requirement(11, "PRJ-1")])
+
+        load_artifact_index(spira, 1, self.journal, ["requirement"])
+        artifact_index = load_artifact_index(spira, 1, self.journal, ["requirement"])
+
+        self.assertEqual(1, spira.fetches)
+        self.assertEqual(11, artifact_index.get_artifact_id("PRJ-1", "requirement"))
+
+        load_artifact_index(spira, 1, self.journal, ["requirement"], True)
+        self.assertEqual(2, spira.fetches)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# Attachment store: the attachments are downloaded once, stored once per contents, and the least
+# recently used contents are evicted over the size limit.
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from attachment_store import AttachmentStore
+from attachment_transfer import MEGABYTE
+
+
+class FakeAttachment:
+    def __init__(self, contents):
+        self.contents = contents
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.contents), chunk_size):
+            yield self.contents[start : start + chunk_size]
+
+
+class FakeJira:
+    def __init__(self, attachments):
+        self.attachments = attachments
+        self.downloads = []
+
+    def attachment(self, attachment_id):
+        self.downloads.append(attachment_id)
+        return FakeAttachment(self.attachments[attachment_id])
+
+
+class AttachmentStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.jira = FakeJira(
+            {
+                "1": b"a" * 1000,
+                "2": b"b" * 1000,
+                "3": b"c" * 1000,
+                "4": b"a" * 1000,
+                "5": b"d" * 5000,
+            }
+        )
+
+    # A store of 2560 bytes, with room for two of the small attachments
+    def open_store(self) -> AttachmentStore:
+        attachment_store = AttachmentStore(self.directory.name, 2560 / MEGABYTE)
+        self.addCleanup(attachment_store.close)
+        return attachment_store
+
+    def fetch(self, attachment_store, attachment_id, size=None) -> tuple:
+        attachment_file, content_hash = attachment_store.fetch(
+            self.jira, attachment_id, size
+        )
+        with attachment_file:
+            return attachment_file.read(), content_hash
+
+    def test_attachment_is_downloaded_once(self):
+        contents, content_hash = self.fetch(self.open_store(), "1")
+
+        self.assertEqual(b"a" * 1000, contents)
+        self.assertEqual(hashlib.sha256(contents).hexdigest(), content_hash)
+
+        # A later run reads it from the store
+        self.assertEqual((contents, content_hash), self.fetch(self.open_store(), "1"))
+        self.assertEqual(["1"], self.jira.downloads)
+
+    def test_same_contents_are_stored_once(self):
+        attachment_store = self.open_store()
+        self.fetch(attachment_store, "1")
+        self.fetch(attachment_store, "4")
+
+        self.assertEqual(1000, attachment_store.get_stored_size())
+        self.assertEqual(
+            self.fetch(attachment_store, "1"), self.fetch(attachment_store, "4")
+        )
+        self.assertEqual(["1", "4"], self.jira.downloads)
+
+    def test_least_recently_used_contents_are_evicted(self):
+        attachment_store = self.open_store()
+        for attachment_id in ["1", "2", "1", "3"]:
+            self.fetch(attachment_store, attachment_id)
+            time.sleep(0.01)
+
+        # 2 was used least recently, 1 was read again after it and 3 was just added
+        self.assertEqual(2000, attachment_store.get_stored_size())
+        self.assertIsNone(attachment_store.open("2"))
+        self.fetch(attachment_store, "1")
+        self.fetch(attachment_store, "3")
+        self.assertEqual(["1", "2", "3"], self.jira.downloads)
+
+        self.fetch(attachment_store, "2")
+        self.assertEqual(["1", "2", "3", "2"], self.jira.downloads)
+
+    def test_attachment_larger_than_the_store_is_not_stored(self):
+        attachment_store = self.open_store()
+        contents, content_hash = self.fetch(attachment_store, "5", 5000)
+
+        self.assertEqual(b"d" * 5000, contents)
+        self.assertEqual(hashlib.sha256(contents).hexdigest(), content_hash)
+        self.assertEqual(0, attachment_store.get_stored_size())
+        self.assertIsNone(attachment_store.open("5"))
+
+    def test_contents_removed_from_the_disk_are_downloaded_again(self):
+        attachment_store = self.open_store()
+        _, content_hash = self.fetch(attachment_store, "1")
+        os.remove(attachment_store.get_content_path(content_hash))
+
+        self.assertEqual((b"a" * 1000, content_hash), self.fetch(attachment_store, "1"))
+        self.assertEqual(["1", "1"], self.jira.downloads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+# The streamed json body of the documents, the byte budget and pipeline of the attachment transfer,
+# and the index of the uploaded contents.
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+from attachment_transfer import (
+    ATTACHMENT_CHUNK_SIZE,
+    AttachmentPipeline,
+    Base64JsonBody,
+    ByteBudget,
+    DocumentHashIndex,
+)
+from migration_journal import MigrationJournal
+
+def read_body(body, size) -> bytes:
+    data = b""
+    while True:
+        chunk = body.read(size)
+        if not chunk:
+            return data
+        data += chunk
+
+
+class Base64JsonBodyTest(unittest.TestCase):
+    def test_field_is_sent_once(self):
+        contents = b"document contents"
+        body = Base64JsonBody(
+            {"FilenameOrUrl": "a.txt", "BinaryData": None},
+            "BinaryData",
+            io.BytesIO(contents),
+        )
+        data = read_body(body, 7)
+
+        self.assertEqual(1, data.count(b'"BinaryData"'))
+        self.assertEqual(
+            {
+                "FilenameOrUrl": "a.txt",
+                "BinaryData": base64.b64encode(contents).decode(),
+            },
+            json.loads(data),
+        )
+
+    def test_length_is_the_bytes_read(self):
+        for size in [0, 1, 2, 3, ATTACHMENT_CHUNK_SIZE - 1, ATTACHMENT_CHUNK_SIZE + 1]:
+            for body in [{}, {"BinaryData": None}, {"Name": "ä"}]:
+                with self.subTest(size=size, body=body):
+                    contents = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+                    streamed_body = Base64JsonBody(
+                        body, "BinaryData", io.BytesIO(contents)
+                    )
+                    data = read_body(streamed_body, 65536)
+
+                    self.assertEqual(len(streamed_body), len(data))
+                    self.assertEqual(
+                        contents, base64.b64decode(json.loads(data)["BinaryData"])
+                    )
+
+
+class ByteBudgetTest(unittest.TestCase):
+    def test_acquire_waits_while_the_budget_is_used(self):
+        byte_budget = ByteBudget(10)
+        byte_budget.acquire(8)
+
+        acquired = threading.Event()
+        threading.Thread(
+            target=lambda: (byte_budget.acquire(5), acquired.set()), daemon=True
+        ).start()
+        self.assertFalse(acquired.wait(0.1))
+
+        byte_budget.release(8)
+        self.assertTrue(acquired.wait(1))
+
+    def test_larger_than_budget_passes_alone(self):
+        byte_budget = ByteBudget(10)
+        byte_budget.acquire(50)
+        self.assertEqual(50, byte_budget.in_flight)
+
+
+class AttachmentPipelineTest(unittest.TestCase):
+    def test_results_in_order_and_failed_downloads(self):
+        def download(item):
+            if item == 3:
+                return None
+            time.sleep(0.001 * (item % 3))
+            return io.BytesIO(b"x" * item)
+
+        pipeline = AttachmentPipeline(
+            download,
+            lambda item, file: len(file.read()) == item,
+            lambda item: item,
+            download_workers=3,
+            upload_workers=2,
+            byte_budget=20,
+        )
+        results = pipeline.run(range(10))
+
+        self.assertEqual([item != 3 for item in range(10)], results)
+        self.assertEqual(0, pipeline.byte_budget.in_flight)
+
+    def test_downloads_of_unknown_size_run_alone(self):
+        lock = threading.Lock()
+        downloads = {"running": 0, "most_running": 0}
+
+        def download(item):
+            with lock:
+                downloads["running"] += 1
+                downloads["most_running"] = max(
+                    downloads["most_running"], downloads["running"]
+                )
+            time.sleep(0.01)
+            with lock:
+                downloads["running"] -= 1
+            return io.BytesIO(b"x" * 5)
+
+        pipeline = AttachmentPipeline(
+            download,
+            lambda item, file: True,
+            lambda item: item,
+            download_workers=4,
+            upload_workers=2,
+            byte_budget=20,
+        )
+        results = pipeline.run([None, 0, None, 0])
+
+        self.assertEqual([True] * 4, results)
+        self.assertEqual(1, downloads["most_running"])
+        self.assertEqual(0, pipeline.byte_budget.in_flight)
+
+
+class DocumentHashIndexTest(unittest.TestCase):
+    # Claims the hash on another thread, returns the event that is set with the result in claims
+    def get_or_claim_in_background(self, document_hashes, claims):
+        claimed = threading.Event()
+
+        def get_or_claim():
+            claims.append(document_hashes.get_or_claim("hash"))
+            claimed.set()
+
+        threading.Thread(target=get_or_claim, daemon=True).start()
+        return claimed
+
+    def test_first_copy_claims_and_the_others_wait_for_its_upload(self):
+        document_hashes = DocumentHashIndex()
+        self.assertIsNone(document_hashes.get_or_claim("hash"))
+
+        claims = []
+        claimed = self.get_or_claim_in_background(document_hashes, claims)
+        self.assertFalse(claimed.wait(0.1))
+
+        document_hashes.set_document_id("hash", 7)
+        self.assertTrue(claimed.wait(1))
+        self.assertEqual([7], claims)
+        self.assertEqual(7, document_hashes.get_or_claim("hash"))
+
+    def test_failed_upload_is_claimed_again(self):
+        document_hashes = DocumentHashIndex()
+        self.assertIsNone(document_hashes.get_or_claim("hash"))
+
+        claims = []
+        claimed = self.get_or_claim_in_background(document_hashes, claims)
+        self.assertFalse(claimed.wait(0.1))
+
+        # The waiting copy claims the hash once the first upload failed
+        document_hashes.set_document_id("hash", None)
+        self.assertTrue(claimed.wait(1))
+        self.assertEqual([None], claims)
+
+        document_hashes.set_document_id("hash", 8)
+        self.assertEqual(8, document_hashes.get_or_claim("hash"))
+
+    def test_uploads_are_found_by_later_runs_in_the_journal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            journal = MigrationJournal(os.path.join(directory, "journal.sqlite"))
+            try:
+                document_hashes = DocumentHashIndex(journal)
+                self.assertIsNone(document_hashes.get_or_claim("hash"))
+                document_hashes.set_document_id("hash", 7)
+
+                self.assertEqual(7, DocumentHashIndex(journal).get_or_claim("hash"))
+                self.assertIsNone(DocumentHashIndex(journal).get_or_claim("other"))
+            finally:
+                journal.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+# Parity of the local jira wiki renderer with the render endpoint of jira.
+# Every recorded render is either left to jira, or rendered locally to the same html. The line breaks and
+# indentation between the tags are not compared, they don't change how the html is shown.
+import json
+import os
+import re
+import unittest
+from jira_wiki_renderer import render_jira_wiki_markup
+
+JIRA_RENDERS_PATH = os.path.join(
+    os.path.dirname(__file__), "fixtures", "jira_renders.json"
+)
+
+
+def load_jira_renders() -> dict:
+    with open(JIRA_RENDERS_PATH, "r", encoding="UTF-8") as file:
+        return json.load(file)
+
+
+def normalize_html(html) -> str:
+    return re.sub(r">\n<", "><", re.sub(r"\s*\n\s*", "\n", html.strip()))
+
+
+class JiraWikiRendererParityTest(unittest.TestCase):
+    def test_local_renders_match_jira(self):
+        jira_renders = load_jira_renders()
+
+        for jira_render in jira_renders["renders"]:
+            with self.subTest(jira_render["name"]):
+                html = render_jira_wiki_markup(
+                    jira_render["markup"], jira_renders["jira_base_url"]
+                )
+                if html is not None:
+                    self.assertEqual(
+                        normalize_html(jira_render["html"]), normalize_html(html)
+                    )
+
+    # The markup marked as local is not left to jira, so the local renderer keeps its coverage
+    def test_local_markup_is_rendered_locally(self):
+        for jira_render in load_jira_renders()["renders"]:
+            with self.subTest(jira_render["name"]):
+                html = render_jira_wiki_markup(jira_render["markup"])
+                if jira_render["local"]:
+                    self.assertIsNotNone(html)
+
+    def test_unsupported_markup_is_left_to_jira(self):
+        for jira_render in load_jira_renders()["renders"]:
+            with self.subTest(jira_render["name"]):
+                if not jira_render["local"]:
+                    self.assertIsNone(render_jira_wiki_markup(jira_render["markup"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+# Migration journal: the records of the created artifacts, the skip of what was migrated before,
+# and the journals kept per spira instance.
+import os
+import tempfile
+import unittest
+from unittest import mock
+import migration_journal
+from migration_journal import (
+    MigrationJournal,
+    get_migration_journal_path,
+    get_product_journal,
+    skip_journaled,
+)
+
+
+class MigrationJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.journal = MigrationJournal(
+            os.path.join(self.directory.name, "journal.sqlite"), "test"
+        )
+
+    def tearDown(self):
+        self.journal.close()
+        self.directory.cleanup()
+
+    def test_first_record_is_kept(self):
+        self.journal.record("PRJ-1", "requirement", 11, {"Name": "First"})
+        self.journal.record("PRJ-1", "requirement", 12, {"Name": "Second"})
+
+        self.assertEqual(11, self.journal.get_spira_id("PRJ-1", "requirement"))
+        self.assertIsNone(self.journal.get_spira_id("PRJ-1", "task"))
+
+    def test_migrated_artifacts_are_skipped(self):
+        self.journal.record("PRJ-1", "requirement", 11)
+
+        self.assertTrue(skip_journaled(self.journal, "PRJ-1", "requirement"))
+        self.assertFalse(skip_journaled(self.journal, "PRJ-2", "requirement"))
+        self.assertFalse(skip_journaled(self.journal, "PRJ-1", "comment"))
+        self.assertFalse(skip_journaled(None, "PRJ-1", "requirement"))
+        self.assertFalse(skip_journaled(self.journal, None, "requirement"))
+
+    def test_clear_forgets_the_artifact_types_and_their_spira_check(self):
+        self.journal.record("PRJ-1", "requirement", 11)
+        self.journal.record("PRJ-1", "comment", 21)
+        self.journal.record_spira_check("requirement", 0)
+        self.journal.record_spira_check("comment", 0)
+
+        self.journal.clear(["requirement"])
+
+        self.assertFalse(skip_journaled(self.journal, "PRJ-1", "requirement"))
+        self.assertIsNone(self.journal.get_spira_check("requirement"))
+        self.assertTrue(skip_journaled(self.journal, "PRJ-1", "comment"))
+        self.assertIsNotNone(self.journal.get_spira_check("comment"))
+
+
+class InstanceJournalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        patcher = mock.patch.object(
+            migration_journal, "MIGRATION_JOURNAL_DIRECTORY", self.directory.name
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+
+    def record_in_product_journal(self, spira_base_url, jira_key):
+        journal = get_product_journal(spira_base_url, 1)
+        journal.record(jira_key, "requirement", 11)
+        journal.close()
+
+    def is_in_product_journal(self, spira_base_url, jira_key) -> bool:
+        journal = get_product_journal(spira_base_url, 1)
+        try:
+            return skip_journaled(journal, jira_key, "requirement")
+        finally:
+            journal.close()
+
+    def test_journal_of_another_instance_is_not_used(self):
+        self.record_in_product_journal("https://rehearsal.example.com/spira/", "PRJ-1")
+
+        self.assertTrue(
+            self.is_in_product_journal("https://rehearsal.example.com/spira", "PRJ-1")
+        )
+        self.assertFalse(
+            self.is_in_product_journal("https://prod.example.com/spira/", "PRJ-1")
+        )
+
+    def test_journal_without_an_instance_is_not_used(self):
+        journal = MigrationJournal(get_migration_journal_path("product_1"), "product_1")
+        journal.record("PRJ-1", "requirement", 11)
+        journal.close()
+
+        self.assertFalse(
+            self.is_in_product_journal("https://prod.example.com/spira/", "PRJ-1")
+        )
+
+    def test_journal_is_reopened_by_its_name(self):
+        journal = get_product_journal("https://prod.example.com/spira/", 1)
+        journal.record("PRJ-1", "requirement", 11)
+        journal.close()
+
+        # The failure log keeps the name of the journal, the retry opens it by that name
+        reopened = migration_journal.get_migration_journal(journal.name)
+        try:
+            self.assertEqual(11, reopened.get_spira_id("PRJ-1", "requirement"))
+        finally:
+            reopened.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
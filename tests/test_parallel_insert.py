@@ -0,0 +1,97 @@
+# Inserts in the order of the dependencies: parents before children, cycles and missing parents.
+import threading
+import time
+import unittest
+from parallel_insert import run_in_dependency_order
+
+
+class DependencyOrderedRunTest(unittest.TestCase):
+    def run_items(self, items, workers=4, keys=None):
+        lock = threading.Lock()
+        inserted = []
+
+        def insert_item(item):
+            time.sleep(0.001)
+            with lock:
+                inserted.append(item["key"])
+            return item["key"].lower()
+
+        results = run_in_dependency_order(
+            items,
+            lambda item: item["key"],
+            lambda item: item["parents"],
+            insert_item,
+            workers,
+            keys,
+        )
+        return results, inserted
+
+    def test_parents_are_inserted_before_their_children(self):
+        items = [
+            {"key": "C", "parents": ["B"]},
+            {"key": "B", "parents": ["A"]},
+            {"key": "D", "parents": []},
+            {"key": "A", "parents": []},
+        ]
+        results, inserted = self.run_items(items)
+
+        self.assertEqual(["c", "b", "d", "a"], results)
+        self.assertLess(inserted.index("A"), inserted.index("B"))
+        self.assertLess(inserted.index("B"), inserted.index("C"))
+
+    def test_parents_outside_the_run_are_not_waited_for(self):
+        items = [{"key": "A", "parents": ["IN-SPIRA"]}, {"key": "B", "parents": []}]
+        results, inserted = self.run_items(items)
+
+        self.assertEqual(["a", "b"], results)
+        self.assertCountEqual(["A", "B"], inserted)
+
+    def test_cycle_is_broken_in_the_order_of_the_items(self):
+        items = [
+            {"key": "A", "parents": ["B"]},
+            {"key": "B", "parents": ["A"]},
+            {"key": "C", "parents": ["B"]},
+        ]
+        results, inserted = self.run_items(items)
+
+        self.assertEqual(["a", "b", "c"], results)
+        self.assertEqual(["A", "B", "C"], inserted)
+
+    # A streamed parent that never comes, e.g. an issue that failed to convert, is not waited for
+    def test_streamed_parent_that_never_comes_is_released(self):
+        items = [{"key": "B", "parents": ["A"]}, {"key": "C", "parents": []}]
+        results, inserted = self.run_items(iter(items), keys=["A", "B", "C"])
+
+        self.assertEqual(["b", "c"], results)
+        self.assertCountEqual(["B", "C"], inserted)
+
+    def test_streamed_child_waits_for_a_later_parent(self):
+        items = [
+            {"key": "B", "parents": ["A"]},
+            {"key": "C", "parents": []},
+            {"key": "A", "parents": []},
+        ]
+        results, inserted = self.run_items(iter(items), keys=["A", "B", "C"])
+
+        self.assertEqual(["b", "c", "a"], results)
+        self.assertLess(inserted.index("A"), inserted.index("B"))
+
+    def test_failed_parent_releases_its_children(self):
+        def insert_item(item):
+            if item["key"] == "A":
+                raise ValueError("insert failed")
+            return item["key"]
+
+        results = run_in_dependency_order(
+            [{"key": "B", "parents": ["A"]}, {"key": "A", "parents": []}],
+            lambda item: item["key"],
+            lambda item: item["parents"],
+            insert_item,
+            2,
+        )
+
+        self.assertEqual(["B", None], results)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+# Parsing of the jira dates to the spira date format.
+import unittest
+from utility import parse_jira_datetime
+
+
+class ParseJiraDatetimeTest(unittest.TestCase):
+    def test_jira_dates_are_converted(self):
+        jira_dates = {
+            "2023-04-05": "2023-04-05T00:00:00.000000",
+            "2023-4-5": "2023-04-05T00:00:00.000000",
+            "2023-04-05T10:20:30.123Z": "2023-04-05T10:20:30.123000",
+            "2023-04-05T10:20:30.123+0200": "2023-04-05T10:20:30.123000+0200",
+            "2023-04-05T10:20:30.123-05:30": "2023-04-05T10:20:30.123000-0530",
+            "2023-04-05T10:20:30.123456+0000": "2023-04-05T10:20:30.123456+0000",
+        }
+        for jira_date, spira_date in jira_dates.items():
+            with self.subTest(jira_date):
+                self.assertEqual(spira_date, parse_jira_datetime(jira_date))
+
+    def test_converted_dates_parse_to_themselves(self):
+        for spira_date in [
+            "2023-04-05T00:00:00.000000",
+            "2023-04-05T10:20:30.123000+0200",
+        ]:
+            with self.subTest(spira_date):
+                self.assertEqual(spira_date, parse_jira_datetime(spira_date))
+
+    def test_other_values_are_not_dates(self):
+        for value in [
+            None,
+            5,
+            "",
+            "not a date",
+            "2023-02-30",
+            "2023-04-05T25:00:00.000+0000",
+            "2023-04-05 10:20",
+            "2023-04-05T10:20:30+0000",
+            "2023-04-05T10:20:30.1234567+0000",
+            "2023-04-05T10:20:30.123+0200 ",
+        ]:
+            with self.subTest(value):
+                self.assertIsNone(parse_jira_datetime(value))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,162 +1,378 @@
-import json
-from spira import Spira
-from utility import pretty_print
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from spira import Spira, SpiraError
+from parallel_insert import run_in_dependency_order
+from artifact_index import (
+    ARTIFACT_ID_KEYS,
+    ARTIFACT_TYPE_IDS,
+    ArtifactIndex,
+    get_capability_ids_by_jira_id,
+)
+from migration_journal import MigrationJournal, record_migrated
+from failure_log import log_failure
 
+# Requirement to capability associations sent to spira at the same time, next to the inserts
+CAPABILITY_ASSOCIATION_WORKERS = 4
 
+
+# Insert the converted artifacts of all the issue types at once, the artifacts can be streamed in from the conversion.
+# Requirements wait for their epic or parent, and tasks for their requirement, when these are
+# inserted in the same run, everything else is inserted in parallel with the given number of workers.
+# When streaming, jira_keys are the keys of all the artifacts that will come, so children can wait for
+# parents that are not converted yet.
+# The created artifacts are added to the artifact index, so later stages can resolve them without a refetch,
+# and recorded in the migration journal. Artifacts already in the journal are not inserted again.
+# With skip_existing, artifacts whose jira id is already in the artifact index are not inserted either.
+# Requirements are associated with their capability in the background, failed associations are retried at the end.
 def insert_issue_to_spira(
     spira: Spira,
     spira_metadata,
-    input_file_handle,
-    all_requirements_in_spira,
+    artifacts,
+    artifact_index: ArtifactIndex,
+    workers=1,
+    journal: MigrationJournal | None = None,
+    skip_existing=False,
+    jira_keys=None,
 ):  # All artifacts not only requirements
-    print("Spira input supplied through: " + input_file_handle.name)
-    to_spira = json.load(input_file_handle)
-    print("Spira input loaded")
-
     print("Starting upload to spira...")
 
-    product = to_spira["product"]
-
-    all_capabilites_program = spira_metadata["capabilites"]
+    insert_context = {
+        "spira": spira,
+        "spira_metadata": spira_metadata,
+        "artifact_index": artifact_index,
+        "journal": journal,
+        "skip_existing": skip_existing,
+        # Indexed once, so finding the capability of a requirement never costs a request
+        "capability_ids": get_capability_ids_by_jira_id(
+            spira_metadata.get("capabilites") or []
+        ),
+        "capability_association_executor": ThreadPoolExecutor(
+            max_workers=CAPABILITY_ASSOCIATION_WORKERS
+        ),
+        "capability_associations": [],
+        "failed_capability_associations": [],
+        "capability_association_lock": threading.Lock(),
+    }
 
-    artifacts_processed = len(product)
-
-    print("Artifacts found and to be inserted: " + str(len(product)))
+    if jira_keys is not None:
+        print("Artifacts found and to be inserted: " + str(len(jira_keys)))
     print("If the number of artifacts are high, this might take a while")
 
     # This will probably take some time, so e.g. "Rich" library should be added to have a progress bar
     # Logging to a file should also be here, so the user can lookup what actually happened
-    for artifact in product:
-        if artifact["artifact_type"] == "requirement":
-            inserted_requirement = {}
-            try:
-                parent_id = get_spira_id_from_jira_id(
-                    all_requirements_in_spira, artifact["epiclink"]
-                )
-                if parent_id is None:
-                    parent_id = get_spira_id_from_jira_id(
-                        all_requirements_in_spira, artifact["parentlink"]
-                    )
-
-                if parent_id is None:
-                    inserted_requirement = spira.create_requirement(
-                        int(spira_metadata["project"]["ProjectId"]), artifact["payload"]
-                    )
-                else:
-                    inserted_requirement = spira.create_child_requirement(
-                        int(spira_metadata["project"]["ProjectId"]),
-                        parent_id,
-                        artifact["payload"],
-                    )
-
-            except Exception as e:
-                artifacts_processed -= 1
-                print(e)
-                print(
-                    "An error occured when trying to insert the requirement artifact with data:"
-                )
-                pretty_print(artifact)
-
-            if bool(inserted_requirement):
-                try:
-                    capability_id = get_capability_spira_id_from_jira_id(
-                        all_capabilites_program,
-                        artifact["epiclink"],
-                        artifact["parentlink"],
-                    )
-
-                    if capability_id is not None:
-                        spira.add_capability_requirement_association(
-                            spira_metadata["project"]["ProjectGroupId"],
-                            capability_id,
-                            inserted_requirement["RequirementId"],
-                        )
-
-                except Exception as e:
-                    print(e)
-                    print(
-                        "An error occured when trying to associate a requirement with a capability:"
-                    )
-                    print(
-                        "RequirementId: " + str(inserted_requirement["RequirementId"])
-                    )
-
-        elif artifact["artifact_type"] == "task":
-            try:
-                spira.create_task(
-                    int(spira_metadata["project"]["ProjectId"]), artifact["payload"]
-                )
-            except Exception as e:
-                artifacts_processed -= 1
-                print(e)
-                print(
-                    "An error occured when trying to insert the task artifact with data:"
-                )
-                pretty_print(artifact)
-        elif artifact["artifact_type"] == "incident":
-            try:
-                spira.create_incident(
-                    int(spira_metadata["project"]["ProjectId"]), artifact["payload"]
-                )
-            except Exception as e:
-                artifacts_processed -= 1
-                print(e)
-                print(
-                    "An error occured when trying to insert the incident artifact with data:"
-                )
-                pretty_print(artifact)
+    results = run_in_dependency_order(
+        artifacts,
+        lambda artifact: artifact.get("jira_key"),
+        get_artifact_dependency_keys,
+        lambda artifact: insert_artifact(insert_context, artifact),
+        workers,
+        jira_keys,
+    )
+
+    finish_capability_associations(insert_context)
+
+    return sum(1 for inserted in results if inserted)
+
+
+# The jira ids of the artifacts that have to be in spira before the artifact is inserted.
+def get_artifact_dependency_keys(artifact) -> list:
+    if artifact["artifact_type"] == "requirement":
+        return [artifact["epiclink"], artifact["parentlink"]]
+    elif artifact["artifact_type"] == "task":
+        return [artifact["requirementlink"]]
+    return []
+
+
+# Insert a single artifact, returns if it was inserted.
+def insert_artifact(insert_context, artifact) -> bool:
+    if is_journaled(insert_context, artifact) or is_existing(insert_context, artifact):
+        return True
+
+    if artifact["artifact_type"] == "requirement":
+        return insert_requirement(insert_context, artifact)
+    elif artifact["artifact_type"] == "task":
+        return insert_task(insert_context, artifact)
+    elif artifact["artifact_type"] == "incident":
+        return insert_incident(insert_context, artifact)
+    else:
+        print(
+            "Artifact unrecognized, with artifact type "
+            + str(artifact["artifact_type"])
+            + " and jira key "
+            + str(artifact.get("jira_key"))
+        )
+        return False
+
+
+def insert_requirement(insert_context, artifact) -> bool:
+    spira: Spira = insert_context["spira"]
+    spira_metadata = insert_context["spira_metadata"]
+
+    inserted_requirement = {}
+    request = None
+    try:
+        parent_id = insert_context["artifact_index"].get_artifact_id(
+            artifact["epiclink"], "requirement"
+        )
+        if parent_id is None:
+            parent_id = insert_context["artifact_index"].get_artifact_id(
+                artifact["parentlink"], "requirement"
+            )
+
+        if parent_id is None:
+            request = get_create_request(insert_context, "create_requirement")
+            inserted_requirement = spira.create_requirement(
+                int(spira_metadata["project"]["ProjectId"]), artifact["payload"]
+            )
         else:
-            print("Artifact unrecognized, with data:")
-            pretty_print(artifact)
-
-    return artifacts_processed
-
-
-def get_spira_id_from_jira_id(all_requirements_in_spira, link_jira_id):
-    for requirement in all_requirements_in_spira:
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == link_jira_id
-                ),
-                requirement["CustomProperties"],
-            ),
-            None,
+            request = get_create_request(
+                insert_context, "create_child_requirement", parent_id
+            )
+            inserted_requirement = spira.create_child_requirement(
+                int(spira_metadata["project"]["ProjectId"]),
+                parent_id,
+                artifact["payload"],
+            )
+
+        # The requirements waiting for this one are released when it returns
+        record_inserted_artifact(
+            insert_context, artifact, inserted_requirement["RequirementId"]
         )
-        if property is not None:
-            return requirement["RequirementId"]
 
-    return None
+    except Exception as e:
+        log_artifact_failure(insert_context, artifact, e, request)
+        return False
+
+    # Sent in the background, so the requirements waiting for this one don't wait for the association
+    capability_id = get_requirement_capability_id(insert_context, artifact)
+    if capability_id is not None:
+        submit_capability_association(
+            insert_context,
+            artifact["jira_key"],
+            capability_id,
+            inserted_requirement["RequirementId"],
+        )
+
+    return True
 
 
-def get_capability_spira_id_from_jira_id(all_capabilites, epicid, parentid):
-    for capability in all_capabilites:
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == parentid
-                ),
-                capability["CustomProperties"],
-            ),
-            None,
+def insert_task(insert_context, artifact) -> bool:
+    spira: Spira = insert_context["spira"]
+    spira_metadata = insert_context["spira_metadata"]
+
+    request = None
+    try:
+        # The requirement of the task is only known once it's in spira
+        requirement_id = insert_context["artifact_index"].get_artifact_id(
+            artifact["requirementlink"], "requirement"
+        )
+        artifact["payload"]["RequirementId"] = (
+            requirement_id if requirement_id is not None else 0
         )
 
-        if property is not None:
-            return capability["CapabilityId"]
-
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == epicid
-                ),
-                capability["CustomProperties"],
-            ),
-            None,
+        request = get_create_request(insert_context, "create_task")
+        inserted_task = spira.create_task(
+            int(spira_metadata["project"]["ProjectId"]), artifact["payload"]
         )
-        if property is not None:
-            return capability["CapabilityId"]
+        record_inserted_artifact(insert_context, artifact, inserted_task["TaskId"])
+    except Exception as e:
+        log_artifact_failure(insert_context, artifact, e, request)
+        return False
+
+    return True
+
+
+def insert_incident(insert_context, artifact) -> bool:
+    spira: Spira = insert_context["spira"]
+    spira_metadata = insert_context["spira_metadata"]
+
+    request = get_create_request(insert_context, "create_incident")
+    try:
+        inserted_incident = spira.create_incident(
+            int(spira_metadata["project"]["ProjectId"]), artifact["payload"]
+        )
+        record_inserted_artifact(
+            insert_context, artifact, inserted_incident["IncidentId"]
+        )
+    except Exception as e:
+        log_artifact_failure(insert_context, artifact, e, request)
+        return False
+
+    return True
+
+
+# Artifacts migrated by an earlier run are taken from the journal, so a stopped migration can be run again.
+def is_journaled(insert_context, artifact) -> bool:
+    if insert_context["journal"] is None:
+        return False
+
+    spira_id = insert_context["journal"].get_spira_id(
+        artifact["jira_key"], artifact["artifact_type"]
+    )
+    if spira_id is None:
+        return False
+
+    print(
+        "Jira issue "
+        + artifact["jira_key"]
+        + " is already migrated according to the migration journal, skipping."
+    )
+    insert_context["artifact_index"].add_artifact_id(
+        artifact["jira_key"], ARTIFACT_TYPE_IDS[artifact["artifact_type"]], spira_id
+    )
+    return True
+
+
+# With skip_existing, artifacts that are already in spira are left as they are.
+# They are added to the journal, so later stages resolve them from it.
+def is_existing(insert_context, artifact) -> bool:
+    if not insert_context["skip_existing"]:
+        return False
+
+    spira_id = insert_context["artifact_index"].get_artifact_id(
+        artifact["jira_key"], artifact["artifact_type"]
+    )
+    if spira_id is None:
+        return False
+
+    print("Jira issue " + artifact["jira_key"] + " already exists in spira, skipping.")
+    record_migrated(
+        insert_context["journal"],
+        artifact["jira_key"],
+        artifact["artifact_type"],
+        spira_id,
+    )
+    return True
+
+
+def record_inserted_artifact(insert_context, artifact, spira_id):
+    insert_context["artifact_index"].add_artifact_id(
+        artifact["jira_key"], ARTIFACT_TYPE_IDS[artifact["artifact_type"]], spira_id
+    )
+
+    record_migrated(
+        insert_context["journal"],
+        artifact["jira_key"],
+        artifact["artifact_type"],
+        spira_id,
+        artifact["payload"],
+    )
+
+
+# The capability of a requirement is the one migrated from its parent, or else from its epic.
+def get_requirement_capability_id(insert_context, artifact):
+    capability_ids = insert_context["capability_ids"]
+
+    for link in [artifact["parentlink"], artifact["epiclink"]]:
+        if link is not None and link in capability_ids:
+            return capability_ids[link]
 
     return None
+
+
+def submit_capability_association(
+    insert_context, jira_key, capability_id, requirement_id
+):
+    association = {
+        "jira_key": jira_key,
+        "capability_id": capability_id,
+        "requirement_id": requirement_id,
+    }
+
+    insert_context["capability_associations"].append(
+        insert_context["capability_association_executor"].submit(
+            add_capability_association, insert_context, association
+        )
+    )
+
+
+# Returns if the association was added, failed associations are put on the retry list.
+def add_capability_association(insert_context, association) -> bool:
+    spira: Spira = insert_context["spira"]
+
+    try:
+        status_code = spira.add_capability_requirement_association(
+            insert_context["spira_metadata"]["project"]["ProjectGroupId"],
+            association["capability_id"],
+            association["requirement_id"],
+        )
+        if status_code >= 400:
+            raise SpiraError(
+                "Spira responded with status code: " + str(status_code), status_code
+            )
+    except Exception as e:
+        print(e)
+        print(
+            "An error occured when trying to associate a requirement with a capability:"
+        )
+        print("RequirementId: " + str(association["requirement_id"]))
+
+        association["error"] = e
+        with insert_context["capability_association_lock"]:
+            insert_context["failed_capability_associations"].append(association)
+        return False
+
+    return True
+
+
+# Wait for the associations still being sent, then retry the failed ones once.
+def finish_capability_associations(insert_context):
+    insert_context["capability_association_executor"].shutdown(wait=True)
+
+    associations = insert_context["capability_associations"]
+    failed_associations = insert_context["failed_capability_associations"]
+    if not associations:
+        return
+
+    print(
+        "Requirements associated with capabilities: "
+        + str(len(associations) - len(failed_associations))
+        + " of "
+        + str(len(associations))
+    )
+    if not failed_associations:
+        return
+
+    print(
+        "Retrying "
+        + str(len(failed_associations))
+        + " failed capability associations..."
+    )
+    insert_context["failed_capability_associations"] = []
+    for association in failed_associations:
+        add_capability_association(insert_context, association)
+
+    for association in insert_context["failed_capability_associations"]:
+        log_failure(
+            association["error"],
+            "capability_association",
+            association["jira_key"],
+            {
+                "method": "add_capability_requirement_association",
+                "args": [
+                    insert_context["spira_metadata"]["project"]["ProjectGroupId"],
+                    association["capability_id"],
+                    association["requirement_id"],
+                ],
+            },
+        )
+
+
+# The spira method of a create and its arguments before the payload, logged when the create fails.
+def get_create_request(insert_context, method, *args) -> dict:
+    return {
+        "method": method,
+        "args": [int(insert_context["spira_metadata"]["project"]["ProjectId"]), *args],
+    }
+
+
+def log_artifact_failure(insert_context, artifact, error, request):
+    log_failure(
+        error,
+        artifact["artifact_type"],
+        artifact["jira_key"],
+        request,
+        artifact["payload"],
+        insert_context["journal"],
+        ARTIFACT_ID_KEYS[ARTIFACT_TYPE_IDS[artifact["artifact_type"]]],
+    )
@@ -1,10 +1,13 @@
 import json
+import threading
 from spira import Spira
-from utility import pretty_print
+from parallel_insert import run_concurrently, run_in_dependency_order
+from migration_journal import MigrationJournal, record_migrated, skip_journaled
+from failure_log import log_failure
 
-
-
-def insert_milestones_to_spira(spira: Spira, spira_metadata, input_file_handle) -> int:
+def insert_milestones_to_spira(
+    spira: Spira, spira_metadata, input_file_handle, workers=1
+) -> int:
     print("Spira milestones input supplied through: " + input_file_handle.name)
     milestones_to_spira = json.load(input_file_handle)
     print("Spira input loaded")
@@ -13,28 +16,52 @@ def insert_milestones_to_spira(spira: Spira, spira_metadata, input_file_handle)
 
     milestones = milestones_to_spira["milestones"]
 
-    milestones_processed = len(milestones)
-
-    print("Milestones found and to be inserted: " + str(milestones_processed))
+    print("Milestones found and to be inserted: " + str(len(milestones)))
     print("If the number of milestones are high, this might take a while")
 
-    for milestone in milestones:
-        try:
-            spira.create_program_milestone(
-                int(spira_metadata["program"]["program_id"]), milestone["payload"]
-            )
-        except Exception as e:
-            milestones_processed -= 1
-            print(e)
-            print(
-                "An error occured when trying to insert the program milestone with data:"
-            )
-            pretty_print(milestone)
-    return milestones_processed
+    inserted = run_concurrently(
+        milestones,
+        lambda milestone: insert_milestone(spira, spira_metadata, milestone),
+        workers,
+    )
+
+    return inserted.count(True)
 
 
+def insert_milestone(spira: Spira, spira_metadata, milestone) -> bool:
+    try:
+        spira.create_program_milestone(
+            int(spira_metadata["program"]["program_id"]), milestone["payload"]
+        )
+    except Exception as e:
+        log_failure(
+            e,
+            "milestone",
+            milestone["payload"].get("Name"),
+            {
+                "method": "create_program_milestone",
+                "args": [int(spira_metadata["program"]["program_id"])],
+            },
+            milestone["payload"],
+        )
+        return False
+
+    return True
+
+
+# Capabilities already in the migration journal are not inserted again, and their ids are used as parents.
+# With skip_existing, capabilities whose jira id is already in spira are not inserted either.
+# capability_ids maps the jira ids to the ids of the capabilities in spira, the created capabilities are added
+# to it, so the capabilities of the next types find their parents without fetching them from spira again.
+# Capabilities wait for their epic or parent when it's in the same input, the rest are inserted at the same time.
 def insert_capabilities_to_spira(
-    spira: Spira, spira_metadata, input_file_handle, all_capabilies_in_spira
+    spira: Spira,
+    spira_metadata,
+    input_file_handle,
+    capability_ids,
+    journal: MigrationJournal | None = None,
+    skip_existing=False,
+    workers=1,
 ):
     print("Spira input suppled through: " + input_file_handle.name)
     capabilities_to_spira = json.load(input_file_handle)
@@ -44,52 +71,113 @@ def insert_capabilities_to_spira(
 
     program = capabilities_to_spira["program"]
 
-    capabilities_processed = len(program)
-
-    print("Capabilities found and to be inserted: " + str(capabilities_processed))
+    print("Capabilities found and to be inserted: " + str(len(program)))
     print("If the number of milestones are high, this might take a while")
 
-    for capability in program:
-        try:
-            parent_id = get_spira_id_from_jira_id(
-                all_capabilies_in_spira, capability["epic_link"]
+    insert_context = {
+        "spira": spira,
+        "spira_metadata": spira_metadata,
+        "capability_ids": capability_ids,
+        "capability_ids_lock": threading.Lock(),
+        "journal": journal,
+        # Only the capabilities in spira before this input count as existing
+        "existing_capability_ids": dict(capability_ids) if skip_existing else {},
+    }
+
+    inserted = run_in_dependency_order(
+        program,
+        lambda capability: capability["jira_key"],
+        lambda capability: [capability["epic_link"], capability["parent_link"]],
+        lambda capability: insert_capability(insert_context, capability),
+        workers,
+    )
+
+    return len(program) - inserted.count(False)
+
+
+def insert_capability(insert_context, capability) -> bool:
+    spira: Spira = insert_context["spira"]
+    spira_metadata = insert_context["spira_metadata"]
+    journal = insert_context["journal"]
+
+    if skip_journaled(journal, capability["jira_key"], "capability"):
+        return True
+
+    existing_capability_id = insert_context["existing_capability_ids"].get(
+        capability["jira_key"]
+    )
+    if existing_capability_id is not None:
+        print(
+            "Jira issue "
+            + capability["jira_key"]
+            + " already exists in spira as a capability, skipping."
+        )
+        record_migrated(
+            journal, capability["jira_key"], "capability", existing_capability_id
+        )
+        return True
+
+    request = None
+    try:
+        parent_id = get_capability_id(insert_context, capability["epic_link"])
+        if parent_id is None:
+            parent_id = get_capability_id(insert_context, capability["parent_link"])
+
+        program_id = spira_metadata["program"]["program_id"]
+        if parent_id is None:
+            request = {"method": "create_capability", "args": [program_id]}
+            inserted_capability = spira.create_capability(
+                program_id, capability["payload"]
+            )
+        else:
+            request = {
+                "method": "create_child_capability",
+                "args": [program_id, parent_id],
+            }
+            inserted_capability = spira.create_child_capability(
+                program_id,
+                parent_id,
+                capability["payload"],
             )
-            if parent_id is None:
-                parent_id = get_spira_id_from_jira_id(
-                    all_capabilies_in_spira, capability["parent_link"]
-                )
-
-            if parent_id is None:
-                spira.create_capability(
-                    spira_metadata["program"]["program_id"], capability["payload"]
-                )
-            else:
-                spira.create_child_capability(
-                    spira_metadata["program"]["program_id"],
-                    parent_id,
-                    capability["payload"],
-                )
-        except Exception as e:
-            capabilities_processed -= 1
-            print(e)
-            print("An error occured when trying to insert the capability with data:")
-            pretty_print(capability)
-    return capabilities_processed
-
-
-def get_spira_id_from_jira_id(all_capabilies_in_spira, link_jira_id):
-    for requirement in all_capabilies_in_spira:
-        property = next(
-            filter(
-                (
-                    lambda x: x["Definition"]["Name"] == "Jira Id"
-                    and x["StringValue"] == link_jira_id
-                ),
-                requirement["CustomProperties"],
-            ),
-            None,
+
+        # The capabilities waiting for this one are released when it returns
+        with insert_context["capability_ids_lock"]:
+            insert_context["capability_ids"].setdefault(
+                capability["jira_key"], inserted_capability["CapabilityId"]
+            )
+        record_migrated(
+            journal,
+            capability["jira_key"],
+            "capability",
+            inserted_capability["CapabilityId"],
+            capability["payload"],
+        )
+    except Exception as e:
+        log_failure(
+            e,
+            "capability",
+            capability["jira_key"],
+            request,
+            capability["payload"],
+            journal,
+            "CapabilityId",
+        )
+        return False
+
+    return True
+
+
+# The capability id of a jira id, from the migration journal or else from the known capabilities.
+def get_capability_id(insert_context, link_jira_id):
+    if link_jira_id is None:
+        return None
+
+    if insert_context["journal"] is not None:
+        capability_id = insert_context["journal"].get_spira_id(
+            link_jira_id, "capability"
         )
-        if property is not None:
-            return requirement["CapabilityId"]
+        if capability_id is not None:
+            return capability_id
 
-    return None
+    with insert_context["capability_ids_lock"]:
+        return insert_context["capability_ids"].get(link_jira_id)
@@ -1,11 +1,21 @@
 import json
 import re
+import threading
 from spira import Spira
-from utility import pretty_print
-
+from parallel_insert import run_concurrently
+from migration_journal import MigrationJournal, record_migrated, skip_journaled
+from failure_log import log_failure
 
+# Parent releases are inserted first, all at the same time, then the child releases at the same time.
+# A child release is put under the release with the same major and minor version, if there is one.
 def insert_releases_to_spira(
-    spira: Spira, spira_metadata, input_file_handle, spira_release_dict
+    spira: Spira,
+    spira_metadata,
+    input_file_handle,
+    spira_release_dict,
+    journal: MigrationJournal | None = None,
+    skip_existing=False,
+    workers=1,
 ) -> int:
     print("Spira releases input supplied through: " + input_file_handle.name)
     releases_to_spira = json.load(input_file_handle)
@@ -15,65 +25,59 @@ def insert_releases_to_spira(
 
     releases = releases_to_spira["releases"]
 
-    # Sort parent and child releases in separate lists
-    parent_releases = list(filter((lambda x: x["is_parent"] is True), releases))  # type: ignore
-    child_releases = list(filter((lambda x: x["is_parent"] is False), releases))  # type: ignore
+    # With skip_existing, releases with the name of a release in spira are not inserted
+    existing_release_ids = (
+        get_ids_by_name(spira_release_dict["releases"], "ReleaseId")
+        if skip_existing
+        else {}
+    )
+
+    releases_to_insert = [
+        release
+        for release in releases
+        if not skip_journaled(journal, release["jira_key"], "release")
+        and not skip_existing_object(journal, release, "release", existing_release_ids)
+    ]
 
-    releases_processed = len(releases)
+    # Sort parent and child releases in separate lists
+    parent_releases = list(filter((lambda x: x["is_parent"] is True), releases_to_insert))  # type: ignore
+    child_releases = list(filter((lambda x: x["is_parent"] is False), releases_to_insert))  # type: ignore
 
     # Adds parent releases first
-    for release in parent_releases:
-        try:
-            response = spira.create_release(
-                int(spira_metadata["project"]["ProjectId"]), release["payload"]  # type: ignore
-            )
+    parent_responses = run_concurrently(
+        parent_releases,
+        lambda release: insert_release(spira, spira_metadata, journal, release, None),
+        workers,
+    )
 
-            project_release = {
-                "Name": response["Name"],
-                "VersionNumber": re.findall(r"\d+", response["Name"]),
-                "ReleaseId": response["ReleaseId"],
-            }
+    for response in parent_responses:
+        if response is not None:
+            spira_release_dict["releases"].append(
+                {
+                    "Name": response["Name"],
+                    "VersionNumber": re.findall(r"\d+", response["Name"]),
+                    "ReleaseId": response["ReleaseId"],
+                }
+            )
 
-            spira_release_dict["releases"].append(project_release)
+    # Indexed once after the parents are in, so looking up the parent of a child is a dict lookup
+    release_ids_by_version = get_release_ids_by_version(spira_release_dict["releases"])
+
+    child_responses = run_concurrently(
+        child_releases,
+        lambda release: insert_release(
+            spira,
+            spira_metadata,
+            journal,
+            release,
+            find_parent_release(release, release_ids_by_version),
+        ),
+        workers,
+    )
 
-        except Exception as e:
-            releases_processed -= 1
-            print(e)
-            print(
-                "An error occured when trying to insert the requirement artifact with data:"
-            )
-            pretty_print(release)
-
-    for release in child_releases:
-        # Look for parent release
-        parent_release_id = find_parent_release(release, spira_release_dict)
-
-        if parent_release_id is not None:
-            try:
-                spira.create_child_release(
-                    int(spira_metadata["project"]["ProjectId"]),
-                    parent_release_id,
-                    release["payload"],  # type: ignore
-                )
-            except Exception as e:
-                releases_processed -= 1
-                print(e)
-                print(
-                    "An error occured when trying to insert the requirement artifact with data:"
-                )
-                pretty_print(release)
-        else:
-            try:
-                spira.create_release(
-                    int(spira_metadata["project"]["ProjectId"]), release["payload"]  # type: ignore
-                )
-            except Exception as e:
-                releases_processed -= 1
-                print(e)
-                print(
-                    "An error occured when trying to insert the requirement artifact with data:"
-                )
-                pretty_print(release)
+    releases_processed = len(releases) - (
+        parent_responses.count(None) + child_responses.count(None)
+    )
 
     print("Releases found and to be inserted: " + str(releases_processed))
     print("If the number of artifacts are high, this might take a while")
@@ -81,7 +85,61 @@ def insert_releases_to_spira(
     return releases_processed
 
 
-def insert_components_to_spira(spira: Spira, spira_metadata, input_file_handle) -> int:
+# Insert a single release, as a child release when it has a parent. Returns the created release, or None.
+def insert_release(
+    spira: Spira,
+    spira_metadata,
+    journal: MigrationJournal | None,
+    release,
+    parent_release_id,
+):
+    project_id = int(spira_metadata["project"]["ProjectId"])
+    request = None
+    try:
+        if parent_release_id is None:
+            request = {"method": "create_release", "args": [project_id]}
+            response = spira.create_release(project_id, release["payload"])  # type: ignore
+        else:
+            request = {
+                "method": "create_child_release",
+                "args": [project_id, parent_release_id],
+            }
+            response = spira.create_child_release(
+                project_id,
+                parent_release_id,
+                release["payload"],  # type: ignore
+            )
+
+        record_migrated(
+            journal,
+            release["jira_key"],
+            "release",
+            response["ReleaseId"],
+            release["payload"],
+        )
+    except Exception as e:
+        log_failure(
+            e,
+            "release",
+            release["jira_key"],
+            request,
+            release["payload"],
+            journal,
+            "ReleaseId",
+        )
+        return None
+
+    return response
+
+
+def insert_components_to_spira(
+    spira: Spira,
+    spira_metadata,
+    input_file_handle,
+    journal: MigrationJournal | None = None,
+    skip_existing=False,
+    workers=1,
+) -> int:
     print("Spira components input supplied through" + input_file_handle.name)
     components_to_spira = json.load(input_file_handle)
     print("Spira input loaded")
@@ -90,29 +148,70 @@ def insert_components_to_spira(spira: Spira, spira_metadata, input_file_handle)
 
     components = components_to_spira["components"]
 
-    components_processed = len(components)
-
-    print("Components found and to be inserted: " + str(components_processed))
+    print("Components found and to be inserted: " + str(len(components)))
     print("If the number of artifacts are high, this might take a while")
 
-    for component in components:
-        try:
-            spira.create_component(
-                int(spira_metadata["project"]["ProjectId"]), component["payload"]
-            )
-        except Exception as e:
-            components_processed -= 1
-            print(e)
-            print(
-                "An error occured when trying to insert the requirement artifact with data:"
-            )
-            pretty_print(component)
-
-    return components_processed
+    # With skip_existing, components with the name of a component in spira are not inserted
+    existing_component_ids = (
+        get_ids_by_name(spira_metadata["components"], "ComponentId")
+        if skip_existing
+        else {}
+    )
 
+    components_to_insert = [
+        component
+        for component in components
+        if not skip_journaled(journal, component["jira_key"], "component")
+        and not skip_existing_object(
+            journal, component, "component", existing_component_ids
+        )
+    ]
+
+    inserted = run_concurrently(
+        components_to_insert,
+        lambda component: insert_component(spira, spira_metadata, journal, component),
+        workers,
+    )
 
+    return len(components) - inserted.count(False)
+
+
+def insert_component(
+    spira: Spira, spira_metadata, journal: MigrationJournal | None, component
+) -> bool:
+    try:
+        response = spira.create_component(
+            int(spira_metadata["project"]["ProjectId"]), component["payload"]
+        )
+        record_migrated(
+            journal,
+            component["jira_key"],
+            "component",
+            response["ComponentId"],
+            component["payload"],
+        )
+    except Exception as e:
+        log_failure(
+            e,
+            "component",
+            component["jira_key"],
+            {
+                "method": "create_component",
+                "args": [int(spira_metadata["project"]["ProjectId"])],
+            },
+            component["payload"],
+            journal,
+            "ComponentId",
+        )
+        return False
+
+    return True
+
+
+# At template level every customlist is inserted into every template, all the inserts run at the same time.
+# Returns the number of customlists inserted, the ones that failed are written to the failure log.
 def insert_lists_to_spira(
-    spira: Spira, input_file_handle, system_level, spira_template_ids
+    spira: Spira, input_file_handle, system_level, spira_template_ids, workers=1
 ):
     print("Spira customlists input supplied through" + input_file_handle.name)
     customlists_to_spira = json.load(input_file_handle)
@@ -122,57 +221,140 @@ def insert_lists_to_spira(
 
     customlists = customlists_to_spira["customlists"]
 
-    customlists_processed = len(customlists)
-
     print(
         "Customlists found and to be inserted at template- or at system level: "
         + str(len(customlists))
     )
 
-    if system_level:
-        for customlist in customlists:
-            try:
-                spira.create_system_customlist(
-                    customlist["payload"],
-                )
-            except Exception as e:
-                customlists_processed -= 1
-                print(e)
-                print(
-                    "An error occured when trying to insert the customlist at system level:"
-                )
-                pretty_print(str(customlist))
-    else:
-        for id in spira_template_ids:
-            for customlist in customlists:
-                try:
-                    spira.create_project_template_customlist(
-                        id,
-                        customlist["payload"],
-                    )
-                except Exception as e:
-                    customlists_processed -= 1
-                    print(e)
-                    print(
-                        "An error occured when trying to insert the customlist at project level:"
-                    )
-                    pretty_print(str(customlist))
-
-    return customlists_processed
-
-
-def find_parent_release(release, spira_release_dict):
-    # Sort out all numbers in the version name
-    child_release_version = re.findall(r"\d+", release["payload"]["Name"])
-
-    # Looks for a release that match first and second position and assume that this is the parent
-    if len(child_release_version) > 1:
-        for parent_release in spira_release_dict["releases"]:
-            if (
-                len(parent_release["VersionNumber"]) > 1
-                and child_release_version[0] == parent_release["VersionNumber"][0]
-                and child_release_version[1] == parent_release["VersionNumber"][1]
-            ):
-                return parent_release["ReleaseId"]
+    # None is the system level
+    template_ids = [None] if system_level else spira_template_ids
+    list_inserts = [
+        {"template_id": template_id, "customlist": customlist}
+        for template_id in template_ids
+        for customlist in customlists
+    ]
+
+    # Customlists still to be inserted and the ones that failed, per template
+    insert_progress = {"lock": threading.Lock(), "remaining": {}, "failed": []}
+    for template_id in template_ids:
+        insert_progress["remaining"][template_id] = insert_progress["remaining"].get(
+            template_id, 0
+        ) + len(customlists)
+
+    inserted = run_concurrently(
+        list_inserts,
+        lambda list_insert: insert_list(spira, list_insert, insert_progress),
+        workers,
+    )
+
+    return inserted.count(True)
+
+
+def insert_list(spira: Spira, list_insert, insert_progress) -> bool:
+    template_id = list_insert["template_id"]
+    customlist = list_insert["customlist"]
+
+    error = None
+    try:
+        if template_id is None:
+            spira.create_system_customlist(
+                customlist["payload"],
+            )
+        else:
+            spira.create_project_template_customlist(
+                template_id,
+                customlist["payload"],
+            )
+    except Exception as e:
+        error = str(e)
+        log_failure(
+            e,
+            "customlist",
+            customlist["payload"].get("Name"),
+            (
+                {"method": "create_system_customlist", "args": []}
+                if template_id is None
+                else {
+                    "method": "create_project_template_customlist",
+                    "args": [template_id],
+                }
+            ),
+            customlist["payload"],
+        )
+
+    with insert_progress["lock"]:
+        if error is not None:
+            insert_progress["failed"].append(template_id)
+
+        insert_progress["remaining"][template_id] -= 1
+        if insert_progress["remaining"][template_id] == 0:
+            print(
+                "Customlists done "
+                + get_list_level_name(template_id)
+                + ", failed: "
+                + str(insert_progress["failed"].count(template_id))
+            )
+
+    return error is None
+
+
+def get_list_level_name(template_id) -> str:
+    if template_id is None:
+        return "at system level"
+
+    return "for template " + str(template_id)
+
+
+# Looks for a release that match first and second position of the version and assume that this is the parent
+def find_parent_release(release, release_ids_by_version):
+    version = get_release_version(re.findall(r"\d+", release["payload"]["Name"]))
+    if version is None:
+        return None
+
+    return release_ids_by_version.get(version)
+
+
+# From the (major, minor) version to the id of the releases, the first release found wins.
+def get_release_ids_by_version(releases) -> dict:
+    release_ids = {}
+    for release in releases:
+        version = get_release_version(release["VersionNumber"])
+        if version is not None and version not in release_ids:
+            release_ids[version] = release["ReleaseId"]
+
+    return release_ids
+
+
+# The first two numbers in the name of a release, or None if there are less than two.
+def get_release_version(version_numbers):
+    if len(version_numbers) > 1:
+        return (version_numbers[0], version_numbers[1])
 
     return None
+
+
+def skip_existing_object(
+    journal: MigrationJournal | None, spira_object, artifact_type, existing_ids
+) -> bool:
+    spira_id = existing_ids.get(spira_object["payload"]["Name"])
+    if spira_id is None:
+        return False
+
+    print(
+        "Spira "
+        + artifact_type
+        + " "
+        + spira_object["payload"]["Name"]
+        + " already exists, skipping."
+    )
+    record_migrated(journal, spira_object["jira_key"], artifact_type, spira_id)
+    return True
+
+
+# From the name to the id of the spira objects, the first one found wins.
+def get_ids_by_name(spira_objects, id_key) -> dict:
+    ids = {}
+    for spira_object in spira_objects:
+        if spira_object["Name"] not in ids:
+            ids[spira_object["Name"]] = spira_object[id_key]
+    return ids
@@ -0,0 +1,202 @@
+import json
+import os
+import threading
+from spira import Spira, SpiraError
+from parallel_insert import run_concurrently
+from attachment_transfer import spool_jira_attachment
+from failure_log import (
+    DEFAULT_FAILURE_LOG_NAME,
+    log_failure,
+    read_failures,
+    redirect_failure_log,
+    write_failure,
+)
+from migration_journal import get_migration_journal, record_migrated, skip_journaled
+
+# The failures being retried are set aside in a file with this suffix next to the failure log
+RETRYING_SUFFIX = ".retrying"
+
+
+# Send the failed creates of a failure log to spira again, at the same time with the given number of workers.
+# The failures that fail again are written back to the same failure log, the successful creates are recorded in
+# their migration journal. Failures of artifacts that were migrated by a later run are skipped.
+# Documents are downloaded from jira again, get_jira is only called when there are failed documents.
+# While retrying the failures are set aside in a .retrying file. The ones not retried when the retry stops are
+# written back to the failure log, and a .retrying file left by an interrupted retry is retried along with the log.
+def retry_failed(spira: Spira, failure_log_path, get_jira, workers=1) -> int:
+    retrying_path = failure_log_path + RETRYING_SUFFIX
+    failures = get_unique_failures(set_aside_failures(failure_log_path, retrying_path))
+    print("Failures found and to be retried: " + str(len(failures)))
+
+    retry_context = {
+        "spira": spira,
+        "jira": (
+            get_jira()
+            if any(failure.get("document_id") is not None for failure in failures)
+            else None
+        ),
+        "journals": {},
+        "journals_lock": threading.Lock(),
+        "finished": set(),
+        "finished_lock": threading.Lock(),
+    }
+
+    redirect_failure_log(failure_log_path)
+    try:
+        retried = run_concurrently(
+            range(len(failures)),
+            lambda index: finish_failure(retry_context, index, failures[index]),
+            workers,
+        )
+    finally:
+        for index, failure in enumerate(failures):
+            if index not in retry_context["finished"]:
+                write_failure(failure["journal"] or DEFAULT_FAILURE_LOG_NAME, failure)
+        redirect_failure_log(None)
+
+        for journal in retry_context["journals"].values():
+            journal.close()
+        os.remove(retrying_path)
+
+    return retried.count(True)
+
+
+# Move the failures of the log to the .retrying file, added to the failures of an interrupted retry.
+def set_aside_failures(failure_log_path, retrying_path) -> list:
+    failures = []
+    if os.path.isfile(retrying_path):
+        print("Retrying the failures left by an interrupted retry in " + retrying_path)
+        failures += read_failures(retrying_path)
+    if os.path.isfile(failure_log_path):
+        failures += read_failures(failure_log_path)
+
+    # Written before the log is removed, so the failures are always in one of the files
+    with open(retrying_path + ".tmp", "w", encoding="UTF-8") as file:
+        for failure in failures:
+            file.write(json.dumps(failure, default=str, separators=(",", ":")) + "\n")
+    os.replace(retrying_path + ".tmp", retrying_path)
+    if os.path.isfile(failure_log_path):
+        os.remove(failure_log_path)
+
+    return failures
+
+
+# A failure is finished once it's retried or logged again, the unfinished ones are put back in the log.
+def finish_failure(retry_context, index, failure) -> bool:
+    retried = retry_failure(retry_context, failure)
+
+    with retry_context["finished_lock"]:
+        retry_context["finished"].add(index)
+
+    return retried
+
+
+def retry_failure(retry_context, failure) -> bool:
+    journal = get_failure_journal(retry_context, failure["journal"])
+    if skip_journaled(journal, failure["jira_key"], failure["artifact_type"]):
+        return True
+
+    # Failures from before the request was known can't be sent again, they are kept in the log
+    if failure["request"] is None:
+        print(
+            "The "
+            + failure["artifact_type"].replace("_", " ")
+            + " of jira key "
+            + str(failure["jira_key"])
+            + " can't be retried, it failed before it was sent to spira."
+        )
+        write_failure(failure["journal"] or DEFAULT_FAILURE_LOG_NAME, failure)
+        return False
+
+    payload = failure["payload"]
+    try:
+        create = getattr(retry_context["spira"], failure["request"]["method"])
+        if failure.get("document_id") is not None:
+            with spool_jira_attachment(
+                retry_context["jira"], failure["document_id"]
+            ) as document_file:
+                response = create(*failure["request"]["args"], payload, document_file)
+        elif payload is None:
+            response = create(*failure["request"]["args"])
+        else:
+            response = create(*failure["request"]["args"], payload)
+        check_response(response)
+
+        record_migrated(
+            journal,
+            failure["jira_key"],
+            failure["artifact_type"],
+            get_created_id(response, failure["id_key"], failure["spira_id"]),
+            payload,
+        )
+    except Exception as e:
+        details = {}
+        if failure.get("document_id") is not None:
+            details["document_id"] = failure["document_id"]
+
+        log_failure(
+            e,
+            failure["artifact_type"],
+            failure["jira_key"],
+            failure["request"],
+            payload,
+            journal,
+            failure["id_key"],
+            failure["spira_id"],
+            **details,
+        )
+        return False
+
+    return True
+
+
+# The last failure of the same create is kept, e.g. when a stage failed in more than one run.
+def get_unique_failures(failures) -> list:
+    unique_failures = {}
+    for failure in failures:
+        key = (
+            failure["journal"],
+            failure["artifact_type"],
+            failure["jira_key"],
+            str(failure["request"]),
+        )
+        unique_failures.pop(key, None)
+        unique_failures[key] = failure
+
+    return list(unique_failures.values())
+
+
+# Most creates raise a SpiraError themselves, some return the status code or the failed response instead.
+def check_response(response):
+    status_code = None
+    if isinstance(response, int):
+        status_code = response
+    elif hasattr(response, "status_code"):
+        status_code = response.status_code
+
+    if status_code is not None and status_code >= 400:
+        raise SpiraError(
+            "Spira responded with status code " + str(status_code), status_code
+        )
+
+
+def get_created_id(response, id_key, spira_id):
+    if id_key is None:
+        return spira_id
+
+    # Incident comments are created as a list
+    if isinstance(response, list):
+        response = response[0] if response else {}
+
+    return response.get(id_key)
+
+
+def get_failure_journal(retry_context, name):
+    if name is None:
+        return None
+
+    with retry_context["journals_lock"]:
+        if name not in retry_context["journals"]:
+            retry_context["journals"][name] = get_migration_journal(name)
+
+        return retry_context["journals"][name]
@@ -1,11 +1,37 @@
+import hashlib
 import json
-import base64
-from spira import Spira
+from spira import Spira, SpiraError
 from jira import JIRA
-from utility import pretty_print
+from migration_journal import MigrationJournal, record_migrated, skip_journaled
+from failure_log import log_failure
+from attachment_store import AttachmentStore
+from attachment_transfer import (
+    DEFAULT_TRANSFER_BUDGET,
+    AttachmentPipeline,
+    DocumentHashIndex,
+    get_file_size,
+    spool_jira_attachment,
+)
 
 
-def update_artifacts(spira: Spira, spira_project_number, input_file_handle, jira: JIRA):
+# The updates already in the migration journal are skipped, the successful ones are recorded in it.
+# Documents are downloaded and uploaded by separate pools of workers, with at most transfer_budget bytes
+# downloaded and not uploaded yet.
+# With deduplicate_documents, an attachment with the same contents as one already uploaded is associated with
+# the existing document instead of uploaded again.
+# Attachments in the attachment_store, if given, are read from it instead of downloaded from jira.
+def update_artifacts(
+    spira: Spira,
+    spira_project_number,
+    input_file_handle,
+    jira: JIRA,
+    journal: MigrationJournal | None = None,
+    download_workers=1,
+    upload_workers=1,
+    transfer_budget=DEFAULT_TRANSFER_BUDGET,
+    deduplicate_documents=True,
+    attachment_store: AttachmentStore | None = None,
+):
     print("Spira input supplied through:" + input_file_handle.name)
     to_spira = json.load(input_file_handle)
     print("Spira input loaded")
@@ -21,92 +47,140 @@ def update_artifacts(spira: Spira, spira_project_number, input_file_handle, jira
             "Associations not migrated belongs to issues not migrated to spira yet or association already exist in spira"
         )
         for item in artifacts:
-            spira.add_association(int(spira_project_number), item["payload"])
+            if skip_journaled(journal, item.get("jira_key"), "association"):
+                continue
+
+            response = spira.add_association(int(spira_project_number), item["payload"])
+
+            # A failed association returns the response instead of the created link
+            if isinstance(response, dict):
+                record_migrated(
+                    journal,
+                    item.get("jira_key"),
+                    "association",
+                    response.get("ArtifactLinkId"),
+                    item["payload"],
+                )
+            else:
+                log_failure(
+                    SpiraError(
+                        "Spira responded with status code "
+                        + str(response.status_code)
+                        + ": "
+                        + response.text[:500],
+                        response.status_code,
+                    ),
+                    "association",
+                    item.get("jira_key"),
+                    {"method": "add_association", "args": [int(spira_project_number)]},
+                    item["payload"],
+                    journal,
+                    "ArtifactLinkId",
+                )
 
     elif (update_action) == "comment":
         comments_found = len(artifacts)
         print("Comments found and to be inserted: " + str(len(artifacts)))
         for item in artifacts:
+            if skip_journaled(journal, item.get("jira_key"), "comment"):
+                continue
+
             if item["artifacttype"] == 1:
                 try:
-                    spira.create_requirement_comment(
+                    inserted_comment = spira.create_requirement_comment(
                         int(spira_project_number),
                         item["payload"]["ArtifactId"],
                         item["payload"],
                     )
+                    record_comment(journal, item, inserted_comment)
                 except Exception as e:
                     comments_found -= 1
-                    print(e)
-                    print(
-                        "An error occured when trying to insert the task artifact with data:"
+                    log_comment_failure(
+                        e,
+                        item,
+                        "create_requirement_comment",
+                        spira_project_number,
+                        journal,
                     )
-                    pretty_print(item["payload"])
 
             elif item["artifacttype"] == 3:
                 try:
-                    spira.create_incident_comment(
+                    inserted_comment = spira.create_incident_comment(
                         int(spira_project_number),
                         item["payload"]["ArtifactId"],
                         item["payload"],
                     )
+                    record_comment(journal, item, inserted_comment)
                 except Exception as e:
                     comments_found -= 1
-                    print(e)
-                    print(
-                        "An error occured when trying to insert the task artifact with data:"
+                    log_comment_failure(
+                        e,
+                        item,
+                        "create_incident_comment",
+                        spira_project_number,
+                        journal,
                     )
-                    pretty_print(item["payload"])
             elif item["artifacttype"] == 6:
                 try:
-                    spira.create_task_comment(
+                    inserted_comment = spira.create_task_comment(
                         int(spira_project_number),
                         item["payload"]["ArtifactId"],
                         item["payload"],
                     )
+                    record_comment(journal, item, inserted_comment)
                 except Exception as e:
                     comments_found -= 1
-                    print(e)
-                    print(
-                        "An error occured when trying to insert the task artifact with data:"
+                    log_comment_failure(
+                        e, item, "create_task_comment", spira_project_number, journal
                     )
-                    pretty_print(item["payload"])
         return comments_found
     elif (update_action) == "document":
         documents_found = len(artifacts)
         print("Documents found and to be inserted: " + str(documents_found))
-        for item in artifacts:
-            try:
-                id = item["document_id"]
-                attachment = jira.attachment(id)
-                jira_document = attachment.get()
 
-                # Encode the byte string from jira and then decode it to a string
-                item["payload"]["BinaryData"] = base64.b64encode(jira_document).decode()
+        documents_to_transfer = [
+            item
+            for item in artifacts
+            if not skip_journaled(journal, item.get("jira_key"), "document")
+        ]
 
-                try:
-                    spira.add_document(int(spira_project_number), item["payload"])
+        document_hashes = DocumentHashIndex(journal) if deduplicate_documents else None
 
-                except Exception as x:
-                    documents_found -= 1
-                    print(x)
-                    print(
-                        "An error occured when trying to insert the document to spira:"
-                    )
-                    pretty_print(item["payload"])
+        # Downloaded to temporary files while the earlier ones are base64 encoded and sent to spira
+        attachment_pipeline = AttachmentPipeline(
+            lambda item: download_document(
+                item, jira, spira_project_number, journal, attachment_store
+            ),
+            lambda item, document_file: upload_document(
+                spira,
+                item,
+                document_file,
+                spira_project_number,
+                journal,
+                document_hashes,
+            ),
+            lambda item: item.get("document_size"),
+            download_workers,
+            upload_workers,
+            transfer_budget,
+        )
+        transferred = attachment_pipeline.run(documents_to_transfer)
 
-            except Exception as e:
-                documents_found -= 1
-                print(e)
-                print("An error occured when trying to fetch the document from jira:")
-                pretty_print(item["payload"])
+        if document_hashes is not None:
+            document_hashes.print_statistics()
+        if attachment_store is not None:
+            attachment_store.print_statistics()
 
-        return documents_found
+        return documents_found - transferred.count(False)
 
     elif (update_action) == "add_document_association":
         documents_found = len(artifacts)
         print("Documents found and to be inserted: " + str(documents_found))
 
         for item in artifacts:
+            if skip_journaled(journal, item["AttachmentId"], "document_association"):
+                continue
+
             try:
                 id = item["AttachmentId"]
                 artifact_type_id = item["artifact_id_data"]["artifact_type_id"]
@@ -115,13 +189,174 @@ def update_artifacts(spira: Spira, spira_project_number, input_file_handle, jira
                 spira.add_artifact_document_association(
                     int(spira_project_number), artifact_type_id, artifact_id, id
                 )
+                record_migrated(journal, id, "document_association", artifact_id)
 
             except Exception as e:
                 documents_found -= 1
-                print(e)
                 print(
-                    "An error occured when trying to attach the artifact to the document, artifact could be a capability :"
+                    "An error occured when trying to attach the artifact to the document, artifact could be a capability:"
+                )
+                # The jira issue of the document may not be migrated
+                artifact_id_data = item.get("artifact_id_data") or {}
+                log_failure(
+                    e,
+                    "document_association",
+                    item["AttachmentId"],
+                    {
+                        "method": "add_artifact_document_association",
+                        "args": [
+                            int(spira_project_number),
+                            artifact_id_data.get("artifact_type_id"),
+                            artifact_id_data.get("artifact_id"),
+                            item["AttachmentId"],
+                        ],
+                    },
+                    journal=journal,
+                    spira_id=artifact_id_data.get("artifact_id"),
                 )
-                pretty_print(item)
 
         return documents_found
+
+
+def record_comment(journal: MigrationJournal | None, item, inserted_comment):
+    # Incident comments are created as a list
+    if isinstance(inserted_comment, list):
+        inserted_comment = inserted_comment[0] if inserted_comment else {}
+
+    record_migrated(
+        journal,
+        item.get("jira_key"),
+        "comment",
+        inserted_comment.get("CommentId"),
+        item["payload"],
+    )
+
+
+# Download a jira attachment to a temporary file, returns None if it failed.
+# The hash of the contents is kept in the item, to find the copies of the same attachment.
+def download_document(
+    item,
+    jira: JIRA,
+    spira_project_number,
+    journal,
+    attachment_store: AttachmentStore | None = None,
+):
+    try:
+        if attachment_store is not None:
+            document_file, item["content_hash"] = attachment_store.fetch(
+                jira, item["document_id"], item.get("document_size")
+            )
+            return document_file
+
+        content_hash = hashlib.sha256()
+        document_file = spool_jira_attachment(jira, item["document_id"], content_hash)
+        item["content_hash"] = content_hash.hexdigest()
+        return document_file
+    except Exception as e:
+        print("An error occured when trying to fetch the document from jira:")
+        log_document_failure(e, item, spira_project_number, journal)
+        return None
+
+
+# The file is base64 encoded while it's sent to spira.
+# A copy of a document already in spira is associated with its artifacts instead, when document_hashes is given.
+def upload_document(
+    spira: Spira,
+    item,
+    document_file,
+    spira_project_number,
+    journal,
+    document_hashes: DocumentHashIndex | None = None,
+) -> bool:
+    content_hash = item.get("content_hash")
+    if document_hashes is not None and content_hash is not None:
+        document_id = document_hashes.get_or_claim(content_hash)
+        if document_id is not None:
+            document_hashes.count_duplicate(get_file_size(document_file))
+            return associate_duplicate_document(
+                spira, item, document_id, spira_project_number, journal
+            )
+
+    document_id = None
+    try:
+        inserted_document = spira.add_document_file(
+            int(spira_project_number), item["payload"], document_file
+        )
+        document_id = inserted_document["AttachmentId"]
+        record_migrated(journal, item.get("jira_key"), "document", document_id)
+    except Exception as e:
+        log_document_failure(e, item, spira_project_number, journal)
+        return False
+    finally:
+        # The copies waiting for this upload continue, and upload themselves if it failed
+        if document_hashes is not None and content_hash is not None:
+            document_hashes.set_document_id(content_hash, document_id)
+
+    return True
+
+
+# Attach an existing document with the same contents to the artifacts of the attachment.
+def associate_duplicate_document(
+    spira: Spira, item, document_id, spira_project_number, journal
+) -> bool:
+    request = None
+    try:
+        for attached_artifact in item["payload"].get("AttachedArtifacts") or []:
+            request = {
+                "method": "add_artifact_document_association",
+                "args": [
+                    int(spira_project_number),
+                    attached_artifact["ArtifactTypeId"],
+                    attached_artifact["ArtifactId"],
+                    document_id,
+                ],
+            }
+            spira.add_artifact_document_association(*request["args"])
+        record_migrated(journal, item.get("jira_key"), "document", document_id)
+    except Exception as e:
+        log_failure(
+            e,
+            "document",
+            item.get("jira_key"),
+            request,
+            None,
+            journal,
+            None,
+            document_id,
+        )
+        return False
+
+    return True
+
+
+def log_comment_failure(
+    error, item, method, spira_project_number, journal: MigrationJournal | None
+):
+    log_failure(
+        error,
+        "comment",
+        item.get("jira_key"),
+        {
+            "method": method,
+            "args": [int(spira_project_number), item["payload"]["ArtifactId"]],
+        },
+        item["payload"],
+        journal,
+        "CommentId",
+    )
+
+
+# The file contents are not logged, the retry downloads the document from jira again.
+def log_document_failure(
+    error, item, spira_project_number, journal: MigrationJournal | None
+):
+    log_failure(
+        error,
+        "document",
+        item.get("jira_key"),
+        {"method": "add_document_file", "args": [int(spira_project_number)]},
+        item["payload"],
+        journal,
+        "AttachmentId",
+        document_id=item["document_id"],
+    )
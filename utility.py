@@ -1,13 +1,19 @@
 # Utility functions
 # Some utility functions that might be needed in several places in the codebase.
-import requests
-from requests.auth import HTTPBasicAuth
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 import json
 import re
 
 # Pre-compiled regex for removing \xhh chars.
 regex_x_invalid_escape_chars = re.compile(r"\\x([0-9a-fA-F]{2})")
 
+# Pre-compiled regex for the jira dates, "2023-01-02", "2023-01-02T03:04:05.000Z" and "2023-01-02T03:04:05.000+0200".
+regex_jira_datetime = re.compile(
+    r"(\d{4})-(\d{1,2})-(\d{1,2})"
+    r"(?:T(\d{1,2}):(\d{1,2}):(\d{1,2})\.(\d{1,6})(Z|([+-])(\d{2}):?(\d{2}))?)?"
+)
+
 
 # Functions for fixing the string and replacing the \xhh chars
 def fix_xinvalid(m):
@@ -102,46 +108,6 @@ def decrement_indent_level(indent_string: str) -> str:
         return new_string
 
 
-def convert_jira_markup_to_html(jira_connection_dict, skip_ssl, jira_markup: str):
-    render_markup_url = jira_connection_dict["jira_base_url"] + "/rest/api/1.0/render"
-
-    if jira_markup is None or jira_markup == "":
-        return "--EMPTY--"
-
-    # Strip all the \x unicode chars.
-    jira_markup = re.sub(r"\\x([0-9a-fA-F]{2})", "", jira_markup)
-
-    # Try to dump a string to json. If it fails return a standard string and warning messages.
-    if not try_json_dump_string(jira_markup):
-        return "--MIGRATION OF TEXT FAILED because of error during JSON validation--"
-
-    headers = {
-        "Content-Type": "application/json",
-    }
-
-    body = {
-        "rendererType": "atlassian-wiki-renderer",
-        "unrenderedMarkup": jira_markup,
-    }
-
-    response = requests.request(
-        "POST",
-        render_markup_url,
-        headers=headers,
-        verify=(not skip_ssl),
-        data=json.dumps(body),
-    )
-
-    if response.status_code != 200:
-        print(response.text)
-        print("Conversion of text from jira markup to html failed for text:")
-        print(jira_markup)
-        print(repr(jira_markup))
-        return "--MIGRATION OF TEXT FAILED because of jira renderer error--"
-    else:
-        return response.text
-
-
 # Try to dump a string to json. False if fails, True if succeeds.
 def try_json_dump_string(string_to_dump) -> bool:
     try:
@@ -160,6 +126,45 @@ def try_json_dump_string(string_to_dump) -> bool:
     return True
 
 
+# Parse a jira date in a single pass and convert it to the spira date format, None if it's not a jira date.
+# Dates with the "Z" suffix are converted without a timezone. Converted dates parse to themselves.
+# The same timestamps come back for many issues, so the results are cached.
+@lru_cache(maxsize=65536)
+def parse_jira_datetime(date_string: str) -> str | None:
+    if not isinstance(date_string, str):
+        return None
+
+    match = regex_jira_datetime.fullmatch(date_string)
+    if match is None:
+        return None
+
+    year, month, day, hour, minute, second, fraction, offset = match.groups()[:8]
+    sign, offset_hours, offset_minutes = match.groups()[8:]
+
+    try:
+        tzinfo = None
+        if sign is not None:
+            offset_delta = timedelta(
+                hours=int(offset_hours), minutes=int(offset_minutes)
+            )
+            tzinfo = timezone(-offset_delta if sign == "-" else offset_delta)
+
+        parsed = datetime(
+            int(year),
+            int(month),
+            int(day),
+            int(hour or 0),
+            int(minute or 0),
+            int(second or 0),
+            int((fraction or "0").ljust(6, "0")),
+            tzinfo=tzinfo,
+        )
+    except ValueError:
+        return None
+
+    return parsed.strftime("%Y-%m-%dT%H:%M:%S.%f%z")
+
+
 # Combine jira types within a specific list to a single hierarchy level.
 def combine_jira_types(artifact_or_program_type: dict) -> list:
     combined_jira_types = []